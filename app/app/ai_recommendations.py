@@ -0,0 +1,118 @@
+"""
+Recipe recommendations from the AI ingredient matcher, as Recipe ids.
+
+find_recipes_by_ingredients() answers with titles of the recipe store, so
+titles are joined to Recipe rows through canonical_title(); the title -> ids
+map is built from the recipe index keys once per index (i.e. per catalog
+version). Results are cached in Django's cache keyed by the canonical
+ingredient set and the catalog version, and shared by all users: the diet and
+allergy filter is applied per request with the index bitmaps.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from resources.actual_ai import find_recipes_by_ingredients
+
+from .canonical import CANONICAL_VERSION, canonical_title, canonical_word
+from .recipe_index import get_recipe_index
+
+__all__ = [
+    'RecommendationsUnavailable',
+    'ai_recommendations',
+    'recipe_ids_for_titles',
+]
+
+CACHE_KEY = 'ai-recommendations:{version}:{ingredients}:{limit}'
+
+# Titles requested from the matcher per result, since not every store title is a Recipe
+# row and the user's filter drops some of the rest
+OVERFETCH = 3
+
+_title_ids = None
+_title_ids_index = None
+_title_ids_lock = threading.Lock()
+
+
+class RecommendationsUnavailable(Exception):
+    """The AI matcher's artifacts could not be loaded"""
+
+
+def _get_title_ids(index):
+    global _title_ids, _title_ids_index
+    if _title_ids_index is not index:
+        with _title_ids_lock:
+            if _title_ids_index is not index:
+                title_ids = {}
+                for name, recipe_id in index.keys:
+                    title_ids.setdefault(canonical_title(name), []).append(recipe_id)
+                _title_ids, _title_ids_index = title_ids, index
+    return _title_ids
+
+
+def recipe_ids_for_titles(titles, index=None):
+    """Recipe ids for store titles, in title order (a title may match several recipes)"""
+    title_ids = _get_title_ids(index or get_recipe_index())
+    recipe_ids = []
+    seen = set()
+    for title in titles:
+        for recipe_id in title_ids.get(canonical_title(title), ()):
+            if recipe_id not in seen:
+                seen.add(recipe_id)
+                recipe_ids.append(recipe_id)
+    return recipe_ids
+
+
+def _cache_key(index, ingredients, limit):
+    version = hashlib.sha1(repr((index.signature, CANONICAL_VERSION)).encode()).hexdigest()[:16]
+    digest = hashlib.sha1('\n'.join(ingredients).encode()).hexdigest()
+    return CACHE_KEY.format(version=version, ingredients=digest, limit=limit)
+
+
+def _candidates(index, ingredients, limit):
+    """[(recipe_id, name)] for an ingredient set before any per-user filtering, cached"""
+    key = _cache_key(index, ingredients, limit)
+    candidates = cache.get(key)
+    if candidates is None:
+        try:
+            titles = find_recipes_by_ingredients(ingredients, top_n=limit * OVERFETCH)
+        except Exception as e:
+            raise RecommendationsUnavailable(str(e))
+        candidates = [
+            (recipe_id, index.keys[index.position[recipe_id]][0])
+            for recipe_id in recipe_ids_for_titles(titles, index)
+        ]
+        cache.set(key, candidates, getattr(settings, 'AI_RECOMMENDATIONS_CACHE_SECONDS', 600))
+    return candidates
+
+
+def ai_recommendations(ingredient_names, profile, limit=9):
+    """
+    Up to `limit` (recipe_id, name) pairs for recipes containing every ingredient
+    in `ingredient_names`, in the matcher's order, that suit the diet and allergies
+    of `profile` (a DietaryProfile). Returns (results, canonical ingredient list);
+    both are empty when no name has a canonical form, and nothing is queried or cached.
+    """
+    # Same per-word normalization as the matcher's recipe ingredient sets
+    ingredients = sorted({canonical_word(name) for name in ingredient_names} - {''})
+    if not ingredients:
+        return [], []
+    index = get_recipe_index()
+    candidates = _candidates(index, ingredients, limit)
+
+    # Same diet and allergen rules as ranked matching, applied as a bitmap
+    allowed = index.match(
+        lenient_diets=[profile.diet_id] if profile.diet_id else [],
+        exclude_tokens=profile.allergen_tokens,
+        exclude_allergens=profile.allergy_ids,
+    )
+    results = []
+    for recipe_id, name in candidates:
+        position = index.position.get(recipe_id)
+        if position is not None and allowed >> position & 1:
+            results.append((recipe_id, name))
+            if len(results) == limit:
+                break
+    return results, ingredients
@@ -0,0 +1,123 @@
+"""
+Compiled multi-pattern matcher for allergen synonyms.
+
+An Aho-Corasick automaton finds every synonym occurring in an ingredient name
+in a single pass over the name, so checking an ingredient costs O(len(name))
+no matter how many synonyms the allergen profile expands to. Matchers are
+immutable and cached by the fingerprint of their patterns.
+"""
+from collections import deque
+from functools import lru_cache
+
+__all__ = [
+    'AllergenMatcher',
+    'compile_allergen_matcher',
+]
+
+
+class AllergenMatcher:
+    """
+    Aho-Corasick automaton over (pattern, label) pairs.
+
+    `patterns` maps each substring to look for to the labels it reports
+    (e.g. synonym -> allergen tokens). Names listed in `safe_names` never match.
+    """
+
+    def __init__(self, patterns, safe_names=()):
+        self.safe_names = frozenset(name.lower() for name in safe_names)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+        for pattern, labels in patterns.items():
+            self._add(pattern.lower(), labels)
+        self._link()
+
+    def _add(self, pattern, labels):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(frozenset())
+            state = nxt
+        self._out[state] = self._out[state] | frozenset(labels)
+
+    def _link(self):
+        """
+        Breadth-first pass computing failure links and merged outputs, then
+        folding the failure links into a full transition table so matching is
+        exactly one dict lookup per character.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        order = []
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[nxt] = goto[fallback].get(char, 0)
+                out[nxt] = out[nxt] | out[fail[nxt]]
+
+        # Parents are visited before children, so a state's failure target is complete
+        self._delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        for state in order:
+            transitions = dict(self._delta[fail[state]])
+            transitions.update(goto[state])
+            self._delta[state] = transitions
+        self._accepting = [bool(labels) for labels in out]
+
+    def matches(self, name):
+        """Set of labels whose patterns occur in `name`"""
+        name = name.lower()
+        if name in self.safe_names:
+            return set()
+        delta, out = self._delta, self._out
+        found = set()
+        state = 0
+        for char in name:
+            state = delta[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def is_safe(self, name):
+        """True when no pattern occurs in `name` (stops at the first hit)"""
+        name = name.lower()
+        if name in self.safe_names:
+            return True
+        delta, accepting = self._delta, self._accepting
+        state = 0
+        for char in name:
+            state = delta[state].get(char, 0)
+            if accepting[state]:
+                return False
+        return True
+
+
+@lru_cache(maxsize=256)
+def _compile(fingerprint, safe_names):
+    patterns = {}
+    for pattern, label in fingerprint:
+        patterns.setdefault(pattern, set()).add(label)
+    return AllergenMatcher(patterns, safe_names)
+
+
+def compile_allergen_matcher(patterns, safe_names=()):
+    """
+    Return a cached AllergenMatcher.
+
+    `patterns` is either an iterable of synonyms (each labelled with itself) or
+    a mapping of label -> synonyms. Equal pattern sets share one compiled matcher.
+    """
+    if isinstance(patterns, dict):
+        pairs = {(synonym.lower(), label) for label, synonyms in patterns.items() for synonym in synonyms}
+    else:
+        pairs = {(synonym.lower(), synonym.lower()) for synonym in patterns}
+    return _compile(frozenset(pairs), frozenset(name.lower() for name in safe_names))
@@ -0,0 +1,96 @@
+"""
+Precomputed allergen tokens for ingredients and recipes.
+
+An ingredient gets a token for every allergy whose synonyms occur in its name
+(one pass of the compiled token matcher); a recipe gets the union of its ingredients'
+tokens. Views can then exclude unsafe rows with a single
+`exclude(allergen_tokens__token__in=...)` instead of scanning names in Python.
+"""
+from django.db import transaction
+
+from core.models import (
+    Allergy,
+    IngredientAllData,
+    IngredientAllergenToken,
+    Recipe,
+    RecipeAllergenToken,
+)
+
+from .helpers import (
+    get_allergen_token,
+    get_related_allergens,
+    get_token_matcher,
+)
+
+__all__ = [
+    'get_allergen_vocabulary',
+    'tokens_for_ingredient',
+    'rebuild_ingredient_allergen_tokens',
+    'rebuild_recipe_allergen_tokens',
+]
+
+BATCH_SIZE = 5000
+
+
+def get_allergen_vocabulary(tokens=None):
+    """Map every token a user can select (via Allergy) to its synonym list"""
+    vocabulary = {}
+    for name in Allergy.objects.values_list('name', flat=True):
+        token = get_allergen_token(name)
+        if tokens is None or token in tokens:
+            vocabulary[token] = get_related_allergens(name)
+    return vocabulary
+
+
+def tokens_for_ingredient(ingredient_name, matcher):
+    """Tokens whose synonyms make this ingredient unsafe (see get_token_matcher)"""
+    return sorted(matcher.matches(ingredient_name))
+
+
+def rebuild_ingredient_allergen_tokens(ingredient_ids=None, tokens=None):
+    """
+    Recompute ingredient tokens, optionally limited to some ingredients and/or
+    tokens. Returns the number of token rows written.
+    """
+    matcher = get_token_matcher(get_allergen_vocabulary(tokens))
+    ingredients = IngredientAllData.objects.all()
+    existing = IngredientAllergenToken.objects.all()
+    if ingredient_ids is not None:
+        ingredients = ingredients.filter(id__in=ingredient_ids)
+        existing = existing.filter(ingredient_id__in=ingredient_ids)
+    if tokens is not None:
+        existing = existing.filter(token__in=tokens)
+
+    rows = [
+        IngredientAllergenToken(ingredient_id=ingredient_id, token=token)
+        for ingredient_id, name in ingredients.values_list('id', 'name').iterator()
+        for token in tokens_for_ingredient(name, matcher)
+    ]
+    with transaction.atomic():
+        existing.delete()
+        IngredientAllergenToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_recipe_allergen_tokens(recipe_ids=None, tokens=None):
+    """
+    Recompute recipe tokens from the ingredient tokens, optionally limited to
+    some recipes and/or tokens. Returns the number of token rows written.
+    """
+    # Token conditions go into one filter() call so they share the join read below
+    token_lookups = {'ingredientalldata__allergen_tokens__isnull': False}
+    existing = RecipeAllergenToken.objects.all()
+    if tokens is not None:
+        token_lookups['ingredientalldata__allergen_tokens__token__in'] = tokens
+        existing = existing.filter(token__in=tokens)
+    links = Recipe.ingredients.through.objects.filter(**token_lookups)
+    if recipe_ids is not None:
+        links = links.filter(recipe_id__in=recipe_ids)
+        existing = existing.filter(recipe_id__in=recipe_ids)
+
+    pairs = links.values_list('recipe_id', 'ingredientalldata__allergen_tokens__token').distinct()
+    rows = [RecipeAllergenToken(recipe_id=recipe_id, token=token) for recipe_id, token in pairs]
+    with transaction.atomic():
+        existing.delete()
+        RecipeAllergenToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
@@ -0,0 +1,230 @@
+"""
+One canonical form for ingredient names and recipe titles.
+
+Search and recipe import resolve names through canonical_ingredient(), so
+"Tomatoes", "tomato" and "tomato," meet at the same key. The AI matcher compares
+single words of recipe ingredient lists, so it normalizes both those words and
+the query with canonical_word(). It is rule based (no WordNet lookups) and memoized in a bounded LRU cache.
+IngredientVocabulary precomputes the canonical form of every IngredientAllData
+name so resolving a name to an ingredient id is a dictionary lookup.
+
+This module must stay importable without Django being configured:
+resources/actual_ai.py uses it outside of requests.
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+
+__all__ = [
+    'CANONICAL_VERSION',
+    'IngredientVocabulary',
+    'canonical_ingredient',
+    'canonical_ingredients',
+    'canonical_title',
+    'canonical_word',
+    'get_ingredient_vocabulary',
+    'invalidate_ingredient_vocabulary',
+]
+
+# Bump when the rules change so stores built with the old rules are rebuilt
+CANONICAL_VERSION = 3
+
+CACHE_SIZE = 65536
+
+# Whole-name aliases kept from the recipe importer's mapping; never applied to
+# single words of a longer name. "cloves" alone is the spice, so it has no alias.
+PHRASE_ALIASES = {
+    'garlic cloves': 'garlic',
+}
+
+IRREGULAR_PLURALS = {
+    'tomatoes': 'tomato',
+    'potatoes': 'potato',
+    'leaves': 'leaf',
+    'loaves': 'loaf',
+    'halves': 'half',
+    'knives': 'knife',
+    'geese': 'goose',
+    'mice': 'mouse',
+    'teeth': 'tooth',
+    'feet': 'foot',
+    'anchovies': 'anchovy',
+    'cookies': 'cookie',
+    'brownies': 'brownie',
+    'smoothies': 'smoothie',
+}
+
+# Words ending in -s that are not plurals
+UNCOUNTABLE = frozenset({
+    'asparagus', 'couscous', 'hummus', 'molasses', 'swiss', 'citrus', 'bass',
+    'grits', 'octopus', 'lemongrass', 'watercress', 'haggis', 'chassis', 'series',
+})
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+_PARENTHETICAL = re.compile(r'\(.*?\)')
+_QUOTES = str.maketrans({'\u2018': "'", '\u2019': "'", '`': "'", '\u201c': '"', '\u201d': '"'})
+
+
+def _singular(word):
+    if word in UNCOUNTABLE or len(word) <= 3:
+        return word
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    # Only longer words: "pies" and "ties" lose just the s
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def _simplified(name):
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub('', name.lower())).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_ingredient(name):
+    """Lowercased, punctuation-free, singular form of an ingredient name"""
+    name = _simplified(name)
+    name = PHRASE_ALIASES.get(name, name)
+    return ' '.join(_singular(word) for word in name.split(' ')) if name else name
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_word(word):
+    """canonical_ingredient for one word of a longer name: same rules, no whole-name aliases"""
+    word = _simplified(word)
+    return ' '.join(_singular(part) for part in word.split(' ')) if word else word
+
+
+def canonical_ingredients(names):
+    """canonical_ingredient over many names; each distinct name is computed once"""
+    forms = {}
+    return [forms[name] if name in forms else forms.setdefault(name, canonical_ingredient(name)) for name in names]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_title(title):
+    """Recipe title for comparison: no parentheticals, straight quotes, single spaces, lowercase"""
+    title = _PARENTHETICAL.sub('', title).translate(_QUOTES)
+    return _WHITESPACE.sub(' ', title).strip().lower()
+
+
+class IngredientVocabulary:
+    """Precomputed name -> id and canonical form -> id maps for IngredientAllData"""
+
+    def __init__(self, rows, signature=None):
+        self.names = {}
+        self.by_name = {}
+        self.by_canonical = {}
+        for ingredient_id, name in rows:
+            self.names[ingredient_id] = name
+            self.by_name.setdefault(name, ingredient_id)
+            self.by_canonical.setdefault(canonical_ingredient(name), ingredient_id)
+        self.signature = signature
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def resolve(self, name):
+        """Ingredient id for a name (exact match first, then canonical form), or None"""
+        ingredient_id = self.by_name.get(name)
+        if ingredient_id is None:
+            ingredient_id = self.by_canonical.get(canonical_ingredient(name.strip()))
+        return ingredient_id
+
+    def resolve_many(self, names):
+        """{name: ingredient id} for the names that resolve"""
+        resolved = {}
+        for name in names:
+            ingredient_id = self.resolve(name)
+            if ingredient_id is not None:
+                resolved[name] = ingredient_id
+        return resolved
+
+
+VOCABULARY_VERSION_NAME = 'ingredients'
+
+
+def _bump_vocabulary_version():
+    """Persist that ingredient names changed, so every process's signature check sees it."""
+    from django.db.models import F
+    from core.models import CatalogVersion
+    if not CatalogVersion.objects.filter(name=VOCABULARY_VERSION_NAME).update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(name=VOCABULARY_VERSION_NAME, defaults={'version': 1})
+
+
+def _vocabulary_signature():
+    """
+    Count and max id catch inserts and deletes; the version row catches renames,
+    which leave both unchanged.
+    """
+    from django.db.models import Count, Max
+    from core.models import CatalogVersion, IngredientAllData
+    stats = IngredientAllData.objects.aggregate(count=Count('id'), last=Max('id'))
+    version = CatalogVersion.objects.filter(name=VOCABULARY_VERSION_NAME).values_list('version', flat=True).first()
+    return (version or 0, stats['count'], stats['last'])
+
+
+def load_ingredient_vocabulary():
+    from core.models import IngredientAllData
+    signature = _vocabulary_signature()
+    rows = IngredientAllData.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=10000)
+    return IngredientVocabulary(rows, signature)
+
+
+_vocabulary = None
+_vocabulary_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def _vocabulary_committed():
+    global _vocabulary
+    # Another thread may have reloaded the pre-commit names in the meantime
+    _vocabulary = None
+    _bump_vocabulary_version()
+
+
+def invalidate_ingredient_vocabulary():
+    """
+    Drop this process's vocabulary and, once the current transaction commits,
+    bump the vocabulary version so other processes reload theirs at their next
+    check. A transaction bumps the version once however often it is called.
+    """
+    global _vocabulary
+    _vocabulary = None
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        func is _vocabulary_committed for _, func, _ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_vocabulary_committed)
+
+
+def get_ingredient_vocabulary():
+    """
+    Process-local IngredientVocabulary, rebuilt after local invalidation or when
+    the table signature changes (checked at most every
+    INGREDIENT_VOCABULARY_REFRESH_SECONDS).
+    """
+    global _vocabulary, _checked_at
+    refresh_seconds = getattr(settings, 'INGREDIENT_VOCABULARY_REFRESH_SECONDS', 60)
+    vocabulary = _vocabulary
+    if vocabulary is not None and time.monotonic() - _checked_at < refresh_seconds:
+        return vocabulary
+    with _vocabulary_lock:
+        vocabulary = _vocabulary
+        if vocabulary is not None and time.monotonic() - _checked_at < refresh_seconds:
+            return vocabulary
+        if vocabulary is None or vocabulary.signature != _vocabulary_signature():
+            vocabulary = load_ingredient_vocabulary()
+            _vocabulary = vocabulary
+        _checked_at = time.monotonic()
+        return vocabulary
@@ -0,0 +1,62 @@
+"""
+Persistent, content-addressed cache of AI recipe categorizations.
+
+The key hashes exactly what the categorization prompt shows the model (name,
+ingredient names, steps and description truncated as in the prompt) together
+with the model name and the prompt version, so an unchanged recipe, including
+one re-imported under a new id, is never sent to the API twice. Changing the
+prompt or the model yields new keys; old entries are simply no longer hit.
+"""
+import hashlib
+import json
+
+from core.models import CategorizationCacheEntry
+
+__all__ = [
+    'categorization_key',
+    'load_cached',
+    'store_cached',
+]
+
+# Prompt truncation limits (see categorize_meals.recipe_details)
+STEPS_CHARS = 500
+DESCRIPTION_CHARS = 200
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def categorization_key(recipe, model, prompt_version):
+    """sha256 of the recipe's prompt inputs plus model and prompt version"""
+    payload = json.dumps([
+        prompt_version,
+        model,
+        recipe.name,
+        sorted(ing.name for ing in recipe.ingredients.all()),
+        (recipe.steps or '')[:STEPS_CHARS],
+        (recipe.description or '')[:DESCRIPTION_CHARS],
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_cached(keys):
+    """{key: categorization} for the keys that have a cache entry"""
+    keys = list(set(keys))
+    cached = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        cached.update(
+            CategorizationCacheEntry.objects.filter(key__in=keys[start:start + LOOKUP_CHUNK_SIZE])
+            .values_list('key', 'result')
+        )
+    return cached
+
+
+def store_cached(entries, model, prompt_version):
+    """Insert (key, categorization) pairs; keys already cached are left as they are"""
+    CategorizationCacheEntry.objects.bulk_create(
+        [
+            CategorizationCacheEntry(key=key, model=model, prompt_version=prompt_version, result=result)
+            for key, result in entries
+        ],
+        batch_size=LOOKUP_CHUNK_SIZE,
+        ignore_conflicts=True,
+    )
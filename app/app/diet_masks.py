@@ -0,0 +1,151 @@
+"""
+Diet suitability as integer bitmasks.
+
+Every DietaryPreference gets a bit (by id order). An ingredient's mask has the
+bits of the diets it is tagged with, and a recipe suits exactly the diets left
+in the AND of its ingredients' masks, so deciding a recipe's diets is one
+integer operation per ingredient instead of a subset test per diet.
+
+IngredientAllData.diet_mask stores the mask each ingredient had when its
+recipes were last recomputed; comparing it with the current tags tells
+recompute_recipe_diets() which recipes can be affected by an edit. Bits are
+positions in the diet list, so adding or deleting a diet reassigns them: the
+bit layout the stored masks were written with is recorded as a CatalogVersion
+row, and stored masks are only trusted while it matches.
+"""
+import hashlib
+
+from django.db import transaction
+
+from core.models import CatalogVersion, DietaryPreference, IngredientAllData, Recipe
+
+from .recipe_index import invalidate_recipe_index
+
+__all__ = [
+    'DietMasks',
+    'changed_ingredients',
+    'load_diet_masks',
+    'recompute_recipe_diets',
+    'save_diet_layout',
+    'stored_masks_current',
+]
+
+BATCH_SIZE = 2000
+
+DIET_LAYOUT_NAME = 'diet-masks'
+
+
+class DietMasks:
+    """Diet bits plus the current mask of every ingredient"""
+
+    def __init__(self, diet_ids, ingredient_diets):
+        self.diet_ids = sorted(diet_ids)
+        self.bits = {diet_id: 1 << i for i, diet_id in enumerate(self.diet_ids)}
+        self.all_bits = (1 << len(self.diet_ids)) - 1
+        # Identifies the diet -> bit assignment (fits a PositiveBigIntegerField)
+        self.layout = int(hashlib.sha1(','.join(map(str, self.diet_ids)).encode()).hexdigest()[:15], 16)
+        self.ingredient_masks = {}
+        for ingredient_id, diet_id in ingredient_diets:
+            bit = self.bits.get(diet_id)
+            if bit is not None:
+                self.ingredient_masks[ingredient_id] = self.ingredient_masks.get(ingredient_id, 0) | bit
+
+    def recipe_mask(self, ingredient_ids):
+        """Diets allowing every one of the ingredients (all diets for no ingredients)"""
+        mask = self.all_bits
+        masks = self.ingredient_masks
+        for ingredient_id in ingredient_ids:
+            mask &= masks.get(ingredient_id, 0)
+            if not mask:
+                break
+        return mask
+
+    def diets(self, mask):
+        return [diet_id for diet_id, bit in self.bits.items() if mask & bit]
+
+    def suitable_diets(self, ingredient_ids):
+        return self.diets(self.recipe_mask(ingredient_ids))
+
+
+def load_diet_masks():
+    """DietMasks from the diet table and the ingredient -> diet through table"""
+    rows = IngredientAllData.dietary_preferences.through.objects.values_list(
+        'ingredientalldata_id', 'dietarypreference_id'
+    ).iterator(chunk_size=10000)
+    return DietMasks(DietaryPreference.objects.values_list('id', flat=True), rows)
+
+
+def stored_masks_current(masks):
+    """True when the stored diet_mask values were written with the bit layout of `masks`"""
+    return CatalogVersion.objects.filter(name=DIET_LAYOUT_NAME, version=masks.layout).exists()
+
+
+def save_diet_layout(masks):
+    """Record that the stored diet_mask values now use the bit layout of `masks`"""
+    CatalogVersion.objects.update_or_create(name=DIET_LAYOUT_NAME, defaults={'version': masks.layout})
+
+
+def changed_ingredients(masks):
+    """
+    {ingredient_id: current mask} for ingredients whose stored diet_mask is out
+    of date: all of them when the stored masks use another bit layout.
+    """
+    trusted = stored_masks_current(masks)
+    changed = {}
+    for ingredient_id, stored in IngredientAllData.objects.values_list('id', 'diet_mask').iterator(chunk_size=10000):
+        current = masks.ingredient_masks.get(ingredient_id, 0)
+        if current != stored or not trusted:
+            changed[ingredient_id] = current
+    return changed
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def recompute_recipe_diets(recipe_ids=None, masks=None, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Recompute suitable_for_diets for the given recipes (all when None) and
+    replace the through rows of those whose diets changed, one transaction per
+    batch. Returns (recipes checked, recipes changed).
+    """
+    masks = masks or load_diet_masks()
+    if recipe_ids is None:
+        recipe_ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    IngredientLink = Recipe.ingredients.through
+    DietLink = Recipe.suitable_for_diets.through
+
+    checked = changed = 0
+    for chunk in _chunks(sorted(recipe_ids), batch_size):
+        ingredients = {recipe_id: [] for recipe_id in chunk}
+        for recipe_id, ingredient_id in IngredientLink.objects.filter(recipe_id__in=chunk).values_list(
+            'recipe_id', 'ingredientalldata_id'
+        ):
+            ingredients[recipe_id].append(ingredient_id)
+        current = {recipe_id: 0 for recipe_id in chunk}
+        for recipe_id, diet_id in DietLink.objects.filter(recipe_id__in=chunk).values_list(
+            'recipe_id', 'dietarypreference_id'
+        ):
+            current[recipe_id] |= masks.bits.get(diet_id, 0)
+
+        updates = {}
+        for recipe_id, ingredient_ids in ingredients.items():
+            mask = masks.recipe_mask(ingredient_ids)
+            if mask != current[recipe_id]:
+                updates[recipe_id] = mask
+        checked += len(chunk)
+        changed += len(updates)
+        if updates and not dry_run:
+            with transaction.atomic():
+                DietLink.objects.filter(recipe_id__in=list(updates)).delete()
+                DietLink.objects.bulk_create([
+                    DietLink(recipe_id=recipe_id, dietarypreference_id=diet_id)
+                    for recipe_id, mask in updates.items()
+                    for diet_id in masks.diets(mask)
+                ], batch_size=batch_size)
+
+    if changed and not dry_run:
+        # Through-table writes send no signals
+        invalidate_recipe_index()
+    return checked, changed
@@ -0,0 +1,113 @@
+"""
+Cached "effective dietary profile" per user.
+
+Filtering views need the same few facts about a user on every request: their
+diet, which of the hard/soft diet rules apply, and their allergies expanded to
+tokens and synonyms. They are loaded with one query, stored in Django's cache
+framework and dropped by signals whenever the UserProfile or its allergies change.
+Invalidation only reaches other workers through a shared cache (REDIS_URL); with
+the per-process default, DIETARY_PROFILE_CACHE_SECONDS is kept to a few seconds.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import UserProfile
+
+from .helpers import (
+    get_allergen_matcher,
+    get_allergen_token,
+    get_related_allergens,
+    split_diets_for_popup_and_account,
+)
+
+__all__ = [
+    'DietaryProfile',
+    'EMPTY_PROFILE',
+    'get_dietary_profile',
+    'load_dietary_profile',
+    'invalidate_dietary_profile',
+]
+
+CACHE_KEY = 'dietary-profile:{user_id}'
+
+
+@dataclass(frozen=True)
+class DietaryProfile:
+    """Everything the filtering views need to know about a user's diet and allergies"""
+    user_id: int = None
+    has_profile: bool = False
+    diet_id: int = None
+    diet_name: str = None
+    hard_diets: tuple = ()
+    soft_diets: tuple = ()
+    allergy_ids: tuple = ()
+    allergy_names: tuple = ()
+    allergen_tokens: tuple = ()
+    allergen_synonyms: frozenset = frozenset()
+
+    @property
+    def has_allergies(self):
+        return bool(self.allergy_ids)
+
+    @property
+    def matcher(self):
+        """Compiled allergen matcher (shared through the matcher cache, never pickled)"""
+        return get_allergen_matcher(self.allergen_synonyms)
+
+
+EMPTY_PROFILE = DietaryProfile()
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def load_dietary_profile(user_id):
+    """Build a DietaryProfile from the database with a single query (plus one prefetch)."""
+    user_profile = (
+        UserProfile.objects.select_related('dietary_preference')
+        .prefetch_related('allergies')
+        .filter(user_id=user_id)
+        .first()
+    )
+    if user_profile is None:
+        return DietaryProfile(user_id=user_id)
+
+    diet = user_profile.dietary_preference
+    diet_split = split_diets_for_popup_and_account([diet.name] if diet else [])
+    allergies = list(user_profile.allergies.all())
+    synonyms = set()
+    for allergy in allergies:
+        synonyms.update(get_related_allergens(allergy.name))
+
+    return DietaryProfile(
+        user_id=user_id,
+        has_profile=True,
+        diet_id=diet.id if diet else None,
+        diet_name=diet.name if diet else None,
+        hard_diets=tuple(diet_split['hard']),
+        soft_diets=tuple(diet_split['soft']),
+        allergy_ids=tuple(allergy.id for allergy in allergies),
+        allergy_names=tuple(allergy.name for allergy in allergies),
+        allergen_tokens=tuple(sorted({get_allergen_token(allergy.name) for allergy in allergies})),
+        allergen_synonyms=frozenset(synonyms),
+    )
+
+
+def get_dietary_profile(user):
+    """Cached DietaryProfile for a user (EMPTY_PROFILE for anonymous users)."""
+    if user is None or not user.is_authenticated:
+        return EMPTY_PROFILE
+    key = _cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        profile = load_dietary_profile(user.pk)
+        cache.set(key, profile, getattr(settings, 'DIETARY_PROFILE_CACHE_SECONDS', 3600))
+    return profile
+
+
+def invalidate_dietary_profile(*user_ids):
+    """Forget the cached profiles of the given users."""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
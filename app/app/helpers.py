@@ -1,9 +1,11 @@
 """
 Helper functions for dietary filtering, allergen filtering, and normalization.
 """
-import re
+import json
+import os
 from django.db.models import Case, When, IntegerField
-from core.models import UserProfile
+from .allergen_matcher import AllergenMatcher, compile_allergen_matcher
+from .canonical import canonical_title
 
 # --- Dietary filtering logic ---
 HARD_DIETS = {
@@ -26,6 +28,8 @@ SOFT_DIETS = {
 __all__ = [
     'HARD_DIETS',
     'SOFT_DIETS',
+    'ALLERGEN_SYNONYMS',
+    'ALLERGEN_SAFE_NAMES',
     'get_dietary_filter_type',
     'split_diets_for_popup_and_account',
     'filter_and_prioritize_recipes',
@@ -33,6 +37,10 @@ __all__ = [
     'get_related_allergens',
     'get_user_allergen_filters',
     'is_ingredient_safe_from_allergens',
+    'get_allergen_token',
+    'get_allergen_matcher',
+    'get_token_matcher',
+    'get_allergen_tokens',
 ]
 
 def get_dietary_filter_type(diet_name):
@@ -71,60 +79,58 @@ def filter_and_prioritize_recipes(recipes, user_diets):
 
 def normalize_title(title):
     """Normalize recipe title for comparison"""
-    title = re.sub(r'\(.*?\)', '', title)
-    return title.strip().lower().replace("'", "'").replace("`", "'").replace(""", '"').replace(""", '"')
+    return canonical_title(title)
+
+# --- Allergen filtering logic ---
+# Synonym groups keyed by the canonical allergen token, plus names that are never
+# treated as allergens (e.g. 'eggplant' contains 'egg'), live in resources/allergens.json
+ALLERGEN_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'allergens.json'
+)
+with open(ALLERGEN_DATA_PATH, encoding='utf-8') as allergen_file:
+    _allergen_data = json.load(allergen_file)
+ALLERGEN_SYNONYMS = _allergen_data['synonyms']
+ALLERGEN_SAFE_NAMES = frozenset(_allergen_data['safe_names'])
+
+# Reverse index synonym -> group key; the first group listing a synonym wins
+_SYNONYM_GROUPS = {}
+for _key, _values in ALLERGEN_SYNONYMS.items():
+    for _value in _values:
+        _SYNONYM_GROUPS.setdefault(_value, _key)
 
 def get_related_allergens(allergen_name):
     """Get all related allergen names for comprehensive filtering"""
-    allergen_map = {
-        'milk': ['milk', 'dairy', 'lactose', 'casein', 'whey', 'butter', 'cream', 'cheese', 'yogurt', 'sour cream', 'cream cheese', 'ice cream'],
-        'eggs': ['eggs', 'egg', 'egg white', 'egg yolk', 'albumin'],
-        'peanuts': ['peanuts', 'peanut', 'peanut butter', 'groundnut'],
-        'tree nuts': ['almonds', 'walnuts', 'cashews', 'pistachios', 'hazelnuts', 'brazil nuts', 'pecans', 'macadamia nuts', 'pine nuts', 'chestnuts', 'tree nuts'],
-        'soy': ['soy', 'soya', 'soybean', 'tofu', 'tempeh', 'miso', 'soy sauce', 'edamame'],
-        'fish': ['fish', 'salmon', 'tuna', 'cod', 'halibut', 'sardines', 'anchovies', 'mackerel', 'trout'],
-        'shellfish': ['shellfish', 'shrimp', 'crab', 'lobster', 'oysters', 'mussels', 'clams', 'scallops', 'prawns'],
-        'wheat': ['wheat', 'flour', 'bread', 'pasta', 'cereals', 'crackers', 'cookies'],
-        'sesame': ['sesame', 'sesame seeds', 'tahini', 'sesame oil'],
-        'gluten': ['gluten', 'wheat', 'barley', 'rye', 'oats', 'spelt', 'kamut', 'triticale', 'bulgur', 'semolina', 'durum'],
-        'sulphites': ['sulphites', 'sulfites', 'sulfur dioxide', 'sodium sulfite'],
-        'corn': ['corn', 'maize', 'corn starch', 'corn syrup', 'cornmeal'],
-        'mustard': ['mustard', 'mustard seeds', 'dijon mustard'],
-        'celery': ['celery', 'celery seeds', 'celeriac'],
-        'lupin': ['lupin', 'lupine'],
-        'coconut': ['coconut', 'coconut oil', 'coconut milk', 'coconut cream'],
-        'yeast': ['yeast', 'nutritional yeast', 'bakers yeast'],
-        'chocolate': ['chocolate', 'cocoa', 'cacao', 'dark chocolate', 'milk chocolate'],
-        'tomatoes': ['tomatoes', 'tomato', 'tomato sauce', 'ketchup', 'marinara'],
-        'citrus': ['citrus', 'lemon', 'lime', 'orange', 'grapefruit', 'tangerine'],
-    }
-    for key, values in allergen_map.items():
-        if allergen_name.lower() in values:
-            return values
+    key = _SYNONYM_GROUPS.get(allergen_name.lower())
+    if key is not None:
+        return ALLERGEN_SYNONYMS[key]
     return [allergen_name.lower()]
 
+def get_allergen_token(allergen_name):
+    """Canonical token for an allergy: its synonym group key, or its lowercased name"""
+    return _SYNONYM_GROUPS.get(allergen_name.lower(), allergen_name.lower())
+
+def get_allergen_matcher(allergen_names):
+    """Compiled (and cached) matcher for a set of allergen synonyms"""
+    return compile_allergen_matcher(allergen_names, ALLERGEN_SAFE_NAMES)
+
+def get_token_matcher(vocabulary):
+    """Compiled matcher reporting tokens for a {token: synonyms} vocabulary"""
+    return compile_allergen_matcher(vocabulary, ALLERGEN_SAFE_NAMES)
+
 def get_user_allergen_filters(user):
     """Get comprehensive allergen filter for a user"""
-    try:
-        user_profile = UserProfile.objects.get(user=user)
-        if user_profile.allergies.exists():
-            all_allergen_names = set()
-            for allergy in user_profile.allergies.all():
-                related_allergens = get_related_allergens(allergy.name)
-                all_allergen_names.update(related_allergens)
-            return list(all_allergen_names)
-    except UserProfile.DoesNotExist:
-        pass
-    return []
+    from .dietary_profile import get_dietary_profile
+    return list(get_dietary_profile(user).allergen_synonyms)
 
 def is_ingredient_safe_from_allergens(ingredient_name, user_allergen_names):
-    """Check if an ingredient is safe from user's allergens, with exceptions"""
-    ingredient_lower = ingredient_name.lower()
-    if ingredient_lower == 'eggplant':
-        return True
-    if ingredient_lower == "milk chocolate":
-        return True
-    for allergen_name in user_allergen_names:
-        if allergen_name.lower() in ingredient_lower:
-            return False
-    return True
+    """
+    Check if an ingredient is safe from user's allergens, with exceptions.
+    Accepts allergen names or a compiled matcher; pass the matcher in loops.
+    """
+    if not isinstance(user_allergen_names, AllergenMatcher):
+        user_allergen_names = get_allergen_matcher(user_allergen_names)
+    return user_allergen_names.is_safe(ingredient_name)
+
+def get_allergen_tokens(allergies):
+    """Allergen tokens to exclude for a collection of Allergy objects"""
+    return sorted({get_allergen_token(allergy.name) for allergy in allergies})
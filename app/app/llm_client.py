@@ -0,0 +1,146 @@
+"""
+Rate-limited, retrying chat completion client for batch jobs (categorize_meals).
+
+Calls go through the openai 1.x client, so `base_url` can point at any
+compatible server, including the `serve_llm_stub` command used for offline
+benchmarks. Two token buckets pace the calls, one for requests and one for
+(estimated) tokens per minute, and shared by every worker thread. Rate limit,
+timeout, connection and 5xx errors are retried with jittered exponential
+backoff.
+"""
+import random
+import threading
+import time
+
+__all__ = [
+    'ChatClient',
+    'RateLimiter',
+    'TokenBucket',
+    'estimate_tokens',
+]
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate_per_minute`, holding at most
+    `capacity` tokens (default: one minute's worth).
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def give_back(self, amount):
+        """Return tokens that were over-estimated"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets (either may be None for no limit)"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(tokens)
+
+    def settle(self, estimated, used):
+        """Credit back the difference when a call used fewer tokens than estimated"""
+        if self.tokens and used is not None and used < estimated:
+            self.tokens.give_back(estimated - used)
+
+
+class ChatClient:
+    """
+    Chat completions with client-side rate limiting and retries.
+
+    Thread-safe: one instance is shared by all workers of a batch job.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model='gpt-3.5-turbo', limiter=None,
+                 max_retries=5, base_delay=1.0, max_delay=30.0, timeout=60.0):
+        import openai
+        self.openai = openai
+        # Retries are ours (with the shared limiter), not the SDK's
+        self.client = openai.OpenAI(
+            api_key=api_key or 'unused', base_url=base_url, max_retries=0, timeout=timeout
+        )
+        self.model = model
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def _retryable(self, error):
+        openai = self.openai
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    def _delay(self, attempt, error):
+        # Honour Retry-After when the server sends one, else full jitter
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return min(float(retry_after), self.max_delay)
+        except (TypeError, ValueError):
+            return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def complete(self, messages, max_tokens=200, temperature=0.3):
+        """Content of the first choice; raises the last error once retries run out"""
+        estimated = sum(estimate_tokens(message['content']) for message in messages) + max_tokens
+        attempt = 0
+        while True:
+            self.limiter.acquire(estimated)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model, messages=messages, max_tokens=max_tokens, temperature=temperature
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not self._retryable(e):
+                    raise
+                with self.lock:
+                    self.stats['retries'] += 1
+                time.sleep(self._delay(attempt, e))
+                attempt += 1
+                continue
+
+            usage = response.usage
+            self.limiter.settle(estimated, usage.total_tokens if usage else None)
+            with self.lock:
+                self.stats['requests'] += 1
+                if usage:
+                    self.stats['prompt_tokens'] += usage.prompt_tokens
+                    self.stats['completion_tokens'] += usage.completion_tokens
+            return response.choices[0].message.content
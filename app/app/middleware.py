@@ -0,0 +1,54 @@
+"""
+Request middleware for per-request user context and query accounting.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from .dietary_profile import get_dietary_profile
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts the statements it sees"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class DietContextMiddleware:
+    """
+    Attach `request.diet_context`, the user's DietaryProfile, loaded at most once
+    per request and only if a view asks for it. Evaluation is lazy because DRF
+    authenticates (JWT) inside the view, after middleware has run.
+
+    With QUERY_COUNT_HEADER enabled every response also reports how many SQL
+    statements it took in an X-Query-Count header, and requests above
+    QUERY_COUNT_WARNING_THRESHOLD are logged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.diet_context = SimpleLazyObject(lambda: get_dietary_profile(request.user))
+
+        if not getattr(settings, 'QUERY_COUNT_HEADER', False):
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(counter.count)
+
+        threshold = getattr(settings, 'QUERY_COUNT_WARNING_THRESHOLD', None)
+        if threshold is not None and counter.count > threshold:
+            logger.warning('%s %s ran %d queries', request.method, request.path, counter.count)
+        return response
@@ -0,0 +1,141 @@
+"""
+Project-wide pagination policy for list endpoints.
+
+List responses stay plain JSON arrays (the frontend consumes them as such) but are
+always bounded: `?limit=` / `?offset=` select a window, each ViewSet caps the page
+size with `page_size` / `max_page_size`, and the total and neighbouring pages are
+reported in the X-Total-Count and Link headers. Lists the frontend reads in one
+request use WholeListPagination, whose default page is API_WHOLE_LIST_PAGE_SIZE. Large exports can opt in to a
+streamed response with `?stream=true` on ViewSets that set `streamable = True`;
+streaming serializes the queryset chunk by chunk and is itself capped by
+API_STREAM_MAX_ROWS.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = [
+    'BoundedLimitOffsetPagination',
+    'StreamingListMixin',
+    'WholeListPagination',
+    'paginate_list',
+]
+
+STREAM_CHUNK_SIZE = 500
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BoundedLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination whose page size can never exceed API_MAX_PAGE_SIZE.
+
+    Views override the defaults with `page_size` (used when no limit is given)
+    and `max_page_size` (the largest limit honoured); both are clamped to the
+    project-wide hard cap. Function-based views pass `page_size` to the
+    constructor instead.
+    """
+    default_page_size_setting = 'API_DEFAULT_PAGE_SIZE'
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        hard_cap = _setting('API_MAX_PAGE_SIZE', 1000)
+        self.max_limit = min(getattr(view, 'max_page_size', None) or hard_cap, hard_cap)
+        self.default_limit = min(
+            getattr(view, 'page_size', None) or self.page_size or _setting(self.default_page_size_setting, 100),
+            self.max_limit,
+        )
+        # Offsets over an unordered queryset are not stable between requests
+        if hasattr(queryset, 'ordered') and not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        links = []
+        next_url = self.get_next_link()
+        previous_url = self.get_previous_link()
+        if next_url:
+            links.append(f'<{next_url}>; rel="next"')
+        if previous_url:
+            links.append(f'<{previous_url}>; rel="prev"')
+        headers = {'X-Total-Count': str(self.count)}
+        if links:
+            headers['Link'] = ', '.join(links)
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema):
+        return schema
+
+
+class WholeListPagination(BoundedLimitOffsetPagination):
+    """For lists the frontend reads in one request; still clamped to API_MAX_PAGE_SIZE."""
+    default_page_size_setting = 'API_WHOLE_LIST_PAGE_SIZE'
+
+
+def paginate_list(queryset, request, serializer_class, view=None, context=None, page_size=None,
+                  pagination_class=BoundedLimitOffsetPagination):
+    """Bounded response for function-based views that return a list of objects."""
+    paginator = pagination_class(page_size)
+    page = paginator.paginate_queryset(queryset, request, view)
+    serializer = serializer_class(page, many=True, context=context or {'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+class StreamingListMixin:
+    """
+    Lets `?stream=true` return the whole (filtered) list as a streamed JSON array.
+
+    Only ViewSets with `streamable = True` honour it. Rows are fetched and
+    serialized STREAM_CHUNK_SIZE at a time, so memory stays flat, and at most
+    API_STREAM_MAX_ROWS rows are written (X-Truncated tells the client when the
+    cap was hit).
+    """
+    streamable = False
+
+    def wants_stream(self, request):
+        return self.streamable and request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        if not self.wants_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        max_rows = _setting('API_STREAM_MAX_ROWS', 50000)
+        total = queryset.count()
+
+        response = StreamingHttpResponse(
+            self.stream_rows(queryset[:max_rows]), content_type='application/json'
+        )
+        response['X-Total-Count'] = str(total)
+        if total > max_rows:
+            response['X-Truncated'] = 'true'
+        return response
+
+    def stream_rows(self, queryset):
+        yield '['
+        first = True
+        chunk = []
+        for obj in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            chunk.append(obj)
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                yield from self._encode_chunk(chunk, first)
+                first = False
+                chunk = []
+        if chunk:
+            yield from self._encode_chunk(chunk, first)
+        yield ']'
+
+    def _encode_chunk(self, chunk, first):
+        for index, row in enumerate(self.get_serializer(chunk, many=True).data):
+            separator = '' if first and index == 0 else ','
+            yield separator + json.dumps(row, cls=JSONEncoder, ensure_ascii=False)
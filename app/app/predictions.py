@@ -0,0 +1,46 @@
+"""
+Access to recipe_model.keras predictions from the web process.
+
+With INFERENCE_SOCKET set, requests go to the `serve_inference` sidecar and
+TensorFlow is never imported here; otherwise an in-process micro-batcher is
+started on first use.
+"""
+import threading
+
+from django.conf import settings
+
+from resources.actual_ai import registry
+from resources.inference import LocalPredictor, SocketPredictor
+
+from .recipe_similarity import store_row_for_title
+
+__all__ = [
+    'get_predictor',
+    'recipe_features',
+]
+
+_predictor = None
+_predictor_lock = threading.Lock()
+
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                if settings.INFERENCE_SOCKET:
+                    _predictor = SocketPredictor(settings.INFERENCE_SOCKET)
+                else:
+                    _predictor = LocalPredictor(
+                        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+                    )
+    return _predictor
+
+
+def recipe_features(recipe):
+    """Model input for a Recipe (its stored embedding), or None if it has none"""
+    row = store_row_for_title(recipe.name)
+    if row is None:
+        return None
+    return registry.get('recipe_store').embeddings[row]
@@ -0,0 +1,402 @@
+"""
+Bulk loading of recipes from the test_dataset.csv layout.
+
+Rows are parsed into ParsedRow tuples (optionally by a pool of worker
+processes, see parse_rows), ingredient names are resolved through the
+in-memory IngredientVocabulary, and every batch is written with a handful of
+bulk statements inside one transaction: new recipes, the ingredient and diet
+through-table rows, and the recipes' allergen tokens. Recipe names already in
+the database are looked up in a name -> id map loaded once up front.
+
+Every row carries a hash of its source fields, stored on the recipe, so a
+re-import skips rows that have not changed; the last committed row is kept in
+RecipeImportCheckpoint so an interrupted import resumes where it stopped.
+When a title occurs more than once in a file only its last row is written
+(see last_rows_by_name), so the stored hash is stable between runs.
+
+CopyRecipeWriter is the same pipeline for large loads: batches are streamed
+into staging tables with COPY and merged with set-based SQL.
+"""
+import ast
+import csv
+import hashlib
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.db import connections, transaction
+
+from core.models import Recipe, RecipeImportCheckpoint
+
+from .allergen_tokens import rebuild_recipe_allergen_tokens
+from .canonical import canonical_ingredients, get_ingredient_vocabulary
+from .diet_masks import load_diet_masks
+from .recipe_index import invalidate_recipe_index
+
+__all__ = [
+    'CopyRecipeWriter',
+    'ImportStats',
+    'ParsedRow',
+    'RecipeBulkWriter',
+    'last_rows_by_name',
+    'open_checkpoint',
+    'parse_row',
+    'parse_rows',
+]
+
+BATCH_SIZE = 1000
+
+# Rows handed to a parser process at a time
+PARSE_CHUNK_SIZE = 500
+
+ParsedRow = namedtuple(
+    'ParsedRow', 'row_num name description steps ingredient_names canonical_names source_hash'
+)
+
+SOURCE_FIELDS = ('title', 'ingredients', 'directions', 'NER')
+
+
+def source_hash(row):
+    """Hash of the CSV fields a recipe is built from"""
+    return hashlib.sha1('\x1f'.join(row[field] for field in SOURCE_FIELDS).encode()).hexdigest()
+
+
+def parse_row(row_num, row):
+    """ParsedRow for one CSV dict row; raises ValueError for rows that cannot be imported"""
+    name = row['title'].strip()
+    if not name:
+        raise ValueError('Empty recipe name')
+    try:
+        steps = "\n".join(ast.literal_eval(row['directions']))
+        ingredient_names = ast.literal_eval(row['NER'])
+    except (SyntaxError, ValueError) as e:
+        raise ValueError(f'Malformed directions/NER: {e}')
+    ingredient_names = tuple(ingredient.strip() for ingredient in ingredient_names if ingredient.strip())
+    return ParsedRow(
+        row_num, name, row['ingredients'], steps, ingredient_names,
+        tuple(canonical_ingredients(ingredient_names)), source_hash(row),
+    )
+
+
+def parse_chunk(chunk):
+    """[(row_num, ParsedRow or None, error or None)] for a list of (row_num, row)"""
+    results = []
+    for row_num, row in chunk:
+        try:
+            results.append((row_num, parse_row(row_num, row), None))
+        except (KeyError, ValueError) as e:
+            results.append((row_num, None, str(e)))
+    return results
+
+
+def _read_chunks(path, start, limit, chunk_size):
+    with open(path, encoding='utf-8') as f:
+        rows = islice(enumerate(csv.DictReader(f), start=1), start, limit)
+        while chunk := list(islice(rows, chunk_size)):
+            yield chunk
+
+
+def parse_rows(path, limit=None, workers=1, chunk_size=PARSE_CHUNK_SIZE, start=0):
+    """
+    Yield (row_num, ParsedRow or None, error or None) for rows `start` + 1 to
+    `limit` of a CSV, in file order. With workers > 1, chunks are parsed by a process
+    pool; at most two chunks per worker are in flight, so memory stays bounded
+    and the output is the same as with one worker.
+    """
+    chunks = _read_chunks(path, start, limit, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from parse_chunk(chunk)
+        return
+
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def last_rows_by_name(path, limit=None):
+    """{recipe name: number of the last row with that title} for the first `limit` rows"""
+    last_rows = {}
+    with open(path, encoding='utf-8') as f:
+        for row_num, row in islice(enumerate(csv.DictReader(f), start=1), limit):
+            name = (row.get('title') or '').strip()
+            if name:
+                last_rows[name] = row_num
+    return last_rows
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def open_checkpoint(path, restart=False):
+    """
+    RecipeImportCheckpoint for a CSV, reset to row 0 unless it belongs to an
+    interrupted run over the same (unmodified) file.
+    """
+    fingerprint = file_fingerprint(path)
+    checkpoint, _ = RecipeImportCheckpoint.objects.get_or_create(
+        source=os.path.abspath(path), defaults={'fingerprint': fingerprint}
+    )
+    if restart or checkpoint.completed or checkpoint.fingerprint != fingerprint:
+        checkpoint.fingerprint = fingerprint
+        checkpoint.last_row = 0
+        checkpoint.completed = False
+        checkpoint.save()
+    return checkpoint
+
+
+class ImportStats:
+    """Counters for an import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.missing_ingredients = {}
+
+    def skip_missing(self, names):
+        self.skipped += 1
+        for name in names:
+            self.missing_ingredients[name] = self.missing_ingredients.get(name, 0) + 1
+
+
+class RecipeBulkWriter:
+    """
+    Writes batches of ParsedRow into Recipe and its through tables.
+
+    Like the row-by-row import, a recipe is skipped when any of its ingredients
+    is unknown, rows update the existing recipe with the same name, and a recipe
+    suits every diet that allows all of its ingredients. Rows whose source hash
+    matches the recipe's are not written at all; a changed row replaces the
+    recipe's description, steps, ingredients and diets.
+
+    With a `checkpoint`, each batch's transaction also records the last row read.
+    With `last_rows` (see last_rows_by_name), rows superseded by a later row
+    with the same title are not written at all.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, checkpoint=None, last_rows=None):
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.last_rows = last_rows
+        self.vocabulary = get_ingredient_vocabulary()
+        self.recipe_ids = {}
+        self.source_hashes = {}
+        recipes = Recipe.objects.order_by('id').values_list('id', 'name', 'source_hash')
+        for recipe_id, name, row_hash in recipes.iterator(chunk_size=10000):
+            self.recipe_ids.setdefault(name, recipe_id)
+            self.source_hashes[recipe_id] = row_hash
+        self.diet_masks = load_diet_masks()
+        self.stats = ImportStats()
+
+    def resolve(self, row):
+        """(ingredient ids, missing names) for a parsed row"""
+        ingredient_ids = []
+        missing = []
+        for name, canonical in zip(row.ingredient_names, row.canonical_names):
+            # Same as vocabulary.resolve(), with the canonical form computed by the parser
+            ingredient_id = self.vocabulary.by_name.get(name)
+            if ingredient_id is None:
+                ingredient_id = self.vocabulary.by_canonical.get(canonical)
+            if ingredient_id is None:
+                missing.append(name)
+            elif ingredient_id not in ingredient_ids:
+                ingredient_ids.append(ingredient_id)
+        return ingredient_ids, missing
+
+    def suitable_diets(self, ingredient_ids):
+        return self.diet_masks.suitable_diets(ingredient_ids)
+
+    def write(self, rows, last_row=None):
+        """Import one batch of ParsedRow in a single transaction; `last_row` is checkpointed"""
+        new = {}
+        changed = {}
+        links = {}
+        for row in rows:
+            self.stats.rows += 1
+            if self.last_rows is not None and self.last_rows.get(row.name, row.row_num) != row.row_num:
+                self.stats.duplicates += 1
+                continue
+            recipe_id = self.recipe_ids.get(row.name)
+            # Same content as stored, unless an earlier row of this batch is about to overwrite it
+            if (recipe_id is not None and row.name not in links
+                    and self.source_hashes.get(recipe_id) == row.source_hash):
+                self.stats.unchanged += 1
+                continue
+            ingredient_ids, missing = self.resolve(row)
+            if missing:
+                self.stats.skip_missing(missing)
+                continue
+            recipe = Recipe(
+                name=row.name, description=row.description, steps=row.steps,
+                created_by_ai=False, source_hash=row.source_hash,
+            )
+            # A later row with the same name replaces the earlier row
+            if recipe_id is not None:
+                recipe.pk = recipe_id
+                changed[recipe_id] = recipe
+                self.stats.updated += 1
+            else:
+                if row.name in new:
+                    self.stats.updated += 1
+                else:
+                    self.stats.created += 1
+                new[row.name] = recipe
+            links[row.name] = ingredient_ids
+
+        with transaction.atomic():
+            if links:
+                self.store(new, list(changed.values()), links)
+            if self.checkpoint is not None and last_row is not None:
+                self.checkpoint.last_row = last_row
+                self.checkpoint.save(update_fields=['last_row', 'updated_at'])
+
+    def store(self, new, changed, links):
+        """
+        Insert `new` {name: Recipe}, update the `changed` Recipes and replace the
+        links of every recipe named in `links`
+        """
+        Recipe.objects.bulk_create(new.values(), batch_size=self.batch_size)
+        for name, recipe in new.items():
+            self.recipe_ids[name] = recipe.pk
+        self.update_changed(changed)
+        recipe_ids = [self.recipe_ids[name] for name in links]
+        self._replace_links(recipe_ids, [links[name] for name in links])
+        rebuild_recipe_allergen_tokens(recipe_ids)
+        for recipe in [*new.values(), *changed]:
+            self.source_hashes[recipe.pk] = recipe.source_hash
+
+    def update_changed(self, changed):
+        Recipe.objects.bulk_update(changed, ['description', 'steps', 'source_hash'], batch_size=self.batch_size)
+
+    def _replace_links(self, recipe_ids, ingredient_lists):
+        IngredientLink = Recipe.ingredients.through
+        DietLink = Recipe.suitable_for_diets.through
+        IngredientLink.objects.filter(recipe_id__in=recipe_ids).delete()
+        DietLink.objects.filter(recipe_id__in=recipe_ids).delete()
+        IngredientLink.objects.bulk_create(
+            [
+                IngredientLink(recipe_id=recipe_id, ingredientalldata_id=ingredient_id)
+                for recipe_id, ingredient_ids in zip(recipe_ids, ingredient_lists)
+                for ingredient_id in ingredient_ids
+            ],
+            batch_size=self.batch_size,
+        )
+        DietLink.objects.bulk_create(
+            [
+                DietLink(recipe_id=recipe_id, dietarypreference_id=diet_id)
+                for recipe_id, ingredient_ids in zip(recipe_ids, ingredient_lists)
+                for diet_id in self.suitable_diets(ingredient_ids)
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def finish(self):
+        if self.checkpoint is not None:
+            self.checkpoint.completed = True
+            self.checkpoint.save(update_fields=['completed', 'updated_at'])
+        # bulk_create sends no signals, so drop this process's search index explicitly
+        invalidate_recipe_index()
+        return self.stats
+
+
+class CopyRecipeWriter(RecipeBulkWriter):
+    """
+    RecipeBulkWriter that streams each batch into temporary staging tables
+    (COPY FROM STDIN on PostgreSQL, executemany elsewhere) and merges them into
+    the recipe tables with a few set-based statements.
+    """
+
+    STAGING_TABLES = {
+        'import_stage_recipe': 'ord integer, name varchar(255), description text, steps text, source_hash varchar(40)',
+        'import_stage_ingredient': 'name varchar(255), ingredient_id integer',
+        'import_stage_diet': 'name varchar(255), diet_id integer',
+        'import_stage_ids': 'name varchar(255), recipe_id integer',
+    }
+
+    def __init__(self, batch_size=BATCH_SIZE, checkpoint=None, last_rows=None):
+        super().__init__(batch_size, checkpoint, last_rows)
+        self.connection = connections[Recipe.objects.db]
+        with self.connection.cursor() as cursor:
+            for table, columns in self.STAGING_TABLES.items():
+                cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {table} ({columns})')
+
+    def copy_rows(self, cursor, table, columns, rows):
+        if self.connection.vendor == 'postgresql':
+            with cursor.copy(f'COPY {table} ({", ".join(columns)}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', list(rows))
+
+    def store(self, new, changed, links):
+        qn = self.connection.ops.quote_name
+        recipe_table = qn(Recipe._meta.db_table)
+        ingredient_table = qn(Recipe.ingredients.through._meta.db_table)
+        diet_table = qn(Recipe.suitable_for_diets.through._meta.db_table)
+        tags = Recipe._meta.get_field('tags').get_db_prep_save([], self.connection)
+
+        with self.connection.cursor() as cursor:
+            for table in self.STAGING_TABLES:
+                cursor.execute(f'DELETE FROM {table}')
+            self.copy_rows(cursor, 'import_stage_recipe', ('ord', 'name', 'description', 'steps', 'source_hash'), (
+                (position, recipe.name, recipe.description, recipe.steps, recipe.source_hash)
+                for position, recipe in enumerate(new.values())
+            ))
+            self.copy_rows(cursor, 'import_stage_ingredient', ('name', 'ingredient_id'), (
+                (name, ingredient_id) for name, ingredient_ids in links.items() for ingredient_id in ingredient_ids
+            ))
+            self.copy_rows(cursor, 'import_stage_diet', ('name', 'diet_id'), (
+                (name, diet_id) for name, ingredient_ids in links.items() for diet_id in self.suitable_diets(ingredient_ids)
+            ))
+            # Existing recipes are known by id; new ones get theirs from the merge below
+            self.copy_rows(cursor, 'import_stage_ids', ('name', 'recipe_id'), (
+                (name, self.recipe_ids[name]) for name in links if name in self.recipe_ids
+            ))
+
+            cursor.execute(f"""
+                INSERT INTO {recipe_table} (name, description, steps, source_hash, created_by_ai, tags)
+                SELECT name, description, steps, source_hash, %s, %s FROM import_stage_recipe ORDER BY ord
+            """, [False, tags])
+            cursor.execute(f"""
+                INSERT INTO import_stage_ids (name, recipe_id)
+                SELECT s.name, MIN(r.id) FROM import_stage_recipe s
+                JOIN {recipe_table} r ON r.name = s.name
+                GROUP BY s.name
+            """)
+            for table in (ingredient_table, diet_table):
+                cursor.execute(f'DELETE FROM {table} WHERE recipe_id IN (SELECT recipe_id FROM import_stage_ids)')
+            cursor.execute(f"""
+                INSERT INTO {ingredient_table} (recipe_id, ingredientalldata_id)
+                SELECT DISTINCT m.recipe_id, s.ingredient_id
+                FROM import_stage_ingredient s JOIN import_stage_ids m ON m.name = s.name
+            """)
+            cursor.execute(f"""
+                INSERT INTO {diet_table} (recipe_id, dietarypreference_id)
+                SELECT DISTINCT m.recipe_id, s.diet_id
+                FROM import_stage_diet s JOIN import_stage_ids m ON m.name = s.name
+            """)
+            cursor.execute('SELECT name, recipe_id FROM import_stage_ids')
+            self.recipe_ids.update(cursor.fetchall())
+        # Changed rows are expected to be few once the catalog is loaded
+        self.update_changed(changed)
+
+        rebuild_recipe_allergen_tokens([self.recipe_ids[name] for name in links])
+        for recipe in new.values():
+            self.source_hashes[self.recipe_ids[recipe.name]] = recipe.source_hash
+        for recipe in changed:
+            self.source_hashes[recipe.pk] = recipe.source_hash
@@ -0,0 +1,413 @@
+"""
+Process-local inverted index from ingredients (and diets/allergens) to recipe bitmaps.
+
+Recipes are numbered by their position in (name, id) order, so a bitmap is a
+Python int whose bit N means "the Nth recipe alphabetically". Set operations
+(AND / AND-NOT) run in C on the int representation and paging a result is just
+walking its set bits in order, which keeps the search endpoint away from the
+recipe-ingredient join until the final page needs hydrating.
+
+Keys with few recipes are kept as an array of positions (the same array/bitmap
+container split Roaring bitmaps use) and only expanded into an int when a
+query touches them.
+
+For ranked partial matching the recipe -> ingredient links are also kept as
+NumPy CSR/CSC arrays, so counting how many pantry items each recipe uses is a
+handful of vectorized scatter-adds over the whole catalog.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+
+from core.models import CatalogVersion, Recipe, RecipeAllergenToken
+
+__all__ = [
+    'RankedMatch',
+    'RecipeIndex',
+    'build_recipe_index',
+    'index_from_rows',
+    'get_recipe_index',
+    'invalidate_recipe_index',
+]
+
+
+def _container(positions, size):
+    """Pick the smaller representation for a list of recipe positions."""
+    # An array costs 4 bytes per recipe, a bitmap size / 8 bytes overall
+    if len(positions) * 32 < size:
+        return array('I', sorted(positions))
+    bits = bytearray((size + 7) // 8)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _as_bitmap(container, size):
+    """Expand a stored container into an int bitmap."""
+    if isinstance(container, int):
+        return container
+    bits = bytearray((size + 7) // 8)
+    for pos in container:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _group_positions(pairs, position):
+    """Group (key, recipe_id) rows into {key: [positions]}"""
+    grouped = {}
+    for key, recipe_id in pairs:
+        pos = position.get(recipe_id)
+        if pos is not None:
+            grouped.setdefault(key, []).append(pos)
+    return grouped
+
+
+def _compressed(major, minor, size):
+    """
+    Compressed sparse layout of (major, minor) pairs: `indptr[i]:indptr[i + 1]`
+    slices the minor values of major index i out of `indices`.
+    """
+    order = np.argsort(major, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(major, minlength=size), out=indptr[1:])
+    return indptr, minor[order]
+
+
+# One row of RecipeIndex.rank output
+RankedMatch = namedtuple('RankedMatch', ['position', 'used', 'missing', 'score'])
+
+
+class RecipeIndex:
+    """Immutable snapshot of the recipe catalog as bitmaps keyed by related ids."""
+
+    def __init__(self, keys, ingredients, diets, allergens, tokens=None, links=None, signature=None):
+        self.keys = keys
+        self.recipe_ids = [recipe_id for _, recipe_id in keys]
+        self.position = {recipe_id: pos for pos, recipe_id in enumerate(self.recipe_ids)}
+        self.size = len(keys)
+        self.all_bits = (1 << self.size) - 1
+        self._ingredients = ingredients
+        self._diets = diets
+        self._allergens = allergens
+        self._tokens = tokens or {}
+        self._diet_tagged = None
+        self._set_links(links)
+        self.signature = signature
+        self.built_at = time.monotonic()
+
+    def _set_links(self, links):
+        """Keep (ingredient_ids, positions) link arrays as recipe-major and ingredient-major CSR"""
+        if links is None:
+            links = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        ingredient_ids, positions = (np.asarray(column, dtype=np.int64) for column in links)
+        # Recipe -> ingredient ids, for missing-ingredient lists
+        self._recipe_indptr, self._recipe_ingredients = _compressed(positions, ingredient_ids, self.size)
+        self.recipe_sizes = np.diff(self._recipe_indptr).astype(np.int32)
+        # Ingredient -> recipe positions, addressed through the sorted distinct ingredient ids
+        self._ingredient_ids, ingredient_rank = np.unique(ingredient_ids, return_inverse=True)
+        self._ingredient_indptr, self._ingredient_positions = _compressed(
+            ingredient_rank, positions, len(self._ingredient_ids)
+        )
+
+    def __len__(self):
+        return self.size
+
+    def _lookup(self, containers, key):
+        container = containers.get(key)
+        if container is None:
+            return 0
+        return _as_bitmap(container, self.size)
+
+    def ingredient_bitmap(self, ingredient_id):
+        return self._lookup(self._ingredients, ingredient_id)
+
+    def diet_bitmap(self, diet_id):
+        return self._lookup(self._diets, diet_id)
+
+    def allergen_bitmap(self, allergy_id):
+        return self._lookup(self._allergens, allergy_id)
+
+    def token_bitmap(self, token):
+        return self._lookup(self._tokens, token)
+
+    def diet_or_untagged_bitmap(self, diet_id):
+        """Recipes suitable for a diet plus recipes that have no diet tags at all"""
+        if self._diet_tagged is None:
+            tagged = 0
+            for container in self._diets.values():
+                tagged |= _as_bitmap(container, self.size)
+            self._diet_tagged = tagged
+        return self.diet_bitmap(diet_id) | (self.all_bits & ~self._diet_tagged)
+
+    def ingredient_frequency(self, ingredient_id):
+        """Number of recipes using an ingredient, used to order intersections."""
+        container = self._ingredients.get(ingredient_id)
+        if container is None:
+            return 0
+        if isinstance(container, int):
+            return container.bit_count()
+        return len(container)
+
+    def match(self, include=(), exclude=(), diets=(), exclude_allergens=(),
+              lenient_diets=(), exclude_tokens=()):
+        """
+        Bitmap of recipes that contain ALL `include` ingredients, none of the
+        `exclude` ingredients, suit every diet in `diets` and are not tagged
+        with any of `exclude_allergens`.
+
+        `lenient_diets` also lets through recipes without diet tags, and
+        `exclude_tokens` drops recipes with those precomputed allergen tokens.
+        """
+        result = self.all_bits
+        # Rarest ingredient first so the running result shrinks as fast as possible
+        for ingredient_id in sorted(set(include), key=self.ingredient_frequency):
+            result &= self.ingredient_bitmap(ingredient_id)
+            if not result:
+                return 0
+        for diet_id in diets:
+            result &= self.diet_bitmap(diet_id)
+        for diet_id in lenient_diets:
+            result &= self.diet_or_untagged_bitmap(diet_id)
+        for token in exclude_tokens:
+            result &= ~self.token_bitmap(token)
+        for ingredient_id in exclude:
+            result &= ~self.ingredient_bitmap(ingredient_id)
+        for allergy_id in exclude_allergens:
+            result &= ~self.allergen_bitmap(allergy_id)
+        return result & self.all_bits
+
+    @staticmethod
+    def count(bitmap):
+        return bitmap.bit_count()
+
+    def positions(self, bitmap, offset=0, limit=50, start=0):
+        """
+        Positions of the `limit` matches after skipping `offset` of them, looking
+        only at positions >= `start`.
+        """
+        bitmap >>= start
+        if limit <= 0 or not bitmap:
+            return []
+        # Least significant bit first, so string index == recipe position - start
+        bits = bin(bitmap)[:1:-1]
+        found = []
+        pos = bits.find('1')
+        skipped = 0
+        while pos != -1 and len(found) < limit:
+            if skipped < offset:
+                skipped += 1
+            else:
+                found.append(pos + start)
+            pos = bits.find('1', pos + 1)
+        return found
+
+    def page(self, bitmap, offset=0, limit=50):
+        """Recipe ids for the `limit` matches after `offset`, in (name, id) order."""
+        return [self.recipe_ids[pos] for pos in self.positions(bitmap, offset, limit)]
+
+    def as_mask(self, bitmap):
+        """Boolean NumPy array with one entry per recipe position"""
+        if not self.size:
+            return np.zeros(0, dtype=bool)
+        raw = np.frombuffer(bitmap.to_bytes((self.size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, count=self.size, bitorder='little').view(bool)
+
+    def ingredient_positions(self, ingredient_id):
+        """Positions of the recipes using an ingredient, as a NumPy array"""
+        rank = np.searchsorted(self._ingredient_ids, ingredient_id)
+        if rank == len(self._ingredient_ids) or self._ingredient_ids[rank] != ingredient_id:
+            return self._ingredient_positions[:0]
+        return self._ingredient_positions[self._ingredient_indptr[rank]:self._ingredient_indptr[rank + 1]]
+
+    def recipe_ingredient_ids(self, position):
+        return self._recipe_ingredients[self._recipe_indptr[position]:self._recipe_indptr[position + 1]]
+
+    def rank(self, pantry, max_missing=None, missing_weight=1.0, limit=20, bitmap=None):
+        """
+        Best `limit` recipes by coverage of the `pantry` ingredient ids.
+
+        A recipe scores one point per pantry ingredient it uses and loses
+        `missing_weight` per ingredient it needs that is not in the pantry;
+        recipes using none of the pantry, missing more than `max_missing`
+        ingredients or outside `bitmap` (e.g. a `match` result) are skipped.
+        Ties go to fewer missing ingredients, then (name, id) order.
+
+        Returns (RankedMatch rows, number of candidates).
+        """
+        used = np.zeros(self.size, dtype=np.int32)
+        for ingredient_id in set(pantry):
+            # Positions are distinct within one ingredient, so plain fancy-index add is safe
+            used[self.ingredient_positions(ingredient_id)] += 1
+        missing = self.recipe_sizes - used
+
+        candidates = used > 0
+        if max_missing is not None:
+            candidates &= missing <= max_missing
+        if bitmap is not None:
+            candidates &= self.as_mask(bitmap)
+        positions = np.flatnonzero(candidates)
+        total = len(positions)
+        if not total or limit <= 0:
+            return [], total
+
+        scores = used[positions] - missing_weight * missing[positions]
+        if total > limit:
+            # Keep everything tied with the limit-th best score, then order that small set exactly
+            threshold = np.partition(scores, total - limit)[total - limit]
+            keep = scores >= threshold
+            positions, scores = positions[keep], scores[keep]
+        order = np.lexsort((positions, missing[positions], -scores))[:limit]
+        return [
+            RankedMatch(int(positions[i]), int(used[positions[i]]), int(missing[positions[i]]), float(scores[i]))
+            for i in order
+        ], total
+
+    def position_after(self, key):
+        """First position whose (name, id) key sorts after `key` (keyset pagination)."""
+        name, recipe_id = key
+        pos = self.position.get(recipe_id)
+        if pos is not None and self.keys[pos][0] == name:
+            return pos + 1
+        # The recipe was renamed or deleted since the cursor was issued; keys are in
+        # database collation order, so bisecting on them is a close approximation
+        return bisect_right(self.keys, (name, recipe_id))
+
+
+CATALOG_VERSION_NAME = 'recipes'
+
+
+def _bump_catalog_version():
+    """Persist that the catalog changed, so every process's signature check sees it."""
+    if not CatalogVersion.objects.filter(name=CATALOG_VERSION_NAME).update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(name=CATALOG_VERSION_NAME, defaults={'version': 1})
+
+
+def _catalog_signature():
+    """
+    Cheap fingerprint of the tables the index is built from. Counts and max ids
+    catch inserts and deletes; the catalog version catches in-place edits such
+    as renames, which change the (name, id) order without touching either.
+    """
+    def stats(model):
+        aggregate = model.objects.aggregate(count=Count('id'), last=Max('id'))
+        return aggregate['count'], aggregate['last']
+
+    version = CatalogVersion.objects.filter(name=CATALOG_VERSION_NAME).values_list('version', flat=True).first()
+    return (
+        version or 0,
+        *stats(Recipe),
+        *stats(Recipe.ingredients.through),
+        *stats(Recipe.suitable_for_diets.through),
+        *stats(Recipe.contains_allergens.through),
+        *stats(RecipeAllergenToken),
+    )
+
+
+def index_from_rows(keys, ingredient_rows, diet_rows=(), allergen_rows=(), token_rows=(), signature=None):
+    """
+    Build a RecipeIndex from (name, id) keys in order and (key, recipe_id) rows
+    for each relation.
+    """
+    position = {recipe_id: pos for pos, (_, recipe_id) in enumerate(keys)}
+    size = len(keys)
+
+    def containers(rows):
+        return {
+            key: _container(positions, size)
+            for key, positions in _group_positions(rows, position).items()
+        }
+
+    ingredients = _group_positions(ingredient_rows, position)
+    link_ingredients = np.fromiter(
+        (key for key, positions in ingredients.items() for _ in positions), dtype=np.int64
+    )
+    link_positions = np.fromiter(
+        (pos for positions in ingredients.values() for pos in positions), dtype=np.int64
+    )
+    return RecipeIndex(
+        keys,
+        ingredients={key: _container(positions, size) for key, positions in ingredients.items()},
+        diets=containers(diet_rows),
+        allergens=containers(allergen_rows),
+        tokens=containers(token_rows),
+        links=(link_ingredients, link_positions),
+        signature=signature,
+    )
+
+
+def build_recipe_index():
+    """Build a RecipeIndex from the recipe tables (a handful of streaming queries)."""
+    signature = _catalog_signature()
+    keys = list(Recipe.objects.order_by('name', 'id').values_list('name', 'id'))
+
+    def rows(model, key_field):
+        return model.objects.values_list(key_field, 'recipe_id').iterator(chunk_size=10000)
+
+    return index_from_rows(
+        keys,
+        ingredient_rows=rows(Recipe.ingredients.through, 'ingredientalldata_id'),
+        diet_rows=rows(Recipe.suitable_for_diets.through, 'dietarypreference_id'),
+        allergen_rows=rows(Recipe.contains_allergens.through, 'allergy_id'),
+        token_rows=rows(RecipeAllergenToken, 'token'),
+        signature=signature,
+    )
+
+
+_index = None
+_index_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def _catalog_committed():
+    global _index
+    # Another thread may have rebuilt from the pre-commit rows in the meantime
+    _index = None
+    _bump_catalog_version()
+
+
+def invalidate_recipe_index():
+    """
+    Drop this process's index (the next lookup rebuilds it) and, once the
+    current transaction commits, bump the catalog version so other processes
+    rebuild theirs at their next check. Call it after every write to the
+    indexed tables; however often it is called, a transaction bumps the
+    version once, so writers do not queue up on the version row.
+    """
+    global _index
+    _index = None
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        func is _catalog_committed for _, func, _ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_catalog_committed)
+
+
+def get_recipe_index():
+    """
+    Return the process-local RecipeIndex, rebuilding it when it was invalidated
+    locally or when the catalog signature changed (checked at most every
+    RECIPE_INDEX_REFRESH_SECONDS so other workers' writes are picked up).
+    """
+    global _index, _checked_at
+    refresh_seconds = getattr(settings, 'RECIPE_INDEX_REFRESH_SECONDS', 60)
+    index = _index
+    now = time.monotonic()
+    if index is not None and now - _checked_at < refresh_seconds:
+        return index
+    with _index_lock:
+        index = _index
+        if index is not None and time.monotonic() - _checked_at < refresh_seconds:
+            return index
+        if index is None or index.signature != _catalog_signature():
+            index = build_recipe_index()
+            _index = index
+        _checked_at = time.monotonic()
+        return index
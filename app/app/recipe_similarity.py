@@ -0,0 +1,79 @@
+"""
+"Similar recipes" lookups on top of the embedding similarity index.
+
+The index works on rows of the exported recipe store while the API works on
+Recipe ids, so both sides are joined on normalize_title(): the title -> row map
+is built once per process and per loaded store, and neighbours are mapped back
+to Recipe ids through the recipe index's canonical title -> ids map.
+"""
+import threading
+
+from resources.actual_ai import registry, similar_recipe_rows
+
+from .ai_recommendations import recipe_ids_for_titles
+from .helpers import normalize_title
+from .recipe_index import get_recipe_index
+
+__all__ = [
+    'SimilarityUnavailable',
+    'similar_recipes',
+    'store_row_for_title',
+]
+
+# Neighbours fetched per requested result, since not every store title is a Recipe row
+OVERFETCH = 4
+
+_title_rows = None
+_title_rows_store = None
+_title_rows_lock = threading.Lock()
+
+
+class SimilarityUnavailable(Exception):
+    """The recipe store or its similarity index has not been built"""
+
+
+def _get_title_rows(store):
+    global _title_rows, _title_rows_store
+    if _title_rows_store is not store:
+        with _title_rows_lock:
+            if _title_rows_store is not store:
+                rows = {}
+                for row in range(len(store)):
+                    rows.setdefault(normalize_title(store.title(row)), row)
+                _title_rows, _title_rows_store = rows, store
+    return _title_rows
+
+
+def store_row_for_title(title):
+    """Row of the recipe store holding `title`, or None"""
+    store = registry.get('recipe_store')
+    return _get_title_rows(store).get(normalize_title(title))
+
+
+def similar_recipes(recipe, candidates, k=10, nprobe=8):
+    """
+    Up to `k` (recipe_id, similarity) pairs for recipes similar to `recipe`,
+    best first, limited to the `candidates` queryset (e.g. the user's
+    diet/allergen-filtered recipes). Returns None when `recipe` has no embedding.
+    """
+    try:
+        store = registry.get('recipe_store')
+        registry.get('similarity_index')
+    except Exception as e:
+        raise SimilarityUnavailable(str(e))
+
+    row = _get_title_rows(store).get(normalize_title(recipe.name))
+    if row is None:
+        return None
+
+    rows, scores = similar_recipe_rows(row, k * OVERFETCH, nprobe)
+    index = get_recipe_index()
+    score_by_id = {}
+    for neighbour, score in zip(rows.tolist(), scores.tolist()):
+        for recipe_id in recipe_ids_for_titles([store.title(neighbour)], index):
+            score_by_id.setdefault(recipe_id, score)
+    score_by_id.pop(recipe.pk, None)
+
+    allowed = candidates.filter(pk__in=list(score_by_id)).values_list('id', flat=True)
+    ranked = [(recipe_id, score_by_id[recipe_id]) for recipe_id in set(allowed)]
+    return sorted(ranked, key=lambda item: (-item[1], item[0]))[:k]
@@ -77,8 +77,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.middleware.DietContextMiddleware',
 ]
 
+# Report per-request SQL statement counts (X-Query-Count header) while developing
+QUERY_COUNT_HEADER = DEBUG
+QUERY_COUNT_WARNING_THRESHOLD = 20
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -88,9 +93,74 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'],
-
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.BoundedLimitOffsetPagination',
 }
 
+# List endpoints return at most this many rows per request unless a view sets its own page_size
+API_DEFAULT_PAGE_SIZE = 100
+
+# Hard cap on ?limit= for any list endpoint, whatever the view allows
+API_MAX_PAGE_SIZE = 1000
+
+# Default page for lists the frontend reads whole (diets, allergies, pantry, meals, shopping lists)
+API_WHOLE_LIST_PAGE_SIZE = 1000
+
+# Hard cap on rows written by a streamed (?stream=true) export
+API_STREAM_MAX_ROWS = 50000
+
+# Seconds between catalog change checks for the in-process recipe search index
+RECIPE_INDEX_REFRESH_SECONDS = 60
+
+# Recipe search reports counts above this as e.g. "1000+" when asked for capped counts
+RECIPE_SEARCH_COUNT_CAP = 1000
+
+# Ranked recipe matching: score lost per missing ingredient, and the most results returned
+RECIPE_RANKING_MISSING_WEIGHT = 1.0
+RECIPE_RANKING_MAX_RESULTS = 100
+
+# Seconds between checks that the cached ingredient name vocabulary still matches the table
+INGREDIENT_VOCABULARY_REFRESH_SECONDS = 60
+
+# Load the recommendation model artifacts in a background thread at startup
+# (set for web workers; other processes load them on first use, if ever)
+AI_MODEL_WARMUP = os.environ.get('AI_MODEL_WARMUP', '').lower() in ('1', 'true', 'yes')
+
+# Similar recipes: most results per request, and index cells searched by default
+# (more cells = better recall, slower queries)
+SIMILAR_RECIPES_MAX_K = 50
+SIMILAR_RECIPES_NPROBE = 8
+
+# Model predictions: Unix socket of a `serve_inference` sidecar (unset = batch in-process),
+# and how many requests / how long (ms) the batcher coalesces per model call
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET') or None
+INFERENCE_MAX_BATCH_SIZE = 64
+INFERENCE_MAX_WAIT_MS = 5
+
+# AI ingredient recommendations: most results per request, and how long (s) an
+# ingredient set's matches stay cached (keys include the catalog version)
+AI_RECOMMENDATIONS_MAX_RESULTS = 50
+AI_RECOMMENDATIONS_CACHE_SECONDS = 600
+
+# LLM categorization (categorize_meals): credentials, an optional OpenAI-compatible
+# endpoint, the model, and the account's rate limits the client paces itself to
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY') or None
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+OPENAI_REQUESTS_PER_MINUTE = 3500
+OPENAI_TOKENS_PER_MINUTE = 90000
+
+# Cache shared by all workers (REDIS_URL, e.g. redis://redis:6379/0). Without it each
+# process has its own LocMemCache and cannot see invalidations made by the others
+REDIS_URL = os.environ.get('REDIS_URL') or None
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Lifetime of cached per-user dietary profiles. Signals invalidate them on change, but
+# only in the shared cache; per-process caches must expire them quickly instead
+DIETARY_PROFILE_CACHE_SECONDS = 3600 if REDIS_URL else 5
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -174,6 +244,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOWED_ORIGINS = ['http://localhost:5173']
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['X-Query-Count', 'X-Total-Count', 'X-Truncated', 'Link']
 
 # dj-rest-auth settings
 REST_USE_JWT = True
@@ -0,0 +1,111 @@
+"""
+Signal handlers keeping caches and precomputed data in sync with the models they derive from.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Allergy, DietaryPreference, IngredientAllData, Recipe, UserProfile
+
+from .allergen_tokens import rebuild_ingredient_allergen_tokens, rebuild_recipe_allergen_tokens
+from .canonical import invalidate_ingredient_vocabulary
+from .dietary_profile import invalidate_dietary_profile
+from .helpers import get_allergen_token
+from .recipe_index import invalidate_recipe_index
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.suitable_for_diets.through)
+@receiver(m2m_changed, sender=Recipe.contains_allergens.through)
+def recipe_catalog_changed(sender, **kwargs):
+    """Drop the recipe bitmap index so the next search rebuilds it."""
+    action = kwargs.get('action')
+    # m2m_changed also fires before each change; act once the rows are written
+    if action is not None and action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    invalidate_recipe_index()
+
+
+@receiver(post_save, sender=IngredientAllData)
+@receiver(post_delete, sender=IngredientAllData)
+def ingredient_names_changed(sender, **kwargs):
+    """Drop the name -> id vocabulary used by search and import."""
+    invalidate_ingredient_vocabulary()
+
+
+@receiver(post_save, sender=IngredientAllData)
+def ingredient_saved(sender, instance, created, **kwargs):
+    """Re-tag an ingredient (its name may have changed) and the recipes using it."""
+    if kwargs.get('raw'):
+        return
+    rebuild_ingredient_allergen_tokens([instance.pk])
+    if not created:
+        rebuild_recipe_allergen_tokens(list(instance.recipes.values_list('id', flat=True)))
+        # The search index keeps a bitmap per recipe allergen token
+        invalidate_recipe_index()
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep recipe tokens equal to the union of their ingredients' tokens."""
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = list(instance.recipes.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_cleared_recipe_ids', [])
+    else:
+        recipe_ids = list(pk_set or [])
+    if recipe_ids:
+        rebuild_recipe_allergen_tokens(recipe_ids)
+
+
+@receiver(post_save, sender=Allergy)
+def allergy_saved(sender, instance, **kwargs):
+    """A new allergy may introduce a token nobody has been tagged with yet."""
+    if kwargs.get('raw'):
+        return
+    tokens = [get_allergen_token(instance.name)]
+    rebuild_ingredient_allergen_tokens(tokens=tokens)
+    rebuild_recipe_allergen_tokens(tokens=tokens)
+    invalidate_recipe_index()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    invalidate_dietary_profile(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserProfile.allergies.through)
+def user_allergies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Allergies can be edited from either side of the relation."""
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_dietary_profile(instance.user_id)
+        return
+    if action == 'pre_clear':
+        instance._cleared_profile_user_ids = list(instance.userprofile_set.values_list('user_id', flat=True))
+    elif action == 'post_clear':
+        invalidate_dietary_profile(*getattr(instance, '_cleared_profile_user_ids', []))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        invalidate_dietary_profile(
+            *UserProfile.objects.filter(id__in=pk_set).values_list('user_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Allergy)
+@receiver(post_save, sender=DietaryPreference)
+def profile_vocabulary_changed(sender, instance, created, **kwargs):
+    """Renaming an allergy or diet changes the cached names of everyone using it."""
+    if created or kwargs.get('raw'):
+        return
+    if sender is Allergy:
+        user_ids = UserProfile.objects.filter(allergies=instance).values_list('user_id', flat=True)
+    else:
+        user_ids = UserProfile.objects.filter(dietary_preference=instance).values_list('user_id', flat=True)
+    invalidate_dietary_profile(*user_ids)
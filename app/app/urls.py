@@ -20,6 +20,8 @@ from app.views import (
     IngredientAllDataViewSet,
     IngredientAllDataUnfilteredViewSet,
     RecipeSearchView,
+    RecipePredictionView,
+    AIRecommendationView,
     matching_recipes
 )
 
@@ -49,6 +51,8 @@ urlpatterns = [
     path("api/matching-recipes/", matching_recipes, name="matching-recipes"),
 
     path('api/recipe-search/', RecipeSearchView.as_view(), name='recipe-search'),
+    path('api/recipe-predictions/', RecipePredictionView.as_view(), name='recipe-predictions'),
+    path('api/ai-recommendations/', AIRecommendationView.as_view(), name='ai-recommendations'),
 
     path("api/user/google-login/", GoogleLoginView.as_view(), name="google-login"),
 ]
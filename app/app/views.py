@@ -1,9 +1,12 @@
+import json
 import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
+from django.conf import settings
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework import generics, viewsets, filters as drf_filters, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from django.db.models import Q, Count
@@ -45,14 +48,18 @@ from django.utils import timezone
 # =====================================
 # HELPER FUNCTIONS (imported from helpers.py)
 # =====================================
+from .ai_recommendations import RecommendationsUnavailable, ai_recommendations
+from .canonical import get_ingredient_vocabulary
 from .helpers import (
     HARD_DIETS,
     SOFT_DIETS,
     get_dietary_filter_type,
     filter_and_prioritize_recipes,
-    get_user_allergen_filters,
-    is_ingredient_safe_from_allergens,
 )
+from .pagination import StreamingListMixin, WholeListPagination, paginate_list
+from .predictions import get_predictor, recipe_features
+from .recipe_index import get_recipe_index
+from .recipe_similarity import SimilarityUnavailable, similar_recipes
 # =====================================
 # AUTHENTICATION & USER MANAGEMENT
 # =====================================
@@ -203,12 +210,14 @@ class DietaryPreferenceViewSet(viewsets.ModelViewSet):
     queryset = DietaryPreference.objects.all()
     serializer_class = DietaryPreferenceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WholeListPagination
 
 
 class AllergyViewSet(viewsets.ModelViewSet):
     queryset = Allergy.objects.all()
     serializer_class = AllergySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WholeListPagination
     filter_backends = [drf_filters.SearchFilter]
     search_fields = ['name']
     
@@ -272,6 +281,7 @@ class AllergyViewSet(viewsets.ModelViewSet):
 
 class IngredientViewSet(viewsets.ModelViewSet):
     serializer_class = IngredientSerializer
+    pagination_class = WholeListPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -337,9 +347,12 @@ class IngredientViewSet(viewsets.ModelViewSet):
         })
 
 
-class IngredientAllDataViewSet(viewsets.ModelViewSet):
+class IngredientAllDataViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = IngredientAllData.objects.all()
     serializer_class = IngredientAllDataSerializer
+    page_size = 100
+    max_page_size = 1000
+    streamable = True
     permission_classes = [AllowAny]
     filter_backends = [drf_filters.SearchFilter]
     search_fields = ['name']
@@ -354,39 +367,28 @@ class IngredientAllDataViewSet(viewsets.ModelViewSet):
         
         # Apply dietary preference and allergen filtering if user is authenticated
         if self.request.user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=self.request.user)
-                
-                # Filter by dietary preference
-                if user_profile.dietary_preference:
-                    queryset = queryset.filter(dietary_preferences=user_profile.dietary_preference)
-                
-                # Exclude ingredients that contain user's allergens using comprehensive filtering
-                if user_profile.allergies.exists():
-                    user_allergen_names = get_user_allergen_filters(self.request.user)
-                    if user_allergen_names:
-                        # Filter out unsafe ingredients with exceptions
-                        safe_ingredients = []
-                        for ingredient in queryset:
-                            if is_ingredient_safe_from_allergens(ingredient.name, user_allergen_names):
-                                safe_ingredients.append(ingredient.id)
-                        
-                        queryset = queryset.filter(id__in=safe_ingredients)
-                        
-                        # Also exclude by contains_allergens relationship
-                        user_allergens = user_profile.allergies.all()
-                        queryset = queryset.exclude(contains_allergens__in=user_allergens)
-                    
-            except UserProfile.DoesNotExist:
-                pass
+            profile = self.request.diet_context
+
+            # Filter by dietary preference
+            if profile.diet_id:
+                queryset = queryset.filter(dietary_preferences=profile.diet_id)
+
+            # Exclude ingredients that contain user's allergens using the precomputed tokens
+            if profile.has_allergies:
+                queryset = queryset.exclude(allergen_tokens__token__in=profile.allergen_tokens)
+                # Also exclude by contains_allergens relationship
+                queryset = queryset.exclude(contains_allergens__in=profile.allergy_ids)
         
         return queryset
 
 
-class IngredientAllDataUnfilteredViewSet(viewsets.ModelViewSet):
+class IngredientAllDataUnfilteredViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """Ingredient search that filters out user's allergens but not dietary preferences"""
     queryset = IngredientAllData.objects.all()
     serializer_class = IngredientAllDataSerializer
+    page_size = 100
+    max_page_size = 1000
+    streamable = True
     permission_classes = [AllowAny]
     filter_backends = [drf_filters.SearchFilter]
     search_fields = ['name']
@@ -401,25 +403,11 @@ class IngredientAllDataUnfilteredViewSet(viewsets.ModelViewSet):
         
         # Filter out allergens if user is authenticated
         if self.request.user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=self.request.user)
-                if user_profile.allergies.exists():
-                    user_allergen_names = get_user_allergen_filters(self.request.user)
-                    if user_allergen_names:
-                        # Filter out unsafe ingredients with exceptions
-                        safe_ingredients = []
-                        for ingredient in queryset:
-                            if is_ingredient_safe_from_allergens(ingredient.name, user_allergen_names):
-                                safe_ingredients.append(ingredient.id)
-                        
-                        queryset = queryset.filter(id__in=safe_ingredients)
-                        
-                        # Also exclude by contains_allergens relationship
-                        user_allergens = user_profile.allergies.all()
-                        queryset = queryset.exclude(contains_allergens__in=user_allergens)
-                    
-            except UserProfile.DoesNotExist:
-                pass
+            profile = self.request.diet_context
+            if profile.has_allergies:
+                queryset = queryset.exclude(allergen_tokens__token__in=profile.allergen_tokens)
+                # Also exclude by contains_allergens relationship
+                queryset = queryset.exclude(contains_allergens__in=profile.allergy_ids)
         
         return queryset
 
@@ -428,51 +416,38 @@ class IngredientAllDataUnfilteredViewSet(viewsets.ModelViewSet):
 # RECIPE MANAGEMENT
 # =====================================
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(StreamingListMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticated]
+    # Recipes serialize with nested ingredients and diets, so keep pages small
+    page_size = 20
+    max_page_size = 100
+    streamable = True
 
     def get_queryset(self):
-        queryset = Recipe.objects.all()
+        queryset = Recipe.objects.select_related('created_by').prefetch_related(
+            'ingredients', 'suitable_for_diets'
+        )
         
         # Apply dietary preference and allergy filtering if user is authenticated
         if self.request.user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=self.request.user)
-                
-                # Filter by dietary preference - make it more permissive
-                if user_profile.dietary_preference:
-                    # Use Q objects to handle cases where the relationship might not exist
-                    queryset = queryset.filter(
-                        Q(suitable_for_diets=user_profile.dietary_preference) |
-                        Q(suitable_for_diets__isnull=True)
-                    )
-                
-                # Exclude recipes that contain user's allergens using comprehensive filtering
-                if user_profile.allergies.exists():
-                    user_allergen_names = get_user_allergen_filters(self.request.user)
-                    if user_allergen_names:
-                        # Filter out recipes with unsafe ingredients with exceptions
-                        safe_recipes = []
-                        for recipe in queryset:
-                            recipe_safe = True
-                            for ingredient in recipe.ingredients.all():
-                                if not is_ingredient_safe_from_allergens(ingredient.name, user_allergen_names):
-                                    recipe_safe = False
-                                    break
-                            if recipe_safe:
-                                safe_recipes.append(recipe.id)
-                        
-                        queryset = queryset.filter(id__in=safe_recipes)
-                        
-                        # Also exclude by contains_allergens relationship
-                        user_allergens = user_profile.allergies.all()
-                        queryset = queryset.exclude(contains_allergens__in=user_allergens)
-                    
-            except UserProfile.DoesNotExist:
-                pass
-        
-        return queryset.distinct()
+            profile = self.request.diet_context
+
+            # Filter by dietary preference - make it more permissive
+            if profile.diet_id:
+                # Use Q objects to handle cases where the relationship might not exist
+                queryset = queryset.filter(
+                    Q(suitable_for_diets=profile.diet_id) |
+                    Q(suitable_for_diets__isnull=True)
+                )
+
+            # Exclude recipes that contain user's allergens using the precomputed tokens
+            if profile.has_allergies:
+                queryset = queryset.exclude(allergen_tokens__token__in=profile.allergen_tokens)
+                # Also exclude by contains_allergens relationship
+                queryset = queryset.exclude(contains_allergens__in=profile.allergy_ids)
+        
+        return queryset.distinct().order_by('name', 'id')
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def add_missing_ingredients_to_shopping_list(self, request, pk=None):
@@ -529,6 +504,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Recipes closest to this one in embedding space (?k= results, ?nprobe= index cells searched)"""
+        recipe = self.get_object()
+        try:
+            k = max(1, min(int(request.query_params.get('k', 10)), settings.SIMILAR_RECIPES_MAX_K))
+            nprobe = max(1, int(request.query_params.get('nprobe', settings.SIMILAR_RECIPES_NPROBE)))
+        except ValueError:
+            return Response({"error": "k and nprobe must be integers."}, status=400)
+
+        try:
+            neighbours = similar_recipes(recipe, self.get_queryset(), k=k, nprobe=nprobe)
+        except SimilarityUnavailable as e:
+            return Response({"error": f"Similarity index unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if neighbours is None:
+            return Response({"error": "No embedding for this recipe."}, status=status.HTTP_404_NOT_FOUND)
+
+        recipes_by_id = Recipe.objects.select_related('created_by').prefetch_related(
+            'ingredients', 'suitable_for_diets'
+        ).in_bulk([recipe_id for recipe_id, _ in neighbours])
+        results = []
+        for recipe_id, score in neighbours:
+            data = RecipeSerializer(recipes_by_id[recipe_id]).data
+            data['similarity'] = round(score, 4)
+            results.append(data)
+        return Response({
+            'recipe': recipe.id,
+            'k': k,
+            'nprobe': nprobe,
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'])
     def categorized(self, request):
         """Get all categorized recipes with filtering"""
@@ -556,12 +563,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(tags__contains=[tag.strip()])
         
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def category_stats(self, request):
@@ -622,9 +625,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def matching_recipes(request):
-    """Recipe suggestions based on user's available ingredients using pure matching"""
+    """
+    Recipe suggestions based on user's available ingredients using pure matching.
+    With ?mode=ranked, returns the recipes covering the most of the pantry instead.
+    """
     user_ingredients = request.user.ingredients.filter(is_available=True).values_list('name', flat=True)
     
+    if request.query_params.get('mode') == 'ranked':
+        try:
+            options = parse_ranking_options(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        profile = request.diet_context
+        index = get_recipe_index()
+        pantry_ids = get_ingredient_vocabulary().resolve_many(user_ingredients).values()
+        # Same diet and allergen rules as the pure matching below, applied as bitmaps
+        allowed = index.match(
+            lenient_diets=[profile.diet_id] if profile.diet_id else [],
+            exclude_tokens=profile.allergen_tokens,
+            exclude_allergens=profile.allergy_ids,
+        )
+        return Response(ranked_recipes_payload(index, list(pantry_ids), allowed, **options))
+
     if not user_ingredients:
         return Response([])
     
@@ -639,41 +661,97 @@ def matching_recipes(request):
     ).order_by('name').distinct()
     
     # Filter out recipes containing user's allergens
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-        
-        # Filter by dietary preference - make it more permissive
-        if user_profile.dietary_preference:
-            matching = matching.filter(
-                Q(suitable_for_diets=user_profile.dietary_preference) |
-                Q(suitable_for_diets__isnull=True)
-            )
-        
-        # Exclude recipes that contain user's allergens using comprehensive filtering
-        if user_profile.allergies.exists():
-            user_allergen_names = get_user_allergen_filters(request.user)
-            if user_allergen_names:
-                # Filter out recipes with unsafe ingredients with exceptions
-                safe_recipes = []
-                for recipe in matching:
-                    recipe_safe = True
-                    for ingredient in recipe.ingredients.all():
-                        if not is_ingredient_safe_from_allergens(ingredient.name, user_allergen_names):
-                            recipe_safe = False
-                            break
-                    if recipe_safe:
-                        safe_recipes.append(recipe.id)
-                
-                matching = matching.filter(id__in=safe_recipes)
-                
-                # Also exclude by contains_allergens relationship
-                user_allergens = user_profile.allergies.all()
-                matching = matching.exclude(contains_allergens__in=user_allergens)
-            
-    except UserProfile.DoesNotExist:
-        pass
+    profile = request.diet_context
+
+    # Filter by dietary preference - make it more permissive
+    if profile.diet_id:
+        matching = matching.filter(
+            Q(suitable_for_diets=profile.diet_id) |
+            Q(suitable_for_diets__isnull=True)
+        )
+
+    # Exclude recipes that contain user's allergens using the precomputed tokens
+    if profile.has_allergies:
+        matching = matching.exclude(allergen_tokens__token__in=profile.allergen_tokens)
+        # Also exclude by contains_allergens relationship
+        matching = matching.exclude(contains_allergens__in=profile.allergy_ids)
     
-    return Response(RecipeSerializer(matching.distinct(), many=True).data)
+    matching = matching.distinct().select_related('created_by').prefetch_related(
+        'ingredients', 'suitable_for_diets'
+    )
+    # Pantry matches are read whole, like the pantry itself
+    return paginate_list(matching, request, RecipeSerializer, pagination_class=WholeListPagination)
+
+
+def parse_ranking_options(params):
+    """max_missing, missing_weight and limit for ranked matching; raises ValueError"""
+    try:
+        max_missing = params.get('max_missing')
+        max_missing = int(max_missing) if max_missing not in (None, '') else None
+        missing_weight = float(params.get('missing_weight', settings.RECIPE_RANKING_MISSING_WEIGHT))
+        limit = int(params.get('limit', 20))
+    except (TypeError, ValueError):
+        raise ValueError('max_missing and limit must be integers, missing_weight a number.')
+    if max_missing is not None and max_missing < 0:
+        raise ValueError('max_missing must not be negative.')
+    limit = max(1, min(limit, settings.RECIPE_RANKING_MAX_RESULTS))
+    return {'max_missing': max_missing, 'missing_weight': missing_weight, 'limit': limit}
+
+
+def ranked_recipes_payload(index, pantry_ids, allowed, max_missing=None, missing_weight=1.0, limit=20):
+    """Top recipes by pantry coverage, each with the ingredients it still needs"""
+    ranked, total = index.rank(
+        pantry_ids, max_missing=max_missing, missing_weight=missing_weight, limit=limit, bitmap=allowed
+    )
+    pantry = set(pantry_ids)
+    missing_ids = {
+        row.position: [i for i in index.recipe_ingredient_ids(row.position).tolist() if i not in pantry]
+        for row in ranked
+    }
+    names = dict(
+        IngredientAllData.objects.filter(
+            id__in={i for ids in missing_ids.values() for i in ids}
+        ).values_list('id', 'name')
+    )
+
+    recipes_by_id = Recipe.objects.select_related('created_by').prefetch_related(
+        'ingredients', 'suitable_for_diets'
+    ).in_bulk([index.recipe_ids[row.position] for row in ranked])
+    # Recipes deleted since the index was built are skipped
+    rows = [row for row in ranked if index.recipe_ids[row.position] in recipes_by_id]
+    serialized = RecipeSerializer([recipes_by_id[index.recipe_ids[row.position]] for row in rows], many=True).data
+
+    results = []
+    for row, data in zip(rows, serialized):
+        results.append({
+            **data,
+            'matched_count': row.used,
+            'missing_count': row.missing,
+            'missing_ingredients': sorted(names[i] for i in missing_ids[row.position] if i in names),
+            'score': row.score,
+        })
+    return {
+        'mode': 'ranked',
+        'results': results,
+        'total_count': total,
+        'limit': limit,
+    }
+
+
+def encode_search_cursor(key):
+    """Opaque keyset cursor for a (name, id) recipe key"""
+    return urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    """Inverse of encode_search_cursor; raises ValueError on malformed input"""
+    try:
+        name, recipe_id = json.loads(urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(name, str) or not isinstance(recipe_id, int):
+        raise ValueError('Invalid cursor')
+    return name, recipe_id
 
 
 class RecipeSearchView(APIView):
@@ -685,95 +763,229 @@ class RecipeSearchView(APIView):
         if not ingredient_names or not isinstance(ingredient_names, list):
             return Response({"error": "A list of ingredients is required."}, status=400)
 
-        # Ensure all ingredients exist in IngredientAllData
-        ingredients_qs = IngredientAllData.objects.filter(name__in=ingredient_names)
-        ingredients = list(ingredients_qs.values_list('name', flat=True))
+        exclude_names = request.data.get("exclude_ingredients", [])
+        if not isinstance(exclude_names, list):
+            return Response({"error": "exclude_ingredients must be a list."}, status=400)
+
+        # Ensure all ingredients exist in IngredientAllData ("Tomatoes" finds "tomato")
+        vocabulary = get_ingredient_vocabulary()
+        resolved = vocabulary.resolve_many(name for name in ingredient_names if isinstance(name, str))
+        ingredients = {ingredient_id: vocabulary.names[ingredient_id] for ingredient_id in resolved.values()}
 
         if not ingredients:
             return Response({"error": "No matching ingredients found."}, status=400)
 
-        # Pure matching algorithm: Find recipes that contain ALL the selected ingredients
-        matching_recipes = Recipe.objects.filter(
-            ingredients__name__in=ingredients
-        ).annotate(
-            matching_count=Count('ingredients', filter=Q(ingredients__name__in=ingredients))
-        ).filter(
-            matching_count=len(ingredients)  # Only recipes with ALL ingredients
-        ).order_by('name').distinct()
+        excluded_ids = []
+        if exclude_names:
+            excluded_ids = list(vocabulary.resolve_many(
+                name for name in exclude_names if isinstance(name, str)
+            ).values())
 
         # Apply dietary preference filtering (from request or user profile) using suitable_for_diets
         diet_value = request.data.get('diet')
-        diet_obj = None
+        diet_id = None
+        diet_missing = False
         if diet_value:
             try:
                 # Accept both integer (ID) and string (name)
                 if isinstance(diet_value, int) or (isinstance(diet_value, str) and str(diet_value).isdigit()):
-                    diet_obj = DietaryPreference.objects.get(id=int(diet_value))
+                    diet_id = DietaryPreference.objects.get(id=int(diet_value)).id
                 else:
-                    diet_obj = DietaryPreference.objects.get(name__iexact=str(diet_value))
-                matching_recipes = matching_recipes.filter(suitable_for_diets=diet_obj)
+                    diet_id = DietaryPreference.objects.get(name__iexact=str(diet_value)).id
             except DietaryPreference.DoesNotExist:
-                matching_recipes = matching_recipes.none()
-        elif request.user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=request.user)
-                if user_profile.dietary_preference:
-                    diet_obj = user_profile.dietary_preference
-                    matching_recipes = matching_recipes.filter(suitable_for_diets=diet_obj)
-            except UserProfile.DoesNotExist:
-                pass
+                diet_missing = True
+        profile = request.diet_context
+        if not diet_value:
+            # Fall back to the diet stored on the user's profile
+            diet_id = profile.diet_id
 
-        
         # 2. Allergen filtering (only for authenticated users)
-        if request.user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=request.user)
-                if user_profile.allergies.exists():
-                    user_allergen_names = get_user_allergen_filters(request.user)
-                    if user_allergen_names:
-                        # Get the searched ingredient names in lowercase for comparison
-                        searched_ingredients_lower = [name.lower() for name in ingredients]
-                        # Build Q objects to exclude recipes with unsafe ingredients, except searched ones
-                        # First, get all unsafe ingredient names except searched ones
-                        unsafe_ingredient_names = [name for name in user_allergen_names if name not in searched_ingredients_lower]
-                        if unsafe_ingredient_names:
-                            matching_recipes = matching_recipes.exclude(
-                                ingredients__name__in=unsafe_ingredient_names
-                            )
-                        # Also exclude by contains_allergens relationship, but allow searched ingredients
-                        user_allergens = user_profile.allergies.all()
-                        allergen_names_lower = [allergy.name.lower() for allergy in user_allergens]
-                        conflicting_allergens = [allergen for allergen in user_allergens if allergen.name.lower() not in searched_ingredients_lower]
-                        if conflicting_allergens:
-                            matching_recipes = matching_recipes.exclude(contains_allergens__in=conflicting_allergens)
-            except UserProfile.DoesNotExist:
-                pass
-
-        # Pagination: get limit and offset from query params
+        excluded_allergen_ids = []
+        if profile.has_allergies:
+            # Get the searched ingredient names in lowercase for comparison
+            searched_ingredients_lower = [name.lower() for name in ingredients.values()]
+            # Exclude recipes with unsafe ingredients, except searched ones
+            unsafe_ingredient_names = [name for name in profile.allergen_synonyms if name not in searched_ingredients_lower]
+            if unsafe_ingredient_names:
+                excluded_ids += IngredientAllData.objects.filter(
+                    name__in=unsafe_ingredient_names
+                ).values_list('id', flat=True)
+            # Also exclude by contains_allergens relationship, but allow searched ingredients
+            excluded_allergen_ids = [
+                allergy_id
+                for allergy_id, allergy_name in zip(profile.allergy_ids, profile.allergy_names)
+                if allergy_name.lower() not in searched_ingredients_lower
+            ]
+
+        # Pagination: get limit and offset (or a keyset cursor) from query params
         try:
             limit = int(request.query_params.get('limit', 50))
             offset = int(request.query_params.get('offset', 0))
         except Exception:
             limit = 50
             offset = 0
+        if limit < 1 or offset < 0:
+            return Response({"error": "limit must be at least 1 and offset not negative."}, status=400)
+        # Same hard cap as every paginated list endpoint
+        limit = min(limit, settings.API_MAX_PAGE_SIZE)
+        use_cursor = 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor'
+        count_mode = request.query_params.get('count', 'capped' if use_cursor else 'exact')
+        if count_mode not in ('exact', 'capped', 'none'):
+            return Response({"error": "count must be one of: exact, capped, none."}, status=400)
+
+        index = get_recipe_index()
+        if request.query_params.get('mode') == 'ranked':
+            try:
+                options = parse_ranking_options(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+            # Rank by coverage of the searched ingredients within the same filters
+            allowed = 0 if diet_missing else index.match(
+                exclude=excluded_ids,
+                diets=[diet_id] if diet_id else [],
+                exclude_allergens=excluded_allergen_ids,
+            )
+            return Response(ranked_recipes_payload(index, list(ingredients), allowed, **options))
 
-        # Calculate total_count BEFORE slicing for pagination
-        total_count = matching_recipes.count() if hasattr(matching_recipes, 'count') else len(matching_recipes)
-        # If matching_recipes is a queryset, slice it; if it's a list, slice as list
-        if hasattr(matching_recipes, 'all') or hasattr(matching_recipes, 'count'):
-            recipes_page = matching_recipes[offset:offset+limit]
+        # Pure matching algorithm: intersect the ingredient bitmaps so only recipes
+        # containing ALL the selected ingredients (and none of the excluded ones) remain
+        if diet_missing:
+            matching_recipes = 0
         else:
-            recipes_page = matching_recipes[offset:offset+limit] if isinstance(matching_recipes, list) else []
+            matching_recipes = index.match(
+                include=ingredients.keys(),
+                exclude=excluded_ids,
+                diets=[diet_id] if diet_id else [],
+                exclude_allergens=excluded_allergen_ids,
+            )
+
+        if use_cursor:
+            cursor = request.query_params.get('cursor')
+            start = 0
+            if cursor:
+                try:
+                    start = index.position_after(decode_search_cursor(cursor))
+                except ValueError:
+                    return Response({"error": "Invalid cursor."}, status=400)
+            # One extra row tells us whether another page exists
+            positions = index.positions(matching_recipes, 0, limit + 1, start=start)
+            has_more = len(positions) > limit
+            positions = positions[:limit]
+            page_ids = [index.recipe_ids[pos] for pos in positions]
+        else:
+            page_ids = index.page(matching_recipes, offset, limit)
+
+        # Only the requested page is loaded from the database
+        recipes_by_id = Recipe.objects.select_related('created_by').prefetch_related(
+            'ingredients', 'suitable_for_diets'
+        ).in_bulk(page_ids)
+        recipes_page = [recipes_by_id[recipe_id] for recipe_id in page_ids if recipe_id in recipes_by_id]
         serializer = RecipeSerializer(recipes_page, many=True)
 
+        # Counting is a popcount on the bitmap; the modes only shape what is reported
+        match_count = index.count(matching_recipes)
+        total_count = match_count
+        if count_mode == 'none':
+            total_count = None
+        elif count_mode == 'capped' and match_count > settings.RECIPE_SEARCH_COUNT_CAP:
+            total_count = f'{settings.RECIPE_SEARCH_COUNT_CAP}+'
+
+        if use_cursor:
+            return Response({
+                'results': serializer.data,
+                'total_count': total_count,
+                'limit': limit,
+                'next_cursor': encode_search_cursor(index.keys[positions[-1]]) if has_more else None,
+                'has_more': has_more
+            })
+
         return Response({
             'results': serializer.data,
             'total_count': total_count,
             'offset': offset,
             'limit': limit,
-            'has_more': (offset + limit) < total_count
+            'has_more': (offset + limit) < match_count
         })
     
+class AIRecommendationView(APIView):
+    """
+    Recipes containing all the given ingredients according to the AI ingredient
+    matcher, as Recipe ids, filtered by the user's diet and allergies. Results are
+    cached per ingredient set and catalog version.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        ingredient_names = request.data.get("ingredients", [])
+        if (not ingredient_names or not isinstance(ingredient_names, list)
+                or not all(isinstance(name, str) for name in ingredient_names)):
+            return Response({"error": "A list of ingredients is required."}, status=400)
+        try:
+            limit = max(1, min(int(request.data.get('limit', 9)), settings.AI_RECOMMENDATIONS_MAX_RESULTS))
+        except (TypeError, ValueError):
+            return Response({"error": "limit must be an integer."}, status=400)
+
+        try:
+            results, ingredients = ai_recommendations(ingredient_names, request.diet_context, limit=limit)
+        except RecommendationsUnavailable as e:
+            return Response({"error": f"AI recommendations unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if not ingredients:
+            return Response({"error": "No recognized ingredients."}, status=400)
+
+        return Response({
+            'ingredients': ingredients,
+            'results': [{'id': recipe_id, 'name': name} for recipe_id, name in results],
+            'limit': limit,
+        })
+
+
+class RecipePredictionView(APIView):
+    """
+    Top-k recipe_model.keras labels for a recipe (by id) or a raw feature vector.
+    Requests are micro-batched with concurrent ones before reaching the model.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        # Batcher metrics are for operators
+        if self.request.method == 'GET':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def get(self, request):
+        try:
+            return Response(get_predictor().metrics())
+        except Exception as e:
+            return Response({"error": f"Inference unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def post(self, request):
+        try:
+            k = int(request.data.get('k', 3))
+        except (TypeError, ValueError):
+            return Response({"error": "k must be an integer."}, status=400)
+
+        recipe_id = request.data.get('recipe_id')
+        features = request.data.get('features')
+        try:
+            if recipe_id is not None:
+                try:
+                    recipe = Recipe.objects.get(id=recipe_id)
+                except (Recipe.DoesNotExist, ValueError, TypeError):
+                    return Response({"error": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
+                features = recipe_features(recipe)
+                if features is None:
+                    return Response({"error": "No features for this recipe."}, status=status.HTTP_404_NOT_FOUND)
+            elif not isinstance(features, list) or not features:
+                return Response({"error": "recipe_id or a features list is required."}, status=400)
+            predictions = get_predictor().predict([features], k=k)[0]
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            return Response({"error": f"Inference unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({'recipe_id': recipe_id, 'predictions': predictions})
+
+
 # =====================================
 # MEAL PLANNING
 # =====================================
@@ -790,11 +1002,14 @@ class MealFilter(dj_filters.FilterSet):
 class MealViewSet(viewsets.ModelViewSet):
     serializer_class = MealSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WholeListPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = MealFilter
 
     def get_queryset(self):
-        return Meal.objects.filter(user=self.request.user)
+        return Meal.objects.filter(user=self.request.user).select_related(
+            'recipe__created_by'
+        ).prefetch_related('recipe__ingredients', 'recipe__suitable_for_diets')
 
     def perform_create(self, serializer):
         # Allow creation without date/meal_type (for meal templates)
@@ -841,9 +1056,12 @@ class MealViewSet(viewsets.ModelViewSet):
 class ShoppingListViewSet(viewsets.ModelViewSet):
     serializer_class = ShoppingListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WholeListPagination
 
     def get_queryset(self):
-        return ShoppingList.objects.filter(user=self.request.user)
+        return ShoppingList.objects.filter(user=self.request.user).prefetch_related(
+            'shoppinglistitem_set__ingredient'
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -853,6 +1071,7 @@ class ShoppingListItemViewSet(viewsets.ModelViewSet):
     queryset = ShoppingListItem.objects.all()
     serializer_class = ShoppingListItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WholeListPagination
 
 
 # =====================================
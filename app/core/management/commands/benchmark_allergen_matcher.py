@@ -0,0 +1,70 @@
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+from app.helpers import ALLERGEN_SAFE_NAMES, ALLERGEN_SYNONYMS, get_allergen_matcher
+
+
+def legacy_is_safe(ingredient_name, user_allergen_names):
+    """The previous implementation: one substring test per synonym"""
+    ingredient_lower = ingredient_name.lower()
+    if ingredient_lower in ALLERGEN_SAFE_NAMES:
+        return True
+    for allergen_name in user_allergen_names:
+        if allergen_name.lower() in ingredient_lower:
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark the compiled allergen matcher against the linear synonym scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--names',
+            type=int,
+            default=5000,
+            help='Number of ingredient names checked per measurement (default: 5000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the generated synonyms and names',
+        )
+
+    def random_word(self, rng, length):
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+    def time_checks(self, check, names, allergens):
+        start = time.perf_counter()
+        for name in names:
+            check(name, allergens)
+        return (time.perf_counter() - start) / len(names) * 1e6
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        real_synonyms = [synonym for values in ALLERGEN_SYNONYMS.values() for synonym in values]
+
+        self.stdout.write(f'{"synonyms":>9} {"name len":>9} {"linear us":>10} {"compiled us":>12} {"speedup":>8}')
+        for synonym_count in (10, 50, 200, 1000):
+            synonyms = list(real_synonyms)
+            while len(synonyms) < synonym_count:
+                synonyms.append(self.random_word(rng, rng.randint(4, 10)))
+            synonyms = rng.sample(synonyms, synonym_count)
+            matcher = get_allergen_matcher(synonyms)
+
+            for name_length in (10, 40):
+                # Mostly safe names, which is the worst case for the linear scan
+                names = [self.random_word(rng, name_length) for _ in range(options['names'])]
+                linear = self.time_checks(legacy_is_safe, names, synonyms)
+                compiled = self.time_checks(lambda name, m: m.is_safe(name), names, matcher)
+                self.stdout.write(
+                    f'{synonym_count:>9} {name_length:>9} {linear:>10.2f} {compiled:>12.2f} {linear / compiled:>7.1f}x'
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                '\nCompiled cost should track name length and stay flat as the synonym count grows.'
+            )
+        )
@@ -0,0 +1,62 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from app.recipe_import import parse_rows
+
+
+class Command(BaseCommand):
+    help = "Time import_recipes row parsing with 1..N worker processes on a synthetic CSV (no database needed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Synthetic rows (default: 50000)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Most workers to try (default: CPU count)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def write_dataset(self, path, rows, seed):
+        # Row shape of test_dataset.csv: stringified lists in directions and NER
+        rng = random.Random(seed)
+        words = [f'ingredient {i}' for i in range(2000)]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, ['title', 'ingredients', 'directions', 'NER'])
+            writer.writeheader()
+            for i in range(rows):
+                ner = rng.sample(words, rng.randint(3, 14))
+                writer.writerow({
+                    'title': f'Recipe {i}',
+                    'ingredients': str([f'1 cup {word}' for word in ner]),
+                    'directions': str([f'Step {n}: ' + ' '.join(rng.choices(words, k=8)) for n in range(rng.randint(3, 10))]),
+                    'NER': str([word.title() + 's' for word in ner]),
+                })
+
+    def handle(self, *args, **options):
+        counts = [1]
+        while counts[-1] * 2 <= options['workers']:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != options['workers']:
+            counts.append(options['workers'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.csv')
+            self.write_dataset(path, options['rows'], options['seed'])
+
+            baseline = None
+            reference = None
+            for workers in counts:
+                start = time.perf_counter()
+                parsed = list(parse_rows(path, workers=workers))
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                self.stdout.write(
+                    f'{workers:>3} workers: {elapsed:6.2f}s  {len(parsed) / elapsed:>9.0f} rows/s  '
+                    f'speedup {baseline / elapsed:.2f}x'
+                )
+                if reference is None:
+                    reference = parsed
+                elif parsed != reference:
+                    self.stdout.write(self.style.ERROR(f'{workers} workers produced different rows'))
+                    return
+
+        self.stdout.write(self.style.SUCCESS('Output identical for every worker count.'))
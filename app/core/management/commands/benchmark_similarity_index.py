@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import RECIPE_STORE_DIR, IVFIndex, RecipeStore
+
+
+class Command(BaseCommand):
+    help = "Compare recall@k and queries/second of the IVF similarity index against exact search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', default=RECIPE_STORE_DIR, help='Recipe store directory')
+        parser.add_argument('--queries', type=int, default=200, help='Query recipes sampled (default: 200)')
+        parser.add_argument('--k', type=int, default=10, help='Neighbours per query (default: 10)')
+        parser.add_argument(
+            '--nprobe',
+            default='1,2,4,8,16,32',
+            help='Comma-separated nprobe values to measure (default: 1,2,4,8,16,32)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def queries_per_second(self, search, queries):
+        start = time.perf_counter()
+        results = [search(query)[0] for query in queries]
+        return results, len(queries) / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        if not IVFIndex.exists(options['store']):
+            raise CommandError(f"No similarity index in {options['store']}; run build_similarity_index first.")
+        store = RecipeStore.load(options['store'])
+        index = IVFIndex.load(options['store'])
+        k = options['k']
+
+        rng = np.random.default_rng(options['seed'])
+        rows = rng.choice(len(store), min(options['queries'], len(store)), replace=False)
+        queries = [np.asarray(store.embeddings[row]) for row in rows]
+
+        exact, exact_qps = self.queries_per_second(lambda q: index.exact_search(q, k), queries)
+        self.stdout.write(f'{index.n_lists} cells, {len(store)} recipes, {len(queries)} queries, k={k}')
+        self.stdout.write(f'{"nprobe":>8} {"recall@" + str(k):>10} {"QPS":>9} {"speedup":>8}')
+        self.stdout.write(f'{"exact":>8} {1.0:>10.3f} {exact_qps:>9.0f} {1.0:>7.1f}x')
+
+        for nprobe in (int(value) for value in options['nprobe'].split(',')):
+            approx, qps = self.queries_per_second(lambda q: index.search(q, k, nprobe), queries)
+            recall = np.mean([
+                len(set(found.tolist()) & set(truth.tolist())) / len(truth)
+                for found, truth in zip(approx, exact)
+            ])
+            self.stdout.write(f'{nprobe:>8} {recall:>10.3f} {qps:>9.0f} {qps / exact_qps:>7.1f}x')
+
+        self.stdout.write(self.style.SUCCESS(
+            '\nPick the smallest nprobe meeting the recall target for SIMILAR_RECIPES_NPROBE.'
+        ))
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import RECIPE_STORE_DIR, IVFIndex, RecipeStore
+
+
+class Command(BaseCommand):
+    help = "Build the IVF similarity index over the exported recipe embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--store',
+            default=RECIPE_STORE_DIR,
+            help='Recipe store directory written by export_recipe_store (the index is saved there too)',
+        )
+        parser.add_argument('--lists', type=int, help='Number of index cells (default: 4 * sqrt(recipes))')
+        parser.add_argument('--iterations', type=int, default=20, help='k-means iterations (default: 20)')
+        parser.add_argument('--sample', type=int, default=50000, help='Vectors used to train the cells (default: 50000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        if not RecipeStore.exists(options['store']):
+            raise CommandError(f"No recipe store in {options['store']}; run export_recipe_store first.")
+        store = RecipeStore.load(options['store'])
+        if not store.embeddings.shape[1]:
+            raise CommandError('The recipe store has no embeddings.')
+
+        start = time.perf_counter()
+        index = IVFIndex.build(
+            store.embeddings,
+            n_lists=options['lists'],
+            iterations=options['iterations'],
+            sample_size=options['sample'],
+            seed=options['seed'],
+        )
+        index.save(options['store'])
+
+        sizes = index.offsets[1:] - index.offsets[:-1]
+        self.stdout.write(
+            f'{index.n_lists} cells over {len(store)} recipes '
+            f'(cell size min {sizes.min()}, median {int(sorted(sizes)[len(sizes) // 2])}, max {sizes.max()})'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Built similarity index in {time.perf_counter() - start:.1f}s'))
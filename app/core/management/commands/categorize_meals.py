@@ -1,18 +1,43 @@
-import openai
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.db.models import Q
+from app.categorization_cache import (
+    DESCRIPTION_CHARS,
+    STEPS_CHARS,
+    categorization_key,
+    load_cached,
+    store_cached,
+)
+from app.llm_client import ChatClient, RateLimiter, estimate_tokens
 from core.models import Recipe
 from django.utils import timezone
 
+CATEGORY_FIELDS = ['cuisine_type', 'difficulty', 'cooking_time', 'tags', 'categorized_at']
+# Part of every cache key: bump when the prompts or their parsing change
+PROMPT_VERSION = 1
+# Keys a batched reply item needs before it is accepted (else it is retried alone)
+REQUIRED_KEYS = ('cuisineType', 'difficulty', 'cookingTime')
+SYSTEM_PROMPT = "You are a culinary expert that categorizes meals. Respond only with valid JSON."
+GUIDANCE = """Base your decisions on:
+- Cuisine type: ingredients, cooking methods, dish name
+- Difficulty: number of steps, complexity of techniques, ingredients
+- Cooking time: complexity of preparation and cooking methods
+- Tags: dietary restrictions, flavor profiles, meal type"""
+# Reply budget: one categorization object is well under this
+COMPLETION_TOKENS_PER_RECIPE = 120
+
 class Command(BaseCommand):
     help = "Categorize meals using AI to assign cuisine type, difficulty, and cooking time"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        openai.api_key = getattr(settings, 'OPENAI_API_KEY', None)
+        # Set up in handle(); None means rule-based categorization only
+        self.client = None
         
         self.cuisine_types = [
             'Italian', 'Mexican', 'Asian', 'American', 'Mediterranean', 
@@ -22,6 +47,10 @@ class Command(BaseCommand):
         
         self.difficulty_levels = ['Easy', 'Medium', 'Hard']
         self.cooking_time_ranges = ['Under 30 mins', '30-60 mins', '1-2 hours', 'Over 2 hours']
+        self.lock = threading.Lock()
+        self.batch_stats = {'batches': 0, 'batched': 0, 'retried': 0}
+        # Recipes whose AI call failed and got the rule-based result (never cached)
+        self.fallback_ids = set()
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -45,63 +74,165 @@ class Command(BaseCommand):
             action='store_true',
             help='Re-categorize recipes that already have categories',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Recipes categorized in parallel (default: 8)',
+        )
+        parser.add_argument(
+            '--requests-per-minute',
+            type=int,
+            default=settings.OPENAI_REQUESTS_PER_MINUTE,
+            help=f'API request budget (default: {settings.OPENAI_REQUESTS_PER_MINUTE})',
+        )
+        parser.add_argument(
+            '--tokens-per-minute',
+            type=int,
+            default=settings.OPENAI_TOKENS_PER_MINUTE,
+            help=f'API token budget (default: {settings.OPENAI_TOKENS_PER_MINUTE})',
+        )
+        parser.add_argument('--max-retries', type=int, default=5, help='Retries per request (default: 5)')
+        parser.add_argument(
+            '--base-url',
+            default=settings.OPENAI_BASE_URL,
+            help='OpenAI-compatible API URL, e.g. http://127.0.0.1:8089/v1 for serve_llm_stub',
+        )
+        parser.add_argument('--model', default=settings.OPENAI_MODEL, help=f'Model (default: {settings.OPENAI_MODEL})')
+        parser.add_argument(
+            '--update-batch-size',
+            type=int,
+            default=200,
+            help='Categorized recipes saved per bulk update (default: 200)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Most recipes per API request; 1 sends one recipe per prompt (default: 10)',
+        )
+        parser.add_argument(
+            '--batch-tokens',
+            type=int,
+            default=2500,
+            help='Estimated recipe prompt tokens per batched request (default: 2500)',
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Neither read nor write the categorization cache',
+        )
+
+    def recipe_details(self, recipe):
+        """Prompt lines describing one recipe"""
+        ingredient_names = [ing.name for ing in recipe.ingredients.all()]
+        return (
+            f"- Name: {recipe.name}\n"
+            f"- Ingredients: {', '.join(ingredient_names) if ingredient_names else 'Not specified'}\n"
+            f"- Instructions: {recipe.steps[:STEPS_CHARS] if recipe.steps else 'Not specified'}\n"
+            f"- Description: {recipe.description[:DESCRIPTION_CHARS] if recipe.description else 'Not specified'}"
+        )
+
+    def category_format(self, with_id=False):
+        """The JSON object the model should answer with"""
+        id_line = '    "id": "the recipe number",\n' if with_id else ''
+        return f"""{{
+{id_line}    "cuisineType": "one of: {', '.join(self.cuisine_types)}",
+    "difficulty": "one of: {', '.join(self.difficulty_levels)}",
+    "cookingTime": "one of: {', '.join(self.cooking_time_ranges)}",
+    "tags": ["array of relevant tags like vegetarian, spicy, healthy, etc."]
+}}"""
 
     def categorize_meal_with_ai(self, recipe):
         """Use OpenAI to categorize a single meal"""
-        if not openai.api_key:
+        if self.client is None:
             return self.fallback_categorization(recipe)
         
-        # Get ingredient names
-        ingredient_names = [ing.name for ing in recipe.ingredients.all()]
-        
         prompt = f"""
 Categorize this meal based on the following information:
-- Name: {recipe.name}
-- Ingredients: {', '.join(ingredient_names) if ingredient_names else 'Not specified'}
-- Instructions: {recipe.steps[:500] if recipe.steps else 'Not specified'}
-- Description: {recipe.description[:200] if recipe.description else 'Not specified'}
+{self.recipe_details(recipe)}
 
 Please categorize this meal and respond with JSON in this exact format:
-{{
-    "cuisineType": "one of: {', '.join(self.cuisine_types)}",
-    "difficulty": "one of: {', '.join(self.difficulty_levels)}",
-    "cookingTime": "one of: {', '.join(self.cooking_time_ranges)}",
-    "tags": ["array of relevant tags like vegetarian, spicy, healthy, etc."]
-}}
+{self.category_format()}
 
-Base your decisions on:
-- Cuisine type: ingredients, cooking methods, dish name
-- Difficulty: number of steps, complexity of techniques, ingredients
-- Cooking time: complexity of preparation and cooking methods
-- Tags: dietary restrictions, flavor profiles, meal type
+{GUIDANCE}
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            content = self.client.complete(
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a culinary expert that categorizes meals. Respond only with valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
                 ],
                 temperature=0.3,
                 max_tokens=200
             )
 
-            categorization = json.loads(response.choices[0].message.content)
+            categorization = json.loads(content)
             return self.validate_and_format_response(categorization)
             
         except Exception as e:
             self.stdout.write(
                 self.style.WARNING(f'AI categorization failed for "{recipe.name}": {e}')
             )
+            with self.lock:
+                self.fallback_ids.add(recipe.id)
             return self.fallback_categorization(recipe)
 
+    def categorize_batch_with_ai(self, recipes):
+        """
+        Categorize several meals in one request. Returns one entry per recipe,
+        in order: the validated categorization, or None when the reply had no
+        usable item for it. Raises when the request or the reply as a whole fails.
+        """
+        sections = '\n\n'.join(
+            f"Recipe {number}:\n{self.recipe_details(recipe)}" for number, recipe in enumerate(recipes, 1)
+        )
+        prompt = f"""
+Categorize each of the following {len(recipes)} meals:
+
+{sections}
+
+Respond with a JSON array holding one object per recipe, in the same order, each in this exact format:
+{self.category_format(with_id=True)}
+
+{GUIDANCE}
+        """
+        content = self.client.complete(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.3,
+            max_tokens=COMPLETION_TOKENS_PER_RECIPE * len(recipes),
+        )
+
+        reply = json.loads(content)
+        if isinstance(reply, dict):
+            # Some models wrap the array, e.g. {"recipes": [...]}
+            reply = next((value for value in reply.values() if isinstance(value, list)), None)
+        if not isinstance(reply, list):
+            raise ValueError('reply is not a JSON array')
+
+        items = {}
+        for position, item in enumerate(reply, 1):
+            if not isinstance(item, dict):
+                continue
+            try:
+                number = int(item.get('id', position))
+            except (TypeError, ValueError):
+                continue
+            items.setdefault(number, item)
+
+        results = []
+        for number in range(1, len(recipes) + 1):
+            item = items.get(number)
+            if item is None or any(key not in item for key in REQUIRED_KEYS):
+                results.append(None)
+            else:
+                results.append(self.validate_and_format_response(item))
+        return results
+
     def fallback_categorization(self, recipe):
         """Rule-based fallback categorization"""
         return {
@@ -271,88 +402,184 @@ Base your decisions on:
             'tags': categorization.get('tags', [])[:10] if isinstance(categorization.get('tags'), list) else []
         }
 
+    def build_client(self, options):
+        api_key = getattr(settings, 'OPENAI_API_KEY', None)
+        # A custom endpoint (e.g. serve_llm_stub) may not need a key
+        if not api_key and not options['base_url']:
+            return None
+        limiter = RateLimiter(options['requests_per_minute'], options['tokens_per_minute'])
+        return ChatClient(
+            api_key=api_key,
+            base_url=options['base_url'],
+            model=options['model'],
+            limiter=limiter,
+            max_retries=options['max_retries'],
+        )
+
+    def categorize_safely(self, recipe):
+        """(categorization, error) so one failure does not stop the worker pool"""
+        try:
+            return self.categorize_meal_with_ai(recipe), None
+        except Exception as e:
+            return None, e
+
+    def categorize_batch_safely(self, recipes):
+        """
+        [(categorization, error)] for a batch; items the batched reply did not
+        answer usably (or all of them, if the request failed) are retried one
+        recipe per prompt.
+        """
+        if self.client is None or len(recipes) == 1:
+            return [self.categorize_safely(recipe) for recipe in recipes]
+        try:
+            categorizations = self.categorize_batch_with_ai(recipes)
+        except Exception as e:
+            self.stdout.write(
+                self.style.WARNING(f'Batch of {len(recipes)} failed, retrying one by one: {e}')
+            )
+            categorizations = [None] * len(recipes)
+
+        retried = sum(1 for categorization in categorizations if categorization is None)
+        with self.lock:
+            self.batch_stats['batches'] += 1
+            self.batch_stats['batched'] += len(recipes)
+            self.batch_stats['retried'] += retried
+        return [
+            (categorization, None) if categorization is not None else self.categorize_safely(recipe)
+            for recipe, categorization in zip(recipes, categorizations)
+        ]
+
+    def make_batches(self, recipes, batch_size, batch_tokens):
+        """
+        Consecutive runs of recipes for batched prompts: at most batch_size
+        recipes and about batch_tokens prompt tokens each, so long recipes
+        go out in smaller batches. A recipe over the budget goes alone.
+        """
+        if self.client is None or batch_size <= 1:
+            return [[recipe] for recipe in recipes]
+        batches = []
+        batch = []
+        tokens = 0
+        for recipe in recipes:
+            cost = estimate_tokens(self.recipe_details(recipe))
+            if batch and (len(batch) >= batch_size or tokens + cost > batch_tokens):
+                batches.append(batch)
+                batch = []
+                tokens = 0
+            batch.append(recipe)
+            tokens += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def save_categorizations(self, recipes, cache_entries, model):
+        if recipes:
+            Recipe.objects.bulk_update(recipes, CATEGORY_FIELDS, batch_size=len(recipes))
+        if cache_entries:
+            store_cached(cache_entries, model, PROMPT_VERSION)
+
     def handle(self, *args, **options):
         dry_run = options['dry_run']
         force = options['force']
         recipe_id = options['recipe_id']
         limit = options['limit']
         
-        if not openai.api_key:
+        self.client = self.build_client(options)
+        if self.client is None:
             self.stdout.write(
                 self.style.WARNING('OpenAI API key not found. Using fallback categorization only.')
             )
         
-        # Get recipes to categorize
+        # Get recipes to categorize (ingredients prefetched: workers never query the database)
+        recipes = Recipe.objects.prefetch_related('ingredients').order_by('id')
         if recipe_id:
-            try:
-                recipes = [Recipe.objects.get(id=recipe_id)]
-            except Recipe.DoesNotExist:
+            recipes = list(recipes.filter(id=recipe_id))
+            if not recipes:
                 self.stdout.write(self.style.ERROR(f'Recipe with ID {recipe_id} not found'))
                 return
         else:
-            if force:
-                recipes = Recipe.objects.all()[:limit]
-            else:
+            if not force:
                 # Only categorize recipes without categories
-                recipes = Recipe.objects.filter(
+                recipes = recipes.filter(
                     Q(cuisine_type__isnull=True) | 
                     Q(difficulty__isnull=True) | 
                     Q(cooking_time__isnull=True)
-                )[:limit]
+                )
+            recipes = list(recipes[:limit])
         
         if not recipes:
             self.stdout.write(self.style.SUCCESS('No recipes need categorization!'))
             return
         
-        self.stdout.write(f'Categorizing {len(recipes)} recipes...')
+        started = time.perf_counter()
+        # Only API results are cached; rule-based ones are free to recompute
+        use_cache = self.client is not None and not options['no_cache']
+        keys = {}
+        cached = {}
+        if use_cache:
+            keys = {recipe.id: categorization_key(recipe, options['model'], PROMPT_VERSION) for recipe in recipes}
+            cached = load_cached(keys.values())
+        to_request = [recipe for recipe in recipes if keys.get(recipe.id) not in cached]
+        hits = len(recipes) - len(to_request)
+
+        batches = self.make_batches(to_request, options['batch_size'], options['batch_tokens'])
+        self.stdout.write(
+            f'Categorizing {len(recipes)} recipes ({hits} cached) in {len(batches)} requests '
+            f'with {options["concurrency"]} workers...'
+        )
         
         categorized_count = 0
         failed_count = 0
+        pending = []
+        pending_cache = []
+        stored_count = 0
         
-        for i, recipe in enumerate(recipes, 1):
-            try:
-                self.stdout.write(f'Processing {i}/{len(recipes)}: {recipe.name}')
-                
-                # Categorize the recipe
-                categorization = self.categorize_meal_with_ai(recipe)
-                
-                if dry_run:
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+            # map() yields in submission order, so output and saves stay deterministic
+            requested = chain.from_iterable(pool.map(self.categorize_batch_safely, batches))
+            results = (
+                (cached[keys[recipe.id]], None) if keys.get(recipe.id) in cached else next(requested)
+                for recipe in recipes
+            )
+            for i, (recipe, (categorization, error)) in enumerate(zip(recipes, results), 1):
+                if error is not None:
                     self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  Would categorize as: {categorization["cuisine_type"]}, '
-                            f'{categorization["difficulty"]}, {categorization["cooking_time"]}'
-                        )
+                        self.style.WARNING(f'  Failed to categorize "{recipe.name}": {error}')
+                    )
+                    failed_count += 1
+                    continue
+
+                self.stdout.write(f'Processing {i}/{len(recipes)}: {recipe.name}')
+                verb = 'Would categorize' if dry_run else 'Categorized'
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'  {verb} as: {categorization["cuisine_type"]}, '
+                        f'{categorization["difficulty"]}, {categorization["cooking_time"]}'
                     )
-                    if categorization['tags']:
-                        self.stdout.write(f'  Tags: {", ".join(categorization["tags"])}')
-                else:
-                    # Save to database
+                )
+                if dry_run and categorization['tags']:
+                    self.stdout.write(f'  Tags: {", ".join(categorization["tags"])}')
+                categorized_count += 1
+
+                if not dry_run:
                     recipe.cuisine_type = categorization['cuisine_type']
                     recipe.difficulty = categorization['difficulty']
                     recipe.cooking_time = categorization['cooking_time']
                     recipe.tags = categorization['tags']
                     recipe.categorized_at = timezone.now()
-                    recipe.save()
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  Categorized as: {categorization["cuisine_type"]}, '
-                            f'{categorization["difficulty"]}, {categorization["cooking_time"]}'
-                        )
-                    )
-                
-                categorized_count += 1
-                
-                # Rate limiting to avoid API limits
-                if openai.api_key and i % 10 == 0:
-                    time.sleep(1)
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.WARNING(f'  Failed to categorize "{recipe.name}": {e}')
-                )
-                failed_count += 1
-                continue
+                    pending.append(recipe)
+                    key = keys.get(recipe.id)
+                    if key and key not in cached and recipe.id not in self.fallback_ids:
+                        pending_cache.append((key, categorization))
+                    if len(pending) >= options['update_batch_size']:
+                        self.save_categorizations(pending, pending_cache, options['model'])
+                        stored_count += len(pending_cache)
+                        pending = []
+                        pending_cache = []
+        if pending:
+            self.save_categorizations(pending, pending_cache, options['model'])
+            stored_count += len(pending_cache)
+        elapsed = time.perf_counter() - started
         
         # Summary
         action = "Would categorize" if dry_run else "Categorized"
@@ -361,6 +588,26 @@ Base your decisions on:
                 f'\n{action} {categorized_count} recipes successfully!'
             )
         )
+        self.stdout.write(
+            f'{len(recipes)} recipes in {elapsed:.1f}s ({len(recipes) / max(elapsed, 1e-9):.1f} recipes/s)'
+        )
+        if self.client is not None:
+            stats = self.client.stats
+            self.stdout.write(
+                f'API: {stats["requests"]} requests, {stats["retries"]} retries, '
+                f'{stats["prompt_tokens"]} prompt + {stats["completion_tokens"]} completion tokens'
+            )
+            batch_stats = self.batch_stats
+            self.stdout.write(
+                f'{len(to_request) / max(stats["requests"], 1):.1f} recipes/request; '
+                f'{batch_stats["batched"]} recipes sent in {batch_stats["batches"]} batches, '
+                f'{batch_stats["retried"]} retried individually'
+            )
+        if use_cache:
+            self.stdout.write(
+                f'Cache: {hits} hits, {len(to_request)} misses '
+                f'({100 * hits / len(recipes):.0f}% hit rate), {stored_count} entries stored'
+            )
         
         if failed_count > 0:
             self.stdout.write(
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import DenseModel, load_keras_model
+
+
+def load_backend(name, npz_path):
+    if name == 'keras':
+        return load_keras_model()
+    return DenseModel.load(npz_path)
+
+
+def top_k_agreement(reference, candidate, k):
+    """Share of rows whose top-k label sets are identical"""
+    ref = np.sort(np.argsort(-reference, axis=1)[:, :k], axis=1)
+    cand = np.sort(np.argsort(-candidate, axis=1)[:, :k], axis=1)
+    return float((ref == cand).all(axis=1).mean())
+
+
+class Command(BaseCommand):
+    help = "Check top-k parity of the NumPy model backends with Keras and report latency and RSS per backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=2000, help='Random inputs used for parity (default: 2000)')
+        parser.add_argument('--k', type=int, default=3, help='Top-k compared (default: 3)')
+        parser.add_argument('--min-agreement', type=float, default=0.99, help='Required top-k agreement (default: 0.99)')
+        # Internal: measure a single backend in a subprocess
+        parser.add_argument('--child', help=argparse.SUPPRESS)
+        parser.add_argument('--npz', help=argparse.SUPPRESS)
+
+    def measure(self, backend, npz_path):
+        """Load one backend in this (fresh) process and time it"""
+        start = time.perf_counter()
+        model = load_backend(backend, npz_path)
+        load_seconds = time.perf_counter() - start
+        input_dim = model.input_shape[-1]
+        latency = {}
+        for batch_size in (1, 64):
+            batch = np.random.default_rng(0).normal(size=(batch_size, input_dim)).astype(np.float32)
+            np.asarray(model(batch, training=False))  # first call builds any lazy state
+            runs = 200 if batch_size == 1 else 50
+            start = time.perf_counter()
+            for _ in range(runs):
+                np.asarray(model(batch, training=False))
+            latency[batch_size] = (time.perf_counter() - start) / runs * 1000
+        return {
+            'load_s': load_seconds,
+            'batch1_ms': latency[1],
+            'batch64_ms': latency[64],
+            # ru_maxrss is in kB on Linux
+            'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure(options['child'], options['npz'])))
+            return
+
+        k = options['k']
+        reference = DenseModel.from_keras_archive()
+        inputs = np.random.default_rng(1).normal(size=(options['samples'], reference.input_shape[1])).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {}
+            for dtype in ('float32', 'float16'):
+                paths[f'numpy-{dtype}'] = os.path.join(tmp, f'model-{dtype}.npz')
+                reference.save(paths[f'numpy-{dtype}'], dtype=np.dtype(dtype))
+
+            try:
+                keras_scores = np.asarray(load_keras_model()(inputs, training=False))
+            except ImportError:
+                keras_scores = None
+                self.stdout.write(self.style.WARNING('TensorFlow is not installed; comparing against float32 NumPy instead.'))
+            baseline = keras_scores if keras_scores is not None else reference(inputs)
+
+            self.stdout.write(f'{"backend":<15} {"top-1":>7} {"top-" + str(k):>7} {"max |diff|":>11}')
+            failed = False
+            for name, path in paths.items():
+                scores = DenseModel.load(path)(inputs)
+                top1 = top_k_agreement(baseline, scores, 1)
+                topk = top_k_agreement(baseline, scores, k)
+                failed |= topk < options['min_agreement']
+                self.stdout.write(f'{name:<15} {top1:>7.4f} {topk:>7.4f} {np.abs(baseline - scores).max():>11.2e}')
+
+            self.stdout.write(f'\n{"backend":<15} {"load s":>7} {"1 row ms":>9} {"64 rows ms":>11} {"RSS MB":>8}')
+            backends = [('keras', None)] if keras_scores is not None else []
+            backends += [('numpy', path) for path in paths.values()]
+            labels = (['keras'] if keras_scores is not None else []) + list(paths)
+            for label, (backend, path) in zip(labels, backends):
+                # Each backend runs in its own process so RSS is not shared between them
+                command = [sys.executable, sys.argv[0], 'check_model_backends', '--child', backend]
+                if path:
+                    command += ['--npz', path]
+                result = subprocess.run(command, capture_output=True, text=True)
+                if result.returncode:
+                    self.stdout.write(self.style.WARNING(f'{label:<15} failed: {result.stderr.strip()[-200:]}'))
+                    continue
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                self.stdout.write(
+                    f'{label:<15} {stats["load_s"]:>7.2f} {stats["batch1_ms"]:>9.3f} '
+                    f'{stats["batch64_ms"]:>11.3f} {stats["rss_mb"]:>8.0f}'
+                )
+
+        if failed:
+            raise CommandError(f"Top-{k} agreement below {options['min_agreement']}")
+        self.stdout.write(self.style.SUCCESS(f'\nAll NumPy backends agree on the top-{k} labels.'))
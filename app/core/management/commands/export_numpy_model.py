@@ -0,0 +1,32 @@
+import os
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import KERAS_MODEL_PATH, NUMPY_MODEL_PATH, DenseModel
+
+
+class Command(BaseCommand):
+    help = "Extract recipe_model.keras weights into an .npz for the NumPy inference backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=KERAS_MODEL_PATH, help='Keras model archive')
+        parser.add_argument('--output', default=NUMPY_MODEL_PATH, help='Output .npz (default: resources/recipe_model.npz)')
+        parser.add_argument(
+            '--dtype',
+            choices=['float32', 'float16'],
+            default='float32',
+            help='Storage precision of the weights (computation is always float32)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = DenseModel.from_keras_archive(options['source'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Could not read {options['source']}: {e}")
+
+        model.save(options['output'], dtype=np.dtype(options['dtype']))
+        shapes = ' -> '.join(str(kernel.shape[1]) for kernel, _, _ in model.layers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']} ({options['dtype']}, {model.input_shape[1]} -> {shapes}, "
+            f"{os.path.getsize(options['output']) / 1e3:.0f} kB). "
+            f"Set RECIPE_MODEL_BACKEND=numpy (or leave it on auto) to use it."
+        ))
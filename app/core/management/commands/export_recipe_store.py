@@ -0,0 +1,53 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import RECIPE_STORE_DIR, RESOURCES_DIR, RecipeStore, find_embedding_column
+
+
+class Command(BaseCommand):
+    help = "Convert recipe_embeddings.pkl into the memory-mappable recipe store used by actual_ai.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            default=os.path.join(RESOURCES_DIR, 'recipe_embeddings.pkl'),
+            help='Pickled recipes DataFrame (default: resources/recipe_embeddings.pkl)',
+        )
+        parser.add_argument(
+            '--output',
+            default=RECIPE_STORE_DIR,
+            help='Directory to write the .npy files to (default: resources/recipe_store)',
+        )
+        parser.add_argument(
+            '--embedding-column',
+            help='DataFrame column holding the embedding vectors (default: first vector-valued column)',
+        )
+
+    def handle(self, *args, **options):
+        import pandas as pd
+
+        start = time.perf_counter()
+        try:
+            df = pd.read_pickle(options['source'])
+        except Exception as e:
+            raise CommandError(f"Could not read {options['source']}: {e}")
+
+        embedding_column = options['embedding_column'] or find_embedding_column(df)
+        if embedding_column is None or embedding_column not in df:
+            raise CommandError('No embedding column found; pass --embedding-column.')
+        self.stdout.write(f'Loaded {len(df)} recipes; embeddings from column "{embedding_column}"')
+
+        store = RecipeStore.from_dataframe(df, embedding_column=embedding_column)
+        store.save(options['output'])
+
+        size = sum(
+            os.path.getsize(os.path.join(options['output'], name))
+            for name in os.listdir(options['output'])
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote {len(store)} recipes ({store.embeddings.shape[1]}-d embeddings, '
+                f'{len(store.vocabulary)} ingredient words, {size / 1e6:.1f} MB) to {options["output"]} '
+                f'in {time.perf_counter() - start:.1f}s'
+            )
+        )
@@ -1,7 +1,14 @@
 import csv
+import time
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.allergen_matcher import compile_allergen_matcher
+from app.allergen_tokens import rebuild_ingredient_allergen_tokens
+from app.canonical import invalidate_ingredient_vocabulary
 from core.models import IngredientAllData, Allergy, DietaryPreference
 
+BATCH_SIZE = 2000
+
 class Command(BaseCommand):
     help = "Import ingredients from model_ingredients.csv into IngredientAllData with allergen and dietary tags"
 
@@ -11,6 +18,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete existing ingredients before importing',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Ingredients per transaction (default: {BATCH_SIZE})',
+        )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -39,6 +52,8 @@ class Command(BaseCommand):
             'Molluscs': ['mollusc', 'mollusk', 'snail', 'squid', 'octopus'],
             'Sulphites': ['sulphite', 'sulfite', 'sulfur dioxide']
         }
+        # One pass over each name finds every keyword of every allergen
+        self.allergen_matcher = compile_allergen_matcher(self.allergen_mapping)
 
         # Dietary mapping now loaded from ingredient_map.csv
         self.dietary_mappings = self.load_dietary_mappings('resources/ingredient_map.csv')
@@ -54,14 +69,8 @@ class Command(BaseCommand):
     
     def get_allergens_for_ingredient(self, ingredient_name):
         """Determine allergens for an ingredient based on its name"""
-        allergens = []
-        name_lower = ingredient_name.lower()
-        
-        for allergen, keywords in self.allergen_mapping.items():
-            if any(keyword in name_lower for keyword in keywords):
-                allergens.append(allergen)
-                
-        return allergens
+        found = self.allergen_matcher.matches(ingredient_name)
+        return [allergen for allergen in self.allergen_mapping if allergen in found]
 
     def get_dietary_preferences_for_ingredient(self, ingredient_name):
         """Determine dietary compatibility for an ingredient"""
@@ -90,11 +99,17 @@ class Command(BaseCommand):
             )
             return
         
+        allergy_ids = dict(Allergy.objects.values_list('name', 'id'))
+        diet_ids = dict(DietaryPreference.objects.values_list('name', 'id'))
+        existing_names = {name.lower() for name in IngredientAllData.objects.values_list('name', flat=True)}
+
         created_count = 0
         skipped_count = 0
         duplicate_count = 0
         duplicate_ingredients = []
-        
+        batch = []
+        started = time.perf_counter()
+
         try:
             with open('resources/ingredient_map.csv', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
@@ -103,44 +118,33 @@ class Command(BaseCommand):
                     if not ingredient_name or len(ingredient_name) < 2:
                         skipped_count += 1
                         continue
-                    if IngredientAllData.objects.filter(name__iexact=ingredient_name).exists():
+                    # Case-insensitive, against the table and earlier rows of the file
+                    if ingredient_name.lower() in existing_names:
                         duplicate_count += 1
                         duplicate_ingredients.append(ingredient_name)
                         continue
-                    try:
-                        ingredient = IngredientAllData.objects.create(name=ingredient_name)
-                        allergen_names = self.get_allergens_for_ingredient(ingredient_name)
-                        for allergen_name in allergen_names:
-                            try:
-                                allergen = Allergy.objects.get(name=allergen_name)
-                                ingredient.contains_allergens.add(allergen)
-                            except Allergy.DoesNotExist:
-                                pass
-                        diet_names = self.get_dietary_preferences_for_ingredient(ingredient_name)
-                        for diet_name in diet_names:
-                            try:
-                                diet = DietaryPreference.objects.get(name=diet_name)
-                                ingredient.dietary_preferences.add(diet)
-                            except DietaryPreference.DoesNotExist:
-                                pass
-                        created_count += 1
-                        if created_count % 100 == 0:
-                            self.stdout.write(f'Processed {created_count} ingredients...')
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.WARNING(f'Error creating ingredient "{ingredient_name}": {e}')
-                        )
-                        skipped_count += 1
+                    existing_names.add(ingredient_name.lower())
+                    batch.append(ingredient_name)
+                    if len(batch) >= options['batch_size']:
+                        created_count += self.create_batch(batch, allergy_ids, diet_ids)
+                        batch = []
+                        elapsed = time.perf_counter() - started
+                        self.stdout.write(f'Processed {created_count} ingredients ({created_count / elapsed:.0f} rows/s)...')
+                if batch:
+                    created_count += self.create_batch(batch, allergy_ids, diet_ids)
         except FileNotFoundError:
             self.stdout.write(
                 self.style.ERROR('File resources/ingredient_map.csv not found')
             )
             return
-        
+        # bulk_create sends no signals, so refresh what the post_save handlers would have
+        invalidate_ingredient_vocabulary()
+        elapsed = time.perf_counter() - started
+
         # Summary
         self.stdout.write(
             self.style.SUCCESS(
-                f'\nImport completed!\n'
+                f'\nImport completed in {elapsed:.1f}s ({created_count / max(elapsed, 1e-9):.0f} rows/s)\n'
                 f'Created: {created_count} ingredients\n'
                 f'Skipped: {skipped_count} (invalid entries)\n'
                 f'Duplicates: {duplicate_count} (already exist in database)'
@@ -149,4 +153,28 @@ class Command(BaseCommand):
         if duplicate_ingredients:
             self.stdout.write(self.style.WARNING(f'Duplicate ingredients:'))
             for name in duplicate_ingredients:
-                self.stdout.write(f'- {name}')
\ No newline at end of file
+                self.stdout.write(f'- {name}')
+
+    def create_batch(self, names, allergy_ids, diet_ids):
+        """Insert ingredients with their allergen and diet links and allergen tokens in one transaction"""
+        AllergenLink = IngredientAllData.contains_allergens.through
+        DietLink = IngredientAllData.dietary_preferences.through
+        with transaction.atomic():
+            ingredients = IngredientAllData.objects.bulk_create([IngredientAllData(name=name) for name in names])
+            allergen_links = []
+            diet_links = []
+            for ingredient in ingredients:
+                for allergen_name in self.get_allergens_for_ingredient(ingredient.name):
+                    if allergen_name in allergy_ids:
+                        allergen_links.append(AllergenLink(
+                            ingredientalldata_id=ingredient.pk, allergy_id=allergy_ids[allergen_name]
+                        ))
+                for diet_name in self.get_dietary_preferences_for_ingredient(ingredient.name):
+                    if diet_name in diet_ids:
+                        diet_links.append(DietLink(
+                            ingredientalldata_id=ingredient.pk, dietarypreference_id=diet_ids[diet_name]
+                        ))
+            AllergenLink.objects.bulk_create(allergen_links)
+            DietLink.objects.bulk_create(diet_links)
+            rebuild_ingredient_allergen_tokens([ingredient.pk for ingredient in ingredients])
+        return len(ingredients)
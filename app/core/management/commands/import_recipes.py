@@ -1,104 +1,28 @@
 import csv
 import ast
+import time
 from django.core.management.base import BaseCommand
-from core.models import IngredientAllData, Recipe
+from app.canonical import get_ingredient_vocabulary
+from app.diet_masks import load_diet_masks
+from app.recipe_import import (
+    BATCH_SIZE,
+    CopyRecipeWriter,
+    RecipeBulkWriter,
+    last_rows_by_name,
+    open_checkpoint,
+    parse_rows,
+)
+from core.models import Recipe, RecipeImportCheckpoint
+
+DATASET_PATH = 'resources/test_dataset.csv'
+MAX_ROWS = 50202
 
 class Command(BaseCommand):
     help = "Import recipes from test_dataset.csv"
 
-    def normalize_ingredient_name(self, name):
-        """Normalize ingredient names to handle plural/singular forms"""
-        name = name.strip().lower()
-        
-        # Common plural to singular mappings
-        plural_to_singular = {
-            'tomatoes': 'tomato',
-            'potatoes': 'potato',
-            'onions': 'onion',
-            'carrots': 'carrot',
-            'peppers': 'pepper',
-            'mushrooms': 'mushroom',
-            'garlic cloves': 'garlic',
-            'cloves': 'garlic',
-            'eggs': 'egg',
-            'apples': 'apple',
-            'bananas': 'banana',
-            'strawberries': 'strawberry',
-            'blueberries': 'blueberry',
-            'raspberries': 'raspberry',
-            'cherries': 'cherry',
-            'grapes': 'grape',
-            'lemons': 'lemon',
-            'limes': 'lime',
-            'oranges': 'orange',
-            'peaches': 'peach',
-            'pears': 'pear',
-            'nuts': 'nut',
-            'almonds': 'almond',
-            'walnuts': 'walnut',
-            'cashews': 'cashew',
-            'pecans': 'pecan',
-            'beans': 'bean',
-            'chickpeas': 'chickpea',
-            'lentils': 'lentil',
-            'peas': 'pea',
-            'herbs': 'herb',
-            'spices': 'spice',
-            'olives': 'olive',
-            'capers': 'caper',
-            'anchovies': 'anchovy',
-            'sardines': 'sardine',
-            'shrimp': 'shrimp',
-            'scallops': 'scallop',
-            'clams': 'clam',
-            'mussels': 'mussel',
-            'oysters': 'oyster',
-        }
-        
-        # Check if it's a known plural form
-        if name in plural_to_singular:
-            return plural_to_singular[name]
-        
-        # Handle common plural endings
-        if name.endswith('ies') and len(name) > 3:
-            return name[:-3] + 'y'  # berries -> berry
-        elif name.endswith('es') and len(name) > 2:
-            return name[:-2]  # tomatoes -> tomato
-        elif name.endswith('s') and len(name) > 1:
-            return name[:-1]  # carrots -> carrot
-        
-        return name
-
-    def find_ingredient_by_name(self, ingredient_name):
-        """Try to find ingredient by exact match or normalized forms"""
-        original_name = ingredient_name.strip()
-        
-        # Try exact match first
-        try:
-            return IngredientAllData.objects.get(name=original_name)
-        except IngredientAllData.DoesNotExist:
-            pass
-        
-        # Try normalized version
-        normalized_name = self.normalize_ingredient_name(original_name)
-        try:
-            return IngredientAllData.objects.get(name=normalized_name)
-        except IngredientAllData.DoesNotExist:
-            pass
-        
-        # Try case-insensitive match
-        try:
-            return IngredientAllData.objects.get(name__iexact=original_name)
-        except IngredientAllData.DoesNotExist:
-            pass
-        
-        # Try case-insensitive normalized match
-        try:
-            return IngredientAllData.objects.get(name__iexact=normalized_name)
-        except IngredientAllData.DoesNotExist:
-            pass
-        
-        return None
+    def find_ingredient_by_name(self, vocabulary, ingredient_name):
+        """Id of the ingredient matching the name exactly or by canonical form, or None"""
+        return vocabulary.resolve(ingredient_name.strip())
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -106,34 +30,65 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete existing recipes before importing',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Resolve ingredients in memory and write recipes in batches (much faster)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Rows per transaction in --bulk mode (default: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes parsing CSV rows while this one writes to the database (implies --bulk)',
+        )
+        parser.add_argument(
+            '--loader',
+            choices=['orm', 'copy'],
+            default='orm',
+            help='Bulk writer: ORM bulk_create, or COPY into staging tables merged with SQL '
+                 '(implies --bulk; falls back to plain inserts on SQLite)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='In bulk mode, start from the first row even if an earlier run over the same file was interrupted',
+        )
+        parser.add_argument('--file', default=DATASET_PATH, help=f'CSV to import (default: {DATASET_PATH})')
+        parser.add_argument('--limit', type=int, default=MAX_ROWS, help=f'Rows to read at most (default: {MAX_ROWS})')
 
     def handle(self, *args, **options):
         if options['clean_existing']:
             self.stdout.write('Deleting existing recipes...')
             deleted_count = Recipe.objects.count()
             Recipe.objects.all().delete()
+            RecipeImportCheckpoint.objects.all().delete()
             self.stdout.write(self.style.SUCCESS(f'Deleted {deleted_count} existing recipes.'))
 
+        if options['bulk'] or options['workers'] > 1 or options['loader'] == 'copy':
+            return self.import_bulk(options)
+
         created_count = 0
         updated_count = 0
         skipped_count = 0
         missing_ingredients_stats = {}  # Track missing ingredients and their counts
 
-        # Get all diets and build allowed ingredient sets for each
-        from core.models import DietaryPreference
-        all_diets = list(DietaryPreference.objects.all())
-        diet_allowed_ingredients = {
-            diet.id: set(IngredientAllData.objects.filter(dietary_preferences=diet).values_list('id', flat=True))
-            for diet in all_diets
-        }
+        # Each ingredient's diets as a bitmask; a recipe suits the AND of its ingredients' masks
+        diet_masks = load_diet_masks()
+        vocabulary = get_ingredient_vocabulary()
 
         try:
-            with open('resources/test_dataset.csv', encoding='utf-8') as f:
+            with open(options['file'], encoding='utf-8') as f:
                 reader = csv.DictReader(f)
 
                 for row_num, row in enumerate(reader, start=1):
-                    if row_num > 50202:
-                        self.stdout.write(self.style.SUCCESS(f'Reached 100 recipe limit, stopping...'))
+                    if row_num > options['limit']:
+                        self.stdout.write(self.style.SUCCESS(f'Reached {options["limit"]} recipe limit, stopping...'))
                         break
 
                     try:
@@ -147,14 +102,14 @@ class Command(BaseCommand):
                         steps = "\n".join(ast.literal_eval(row['directions']))
                         ingredient_names = ast.literal_eval(row['NER'])
 
-                        ingredient_objs = []
+                        ingredient_ids = []
                         missing_ingredients = []
 
                         for ing_name in ingredient_names:
                             if ing_name.strip():
-                                ing = self.find_ingredient_by_name(ing_name.strip())
-                                if ing:
-                                    ingredient_objs.append(ing)
+                                ingredient_id = self.find_ingredient_by_name(vocabulary, ing_name)
+                                if ingredient_id is not None:
+                                    ingredient_ids.append(ingredient_id)
                                 else:
                                     missing_ingredients.append(ing_name.strip())
 
@@ -183,11 +138,10 @@ class Command(BaseCommand):
                         )
 
                         # Link all ingredients to the recipe
-                        recipe.ingredients.set(ingredient_objs)
+                        recipe.ingredients.set(ingredient_ids)
 
                         # --- Assign suitable diets ---
-                        ingredient_ids = set(ing.id for ing in ingredient_objs)
-                        suitable_diet_ids = [diet.id for diet in all_diets if ingredient_ids.issubset(diet_allowed_ingredients[diet.id])]
+                        suitable_diet_ids = diet_masks.suitable_diets(ingredient_ids)
                         if suitable_diet_ids:
                             recipe.suitable_for_diets.set(suitable_diet_ids)
                         else:
@@ -214,10 +168,70 @@ class Command(BaseCommand):
 
         except FileNotFoundError:
             self.stdout.write(
-                self.style.ERROR('File resources/test_dataset.csv not found')
+                self.style.ERROR(f'File {options["file"]} not found')
             )
             return
 
+        self.report(created_count, updated_count, skipped_count, missing_ingredients_stats)
+
+    def import_bulk(self, options):
+        """Parse (in --workers processes), resolve and write in batches of --batch-size rows, one transaction each"""
+        try:
+            checkpoint = open_checkpoint(options['file'], restart=options['restart'])
+            # Only the last row of a repeated title is written, so re-imports stay idempotent
+            last_rows = last_rows_by_name(options['file'], options['limit'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'File {options["file"]} not found'))
+            return
+        if checkpoint.last_row:
+            self.stdout.write(f'Resuming after row {checkpoint.last_row} (use --restart to start over)')
+
+        started = time.perf_counter()
+        writer_class = CopyRecipeWriter if options['loader'] == 'copy' else RecipeBulkWriter
+        writer = writer_class(batch_size=options['batch_size'], checkpoint=checkpoint, last_rows=last_rows)
+        self.stdout.write(
+            f'Loaded {len(writer.vocabulary)} ingredient names and {len(writer.recipe_ids)} existing recipes '
+            f'in {time.perf_counter() - started:.2f}s'
+        )
+
+        started = time.perf_counter()
+        parse_errors = 0
+        batch = []
+        last_row = checkpoint.last_row
+        try:
+            rows = parse_rows(options['file'], options['limit'], workers=options['workers'], start=checkpoint.last_row)
+            for row_num, parsed, error in rows:
+                last_row = row_num
+                if error is not None:
+                    parse_errors += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(self.style.WARNING(f'Row {row_num}: {error}, skipping'))
+                    continue
+                batch.append(parsed)
+                if len(batch) >= options['batch_size']:
+                    writer.write(batch, last_row)
+                    batch = []
+                    self.progress(writer.stats.rows + parse_errors, started)
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'File {options["file"]} not found'))
+            return
+        writer.write(batch, last_row)
+        stats = writer.finish()
+
+        elapsed = time.perf_counter() - started
+        rows = stats.rows + parse_errors
+        self.stdout.write(f'Processed {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+        self.report(
+            stats.created, stats.updated, stats.skipped + parse_errors, stats.missing_ingredients,
+            stats.unchanged, stats.duplicates,
+        )
+
+    def progress(self, rows, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Processed {rows} rows ({rows / max(elapsed, 1e-9):.0f} rows/s)...')
+
+    def report(self, created_count, updated_count, skipped_count, missing_ingredients_stats, unchanged_count=None,
+               duplicate_count=None):
         self.stdout.write(
             self.style.SUCCESS(
                 f'\nImport completed!\n'
@@ -226,6 +240,10 @@ class Command(BaseCommand):
                 f'Skipped: {skipped_count} (missing ingredients)'
             )
         )
+        if unchanged_count is not None:
+            self.stdout.write(self.style.SUCCESS(f'Unchanged: {unchanged_count} rows (same content as the last import)'))
+        if duplicate_count:
+            self.stdout.write(self.style.SUCCESS(f'Duplicates: {duplicate_count} rows (a later row has the same title)'))
 
         if missing_ingredients_stats:
             self.stdout.write(
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from app.allergen_tokens import rebuild_ingredient_allergen_tokens, rebuild_recipe_allergen_tokens
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed allergen tokens of all ingredients and recipes"
+
+    def handle(self, *args, **options):
+        self.stdout.write('Tagging ingredients...')
+        ingredient_rows = rebuild_ingredient_allergen_tokens()
+        self.stdout.write('Tagging recipes...')
+        recipe_rows = rebuild_recipe_allergen_tokens()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nAllergen tokens rebuilt!\n'
+                f'Ingredient tokens: {ingredient_rows}\n'
+                f'Recipe tokens: {recipe_rows}'
+            )
+        )
@@ -0,0 +1,68 @@
+import time
+from django.core.management.base import BaseCommand
+from app.diet_masks import (
+    BATCH_SIZE,
+    changed_ingredients,
+    load_diet_masks,
+    recompute_recipe_diets,
+    save_diet_layout,
+    stored_masks_current,
+)
+from core.models import IngredientAllData, Recipe
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.suitable_for_diets for recipes whose ingredients' diet tags changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every recipe, not only affected ones')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Recipes per transaction (default: {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        masks = load_diet_masks()
+        layout_current = stored_masks_current(masks)
+        changed = changed_ingredients(masks)
+        self.stdout.write(f'{len(masks.diet_ids)} diets, {len(changed)} ingredients with changed diet tags')
+
+        if not layout_current:
+            # Diets were added or deleted since the last run, so every recipe's diets may change
+            self.stdout.write('The set of diets changed; recomputing every recipe')
+            recipe_ids = None
+        elif options['all']:
+            recipe_ids = None
+        else:
+            recipe_ids = set()
+            changed_ids = list(changed)
+            for start in range(0, len(changed_ids), options['batch_size']):
+                recipe_ids.update(
+                    Recipe.ingredients.through.objects.filter(
+                        ingredientalldata_id__in=changed_ids[start:start + options['batch_size']]
+                    ).values_list('recipe_id', flat=True)
+                )
+            self.stdout.write(f'{len(recipe_ids)} recipes use them')
+
+        checked, updated = recompute_recipe_diets(
+            recipe_ids, masks, batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        if not options['dry_run']:
+            if changed:
+                IngredientAllData.objects.bulk_update(
+                    [IngredientAllData(id=ingredient_id, diet_mask=mask) for ingredient_id, mask in changed.items()],
+                    ['diet_mask'],
+                    batch_size=options['batch_size'],
+                )
+            if not layout_current:
+                save_diet_layout(masks)
+
+        elapsed = time.perf_counter() - started
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} recipes, {verb} the diets of {updated}, in {elapsed:.2f}s'
+        ))
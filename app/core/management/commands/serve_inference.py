@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from resources.actual_ai import registry
+from resources.inference import InferenceServer, LocalPredictor
+
+
+class Command(BaseCommand):
+    help = "Serve micro-batched recipe_model.keras predictions on a Unix socket"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=settings.INFERENCE_SOCKET,
+            help='Socket path (default: INFERENCE_SOCKET)',
+        )
+        parser.add_argument(
+            '--max-batch-size',
+            type=int,
+            default=settings.INFERENCE_MAX_BATCH_SIZE,
+            help='Most requests coalesced into one model call',
+        )
+        parser.add_argument(
+            '--max-wait-ms',
+            type=float,
+            default=settings.INFERENCE_MAX_WAIT_MS,
+            help='Longest a request waits for its batch to fill',
+        )
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Pass --socket or set INFERENCE_SOCKET.')
+
+        registry.warmup(['model', 'label_encoder'])
+        if not registry.is_loaded('model') or not registry.is_loaded('label_encoder'):
+            raise CommandError(f'Could not load the model: {registry.errors}')
+
+        predictor = LocalPredictor(options['max_batch_size'], options['max_wait_ms'])
+        server = InferenceServer(options['socket'], predictor)
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving predictions on {options['socket']} "
+            f"(batches of up to {options['max_batch_size']}, {options['max_wait_ms']} ms max wait)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Final metrics: {predictor.metrics()}')
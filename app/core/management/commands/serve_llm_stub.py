@@ -0,0 +1,165 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+CUISINES = ['Italian', 'Mexican', 'Asian', 'American', 'Mediterranean', 'Indian', 'Thai', 'French']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+COOKING_TIMES = ['Under 30 mins', '30-60 mins', '1-2 hours', 'Over 2 hours']
+# Section headers of categorize_meals' batched prompts
+RECIPE_HEADER = re.compile(r'^Recipe (\d+):$', re.MULTILINE)
+
+
+def stub_categorization(text):
+    """Deterministic fake categorization for a prompt"""
+    digest = hashlib.sha1(text.encode()).digest()
+    return {
+        'cuisineType': CUISINES[digest[0] % len(CUISINES)],
+        'difficulty': DIFFICULTIES[digest[1] % len(DIFFICULTIES)],
+        'cookingTime': COOKING_TIMES[digest[2] % len(COOKING_TIMES)],
+        'tags': ['stub'],
+    }
+
+
+def stub_reply(prompt, drop_rate=0.0):
+    """
+    One categorization object, or for a batched prompt a JSON array with one
+    object per "Recipe N:" section (each dropped with probability drop_rate)
+    """
+    headers = list(RECIPE_HEADER.finditer(prompt))
+    if not headers:
+        return stub_categorization(prompt)
+    items = []
+    for header, following in zip(headers, headers[1:] + [None]):
+        if random.random() < drop_rate:
+            continue
+        section = prompt[header.end():following.start() if following else len(prompt)]
+        items.append({'id': int(header.group(1)), **stub_categorization(section)})
+    return items
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal POST /v1/chat/completions in the OpenAI response format"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        if not self.path.endswith('/chat/completions'):
+            return self.reply(404, {'error': {'message': f'Unknown path {self.path}'}})
+        if not server.admit():
+            return self.reply(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                              [('Retry-After', '0.5')])
+        time.sleep(max(0.0, random.gauss(server.latency, server.latency / 4)))
+        if random.random() < server.error_rate:
+            return self.reply(500, {'error': {'message': 'Simulated server error'}})
+
+        prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        content = json.dumps(stub_reply(prompt, server.drop_rate))
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self.reply(200, {
+            'id': f'chatcmpl-stub-{server.next_id()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, error_rate, requests_per_minute, drop_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.requests_per_minute = requests_per_minute
+        self.lock = threading.Lock()
+        self.window = []
+        self.count = 0
+
+    def next_id(self):
+        with self.lock:
+            self.count += 1
+            return self.count
+
+    def admit(self):
+        """Sliding one-minute window, like a provider's request rate limit"""
+        if not self.requests_per_minute:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            if len(self.window) >= self.requests_per_minute:
+                return False
+            self.window.append(now)
+            return True
+
+
+class Command(BaseCommand):
+    help = "Serve a local OpenAI-compatible chat completions stub for offline categorize_meals benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8089, help='Port (default: 8089)')
+        parser.add_argument('--latency-ms', type=float, default=300, help='Mean response latency (default: 300)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+        parser.add_argument(
+            '--drop-rate',
+            type=float,
+            default=0.0,
+            help='Share of recipes left out of batched replies',
+        )
+        parser.add_argument(
+            '--requests-per-minute',
+            type=int,
+            default=0,
+            help='Answer 429 above this rate (default: no limit)',
+        )
+
+    def handle(self, *args, **options):
+        server = StubServer(
+            (options['host'], options['port']),
+            options['latency_ms'] / 1000,
+            options['error_rate'],
+            options['requests_per_minute'],
+            options['drop_rate'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub chat completions API on http://{options['host']}:{options['port']}/v1 "
+            f"({options['latency_ms']:.0f} ms latency)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Served {server.count} completions')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from resources.actual_ai import registry
+
+
+class Command(BaseCommand):
+    help = "Load the recommendation model artifacts and report how long each one took"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'artifacts',
+            nargs='*',
+            help='Artifacts to load (default: all of them)',
+        )
+
+    def handle(self, *args, **options):
+        registry.warmup(options['artifacts'] or None)
+
+        for name, state in registry.status().items():
+            if state['loaded']:
+                self.stdout.write(f'{name:<20} {state["seconds"]:>8.2f}s')
+            elif name in registry.errors:
+                self.stdout.write(self.style.WARNING(f'{name:<20} failed: {registry.errors[name]}'))
+            else:
+                self.stdout.write(f'{name:<20} {"not loaded":>9}')
+
+        if registry.ready:
+            self.stdout.write(self.style.SUCCESS('All model artifacts are loaded.'))
+        else:
+            self.stdout.write(self.style.WARNING('Some model artifacts are not loaded.'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alter_allergy_name_alter_dietarypreference_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientAllergenToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=100)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allergen_tokens', to='core.ingredientalldata')),
+            ],
+            options={
+                'unique_together': {('ingredient', 'token')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeAllergenToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=100)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allergen_tokens', to='core.recipe')),
+            ],
+            options={
+                'unique_together': {('recipe', 'token')},
+            },
+        ),
+    ]
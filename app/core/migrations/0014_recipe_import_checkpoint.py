@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_alter_recipe_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('last_row', models.PositiveIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
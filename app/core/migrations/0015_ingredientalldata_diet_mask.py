@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredientalldata',
+            name='diet_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_allergen_tokens(apps, schema_editor):
+    """
+    Fill the token tables created in 0012 (same rules as app.allergen_tokens),
+    so search keeps excluding allergen synonyms right after deploy.
+    """
+    from app.helpers import get_allergen_token, get_related_allergens, get_token_matcher
+
+    Allergy = apps.get_model('core', 'Allergy')
+    IngredientAllData = apps.get_model('core', 'IngredientAllData')
+    IngredientAllergenToken = apps.get_model('core', 'IngredientAllergenToken')
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeAllergenToken = apps.get_model('core', 'RecipeAllergenToken')
+
+    vocabulary = {
+        get_allergen_token(name): get_related_allergens(name)
+        for name in Allergy.objects.values_list('name', flat=True)
+    }
+    matcher = get_token_matcher(vocabulary)
+    ingredient_tokens = {}
+    for ingredient_id, name in IngredientAllData.objects.values_list('id', 'name').iterator():
+        tokens = sorted(matcher.matches(name))
+        if tokens:
+            ingredient_tokens[ingredient_id] = tokens
+
+    IngredientAllergenToken.objects.all().delete()
+    IngredientAllergenToken.objects.bulk_create([
+        IngredientAllergenToken(ingredient_id=ingredient_id, token=token)
+        for ingredient_id, tokens in ingredient_tokens.items()
+        for token in tokens
+    ], batch_size=BATCH_SIZE)
+
+    recipe_tokens = set()
+    links = Recipe.ingredients.through.objects.filter(ingredientalldata_id__in=list(ingredient_tokens))
+    for recipe_id, ingredient_id in links.values_list('recipe_id', 'ingredientalldata_id').iterator():
+        recipe_tokens.update((recipe_id, token) for token in ingredient_tokens[ingredient_id])
+    RecipeAllergenToken.objects.all().delete()
+    RecipeAllergenToken.objects.bulk_create([
+        RecipeAllergenToken(recipe_id=recipe_id, token=token) for recipe_id, token in sorted(recipe_tokens)
+    ], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_categorizationcacheentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_allergen_tokens, migrations.RunPython.noop),
+    ]
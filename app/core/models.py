@@ -40,6 +40,8 @@ class IngredientAllData(models.Model):
     # Dietary/allergy information for filtering
     contains_allergens = models.ManyToManyField(Allergy, blank=True, related_name='ingredients')
     dietary_preferences = models.ManyToManyField(DietaryPreference, blank=True, related_name='ingredients')
+    # Bitmask of dietary_preferences as of the last recompute_recipe_diets run
+    diet_mask = models.BigIntegerField(default=0)
     
     class Meta:
         ordering = ['name']
@@ -48,10 +50,21 @@ class IngredientAllData(models.Model):
 
     def __str__(self):
         return self.name
+
+class IngredientAllergenToken(models.Model):
+    """Allergen token matched by an ingredient's name, precomputed for SQL filtering"""
+    ingredient = models.ForeignKey(IngredientAllData, on_delete=models.CASCADE, related_name='allergen_tokens')
+    token = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        unique_together = ('ingredient', 'token')
+
+    def __str__(self):
+        return f"{self.ingredient.name}: {self.token}"
     
 class Recipe(models.Model):
     """Represents a recipe in the system"""
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
     steps = models.TextField()
     ingredients = models.ManyToManyField('IngredientAllData', related_name='recipes')
@@ -126,6 +139,9 @@ class Recipe(models.Model):
         help_text="When the recipe was categorized"
     )
 
+    # Hash of the dataset row the recipe was last imported from
+    source_hash = models.CharField(max_length=40, blank=True, default='')
+
     def __str__(self):
         return self.name
     
@@ -142,6 +158,51 @@ class Recipe(models.Model):
         if self.is_categorized():
             return f"{self.cuisine_type} • {self.difficulty} • {self.cooking_time}"
         return "Not categorized"
+
+class RecipeImportCheckpoint(models.Model):
+    """Last dataset row whose batch was committed by a bulk import_recipes run"""
+    source = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    last_row = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: row {self.last_row}{' (completed)' if self.completed else ''}"
+
+class CatalogVersion(models.Model):
+    """
+    Version marker for derived data: a counter bumped on every write to what a
+    process-local cache is built from, or a fingerprint of the layout stored
+    values were written with
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: v{self.version}"
+
+class CategorizationCacheEntry(models.Model):
+    """An AI categorization, keyed by a hash of the prompt inputs, model and prompt version"""
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    prompt_version = models.PositiveIntegerField()
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.model}, prompt v{self.prompt_version})"
+
+class RecipeAllergenToken(models.Model):
+    """Union of the allergen tokens of a recipe's ingredients"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='allergen_tokens')
+    token = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        unique_together = ('recipe', 'token')
+
+    def __str__(self):
+        return f"{self.recipe.name}: {self.token}"
     
 class Meal(models.Model):
     """A planned meal with a specific recipe at a specific time"""
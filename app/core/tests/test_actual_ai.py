@@ -0,0 +1,23 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from resources.actual_ai import precompute_normalized_ingredients, recommend_by_ingredient_subset
+
+
+class IngredientSubsetTests(SimpleTestCase):
+    def setUp(self):
+        self.df = precompute_normalized_ingredients(pd.DataFrame({
+            'title': ['garlic bread', 'spiced tea', 'tomato soup'],
+            'ner_labeled': ['garlic bread butter', 'cloves tea cinnamon', 'tomatoes cream garlic'],
+        }))
+
+    def titles(self, ingredients):
+        return recommend_by_ingredient_subset(ingredients, self.df)['title'].tolist()
+
+    def test_query_and_recipe_words_share_one_normal_form(self):
+        self.assertEqual(self.titles(['Tomato', 'garlic']), ['tomato soup'])
+        self.assertEqual(self.titles(['garlic']), ['garlic bread', 'tomato soup'])
+
+    def test_cloves_query_finds_the_clove_recipe(self):
+        self.assertEqual(self.titles(['cloves']), ['spiced tea'])
+        self.assertEqual(self.titles(['Clove']), ['spiced tea'])
@@ -0,0 +1,57 @@
+import random
+import string
+
+from django.test import SimpleTestCase
+
+from app.allergen_matcher import compile_allergen_matcher
+from app.helpers import ALLERGEN_SAFE_NAMES, ALLERGEN_SYNONYMS, get_token_matcher
+
+
+def legacy_is_safe(name, allergens, safe_names):
+    """The substring scan the matcher replaced"""
+    name = name.lower()
+    if name in safe_names:
+        return True
+    return not any(allergen.lower() in name for allergen in allergens)
+
+
+class AllergenMatcherTests(SimpleTestCase):
+    def test_agrees_with_substring_scan_on_random_names(self):
+        rng = random.Random(0)
+        alphabet = 'abegilmnorst '
+        for _ in range(200):
+            patterns = {''.join(rng.choices(alphabet, k=rng.randint(1, 4))).strip() or 'a'
+                        for _ in range(rng.randint(1, 8))}
+            safe_names = {''.join(rng.choices(alphabet, k=6))}
+            matcher = compile_allergen_matcher(patterns, safe_names)
+            for _ in range(20):
+                name = ''.join(rng.choices(alphabet + string.ascii_uppercase[:3], k=rng.randint(0, 15)))
+                expected = legacy_is_safe(name, patterns, safe_names)
+                self.assertEqual(matcher.is_safe(name), expected, (patterns, name))
+                self.assertEqual(
+                    matcher.matches(name),
+                    set() if name.lower() in safe_names else {p for p in patterns if p.lower() in name.lower()},
+                )
+
+    def test_agrees_with_substring_scan_on_allergen_data(self):
+        synonyms = {synonym for group in ALLERGEN_SYNONYMS.values() for synonym in group}
+        matcher = compile_allergen_matcher(synonyms, ALLERGEN_SAFE_NAMES)
+        names = sorted(synonyms | set(ALLERGEN_SAFE_NAMES)) + ['Whole Milk', 'peanut butter cups', 'rice', 'Eggplant']
+        for name in names:
+            self.assertEqual(matcher.is_safe(name), legacy_is_safe(name, synonyms, ALLERGEN_SAFE_NAMES), name)
+
+    def test_safe_names_are_exempt(self):
+        matcher = compile_allergen_matcher(['egg', 'milk'], ['eggplant', 'milk chocolate'])
+        self.assertTrue(matcher.is_safe('Eggplant'))
+        self.assertTrue(matcher.is_safe('milk chocolate'))
+        self.assertFalse(matcher.is_safe('egg noodles'))
+        self.assertFalse(matcher.is_safe('dark milk chocolate'))
+
+    def test_token_matcher_reports_labels(self):
+        matcher = get_token_matcher({'dairy': ['milk', 'butter'], 'nuts': ['peanut', 'butter']})
+        self.assertEqual(matcher.matches('peanut butter'), {'dairy', 'nuts'})
+        self.assertEqual(matcher.matches('Buttermilk'), {'dairy', 'nuts'})
+        self.assertEqual(matcher.matches('salt'), set())
+
+    def test_equal_patterns_share_a_compiled_matcher(self):
+        self.assertIs(compile_allergen_matcher(['a', 'b']), compile_allergen_matcher(['B', 'a']))
@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from app.canonical import invalidate_ingredient_vocabulary
+from app.recipe_index import invalidate_recipe_index
+from core.models import Allergy, DietaryPreference, IngredientAllData, Recipe, UserProfile
+
+
+class PaginationHeaderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('cook', password='x'))
+        DietaryPreference.objects.bulk_create(DietaryPreference(name=f'diet {i:04d}') for i in range(1005))
+
+    def test_total_count_and_links(self):
+        response = self.client.get('/api/dietary-preferences/', {'limit': 10, 'offset': 20})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 10)
+        self.assertEqual(response['X-Total-Count'], '1005')
+        self.assertIn('rel="next"', response['Link'])
+        self.assertIn('rel="prev"', response['Link'])
+        self.assertIn('offset=30', response['Link'])
+
+    @override_settings(API_MAX_PAGE_SIZE=1000)
+    def test_page_size_and_hard_cap(self):
+        # The view's page size applies without a limit; larger limits are clamped
+        self.assertEqual(len(self.client.get('/api/dietary-preferences/').json()), 1000)
+        self.assertEqual(len(self.client.get('/api/dietary-preferences/', {'limit': 5000}).json()), 1000)
+        last_page = self.client.get('/api/dietary-preferences/', {'offset': 1000})
+        self.assertEqual(len(last_page.json()), 5)
+        self.assertNotIn('rel="next"', last_page['Link'])
+
+    @override_settings(API_WHOLE_LIST_PAGE_SIZE=10)
+    def test_whole_list_page_size_setting(self):
+        self.assertEqual(len(self.client.get('/api/dietary-preferences/').json()), 10)
+        self.assertEqual(len(self.client.get('/api/dietary-preferences/', {'limit': 50}).json()), 50)
+
+
+class RecipeSearchTests(TestCase):
+    def setUp(self):
+        invalidate_recipe_index()
+        invalidate_ingredient_vocabulary()
+        self.client = APIClient()
+        self.salt = IngredientAllData.objects.create(name='salt')
+        self.peanut = IngredientAllData.objects.create(name='peanut')
+        for i in range(25):
+            recipe = Recipe.objects.create(name=f'recipe {i:02d}', steps='x')
+            recipe.ingredients.add(self.salt)
+            if i % 5 == 0:
+                recipe.ingredients.add(self.peanut)
+
+    def tearDown(self):
+        invalidate_recipe_index()
+        invalidate_ingredient_vocabulary()
+
+    def search(self, params='', **data):
+        return self.client.post(f'/api/recipe-search/{params}', {'ingredients': ['Salt'], **data}, format='json')
+
+    def names(self, response):
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_offset_paging(self):
+        response = self.search('?limit=10&offset=20')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(self.names(response), [f'recipe {i:02d}' for i in range(20, 25)])
+        self.assertEqual((body['total_count'], body['has_more']), (25, False))
+
+    def test_invalid_windows_are_rejected(self):
+        for params in ('?limit=0', '?limit=-5', '?offset=-1'):
+            self.assertEqual(self.search(params).status_code, 400, params)
+
+    @override_settings(API_MAX_PAGE_SIZE=7)
+    def test_limit_is_clamped(self):
+        response = self.search('?limit=100000')
+        self.assertEqual(response.json()['limit'], 7)
+        self.assertEqual(len(self.names(response)), 7)
+
+    def test_cursor_paging_matches_offset_paging(self):
+        seen = []
+        params = '?pagination=cursor&limit=6'
+        while True:
+            body = self.search(params).json()
+            seen += [recipe['name'] for recipe in body['results']]
+            if not body['has_more']:
+                break
+            params = f'?limit=6&cursor={body["next_cursor"]}'
+        self.assertEqual(seen, self.names(self.search('?limit=100')))
+        self.assertEqual(self.search('?cursor=garbage').status_code, 400)
+
+    def test_exclusions_and_unknown_ingredients(self):
+        response = self.search('?limit=100', exclude_ingredients=['peanuts'])
+        self.assertEqual(response.json()['total_count'], 20)
+        self.assertEqual(self.search(ingredients=['unobtainium']).status_code, 400)
+
+    def test_allergic_user_does_not_see_unsafe_recipes(self):
+        user = User.objects.create_user('allergic', password='x')
+        profile = UserProfile.objects.create(user=user)
+        profile.allergies.add(Allergy.objects.create(name='peanuts'))
+        self.client.force_authenticate(user)
+        self.assertEqual(self.search('?limit=100').json()['total_count'], 20)
+
+
+class AIRecommendationTests(TestCase):
+    def setUp(self):
+        invalidate_recipe_index()
+        cache.clear()
+
+    def test_query_words_are_normalized_like_recipe_words(self):
+        tea = Recipe.objects.create(name='Spiced Tea', steps='x')
+        with mock.patch('app.ai_recommendations.find_recipes_by_ingredients', return_value=['spiced tea']) as find:
+            response = APIClient().post('/api/ai-recommendations/', {'ingredients': ['Cloves', 'Tea']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(find.call_args.args[0], ['clove', 'tea'])
+        self.assertEqual(response.json()['results'], [{'id': tea.id, 'name': 'Spiced Tea'}])
+
+    def test_no_recognized_ingredients(self):
+        response = APIClient().post('/api/ai-recommendations/', {'ingredients': ['  ', '!!!']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'No recognized ingredients.'})
+
+    def test_ingredients_are_required(self):
+        response = APIClient().post('/api/ai-recommendations/', {'ingredients': []}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from app import canonical
+from app.canonical import (
+    IngredientVocabulary,
+    canonical_ingredient,
+    canonical_ingredients,
+    canonical_title,
+    canonical_word,
+    get_ingredient_vocabulary,
+    invalidate_ingredient_vocabulary,
+)
+from core.models import IngredientAllData
+
+
+class CanonicalTests(SimpleTestCase):
+    def test_plurals(self):
+        cases = {
+            'Tomatoes': 'tomato',
+            'cherries': 'cherry',
+            'pies': 'pie',
+            'Green Onions': 'green onion',
+            'peaches': 'peach',
+            'asparagus': 'asparagus',
+            'molasses': 'molasses',
+            'eggs': 'egg',
+            'Bay Leaves': 'bay leaf',
+        }
+        for name, expected in cases.items():
+            self.assertEqual(canonical_ingredient(name), expected, name)
+
+    def test_punctuation_and_whitespace(self):
+        self.assertEqual(canonical_ingredient("  Baker's   Chocolate, "), 'baker chocolate')
+        self.assertEqual(canonical_ingredient('!!!'), '')
+
+    def test_phrase_aliases_only_apply_to_whole_names(self):
+        self.assertEqual(canonical_ingredient('Garlic Cloves'), 'garlic')
+        # Alone, "cloves" is the spice
+        self.assertEqual(canonical_ingredient('cloves'), 'clove')
+        self.assertEqual(canonical_word('cloves'), 'clove')
+        self.assertEqual(canonical_ingredient('ground cloves'), 'ground clove')
+
+    def test_canonical_ingredients_keeps_order_and_duplicates(self):
+        self.assertEqual(canonical_ingredients(['Eggs', 'salt', 'eggs']), ['egg', 'salt', 'egg'])
+
+    def test_canonical_title(self):
+        self.assertEqual(canonical_title('  Mom’s  Chili (Spicy) '), "mom's chili")
+
+    def test_vocabulary_resolves_exact_then_canonical(self):
+        vocabulary = IngredientVocabulary([(1, 'tomato'), (2, 'Tomatoes'), (3, 'egg')])
+        self.assertEqual(vocabulary.resolve('Tomatoes'), 2)
+        self.assertEqual(vocabulary.resolve(' tomatoes '), 1)
+        self.assertEqual(vocabulary.resolve_many(['Eggs', 'unobtainium']), {'Eggs': 3})
+        self.assertEqual(len(vocabulary), 3)
+
+
+@override_settings(INGREDIENT_VOCABULARY_REFRESH_SECONDS=0)
+class IngredientVocabularyTests(TransactionTestCase):
+    def setUp(self):
+        invalidate_ingredient_vocabulary()
+        self.addCleanup(invalidate_ingredient_vocabulary)
+        self.tomato = IngredientAllData.objects.create(name='tomato')
+        IngredientAllData.objects.create(name='egg')
+
+    def test_rename_in_another_process_is_picked_up(self):
+        stale = get_ingredient_vocabulary()
+        with transaction.atomic():
+            self.tomato.name = 'plum tomato'
+            self.tomato.save()
+            self.tomato.save()
+        # Count and max id are unchanged; only the version row tells the processes apart
+        canonical._vocabulary = stale
+        vocabulary = get_ingredient_vocabulary()
+        self.assertIsNot(vocabulary, stale)
+        self.assertEqual(vocabulary.resolve('plum tomatoes'), self.tomato.id)
+        self.assertEqual(vocabulary.signature[0], stale.signature[0] + 1)
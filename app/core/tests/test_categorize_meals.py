@@ -0,0 +1,89 @@
+import json
+from io import StringIO
+
+from django.test import TestCase
+
+from app.categorization_cache import categorization_key, load_cached, store_cached
+from core.management.commands.categorize_meals import PROMPT_VERSION, Command
+from core.models import CategorizationCacheEntry, IngredientAllData, Recipe
+
+ITEM = {'cuisineType': 'Italian', 'difficulty': 'Easy', 'cookingTime': 'Under 30 mins', 'tags': ['quick']}
+
+
+class FakeClient:
+    """Replies with a canned batch answer, then one ITEM per single-recipe prompt"""
+
+    def __init__(self, batch_reply):
+        self.batch_reply = batch_reply
+        self.prompts = []
+
+    def complete(self, messages, max_tokens, temperature):
+        prompt = messages[-1]['content']
+        self.prompts.append(prompt)
+        if 'Categorize each of the following' in prompt:
+            if isinstance(self.batch_reply, Exception):
+                raise self.batch_reply
+            return json.dumps(self.batch_reply)
+        return json.dumps(ITEM)
+
+
+class BatchCategorizationTests(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+        self.recipes = [Recipe.objects.create(name=f'Recipe {i}', steps='x') for i in range(3)]
+
+    def test_items_missing_from_the_batch_reply_are_retried_alone(self):
+        partial = {**ITEM, 'cuisineType': 'Mexican'}
+        self.command.client = FakeClient([{'id': 1, **partial}, {'id': 3, 'tags': []}])
+        results = self.command.categorize_batch_safely(self.recipes)
+        self.assertEqual([result['cuisine_type'] for result, _ in results], ['Mexican', 'Italian', 'Italian'])
+        self.assertEqual(len(self.command.client.prompts), 3)
+        self.assertEqual(self.command.batch_stats, {'batches': 1, 'batched': 3, 'retried': 2})
+
+    def test_failed_batch_is_retried_one_by_one(self):
+        self.command.client = FakeClient(ValueError('rate limited'))
+        results = self.command.categorize_batch_safely(self.recipes)
+        self.assertEqual([error for _, error in results], [None, None, None])
+        self.assertEqual(len(self.command.client.prompts), 4)
+
+    def test_make_batches_respects_size_and_token_budget(self):
+        self.command.client = FakeClient([])
+        self.assertEqual([len(batch) for batch in self.command.make_batches(self.recipes, 2, 10**6)], [2, 1])
+        self.assertEqual([len(batch) for batch in self.command.make_batches(self.recipes, 10, 1)], [1, 1, 1])
+        self.command.client = None
+        self.assertEqual([len(batch) for batch in self.command.make_batches(self.recipes, 10, 10**6)], [1, 1, 1])
+
+
+class CategorizationCacheTests(TestCase):
+    def setUp(self):
+        self.salt = IngredientAllData.objects.create(name='salt')
+        self.pasta = IngredientAllData.objects.create(name='pasta')
+        self.recipe = Recipe.objects.create(name='Pasta', steps='boil', description='1 lb pasta')
+        self.recipe.ingredients.add(self.pasta, self.salt)
+
+    def key(self, recipe=None, model='gpt-4o-mini', prompt_version=PROMPT_VERSION):
+        return categorization_key(recipe or Recipe.objects.get(pk=self.recipe.pk), model, prompt_version)
+
+    def test_key_depends_on_prompt_inputs_only(self):
+        key = self.key()
+        copy = Recipe.objects.create(name='Pasta', steps='boil', description='1 lb pasta')
+        copy.ingredients.add(self.salt, self.pasta)
+        self.assertEqual(self.key(copy), key)
+        # Steps past the prompt's truncation limit are not part of the prompt
+        Recipe.objects.filter(pk=copy.pk).update(steps='boil' + ' ' * 600 + 'and serve')
+        Recipe.objects.filter(pk=self.recipe.pk).update(steps='boil' + ' ' * 600)
+        self.assertEqual(self.key(Recipe.objects.get(pk=copy.pk)), self.key())
+
+    def test_key_changes_with_recipe_model_and_prompt_version(self):
+        key = self.key()
+        self.assertNotEqual(self.key(model='gpt-4o'), key)
+        self.assertNotEqual(self.key(prompt_version=PROMPT_VERSION + 1), key)
+        self.recipe.ingredients.remove(self.salt)
+        self.assertNotEqual(self.key(), key)
+
+    def test_store_and_load(self):
+        store_cached([('a', ITEM), ('b', {'tags': []})], 'gpt-4o-mini', PROMPT_VERSION)
+        # Existing keys are kept as they are
+        store_cached([('a', {'tags': ['changed']})], 'gpt-4o-mini', PROMPT_VERSION)
+        self.assertEqual(load_cached(['a', 'c', 'a']), {'a': ITEM})
+        self.assertEqual(CategorizationCacheEntry.objects.count(), 2)
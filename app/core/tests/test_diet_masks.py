@@ -0,0 +1,101 @@
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from app.diet_masks import (
+    DietMasks,
+    changed_ingredients,
+    load_diet_masks,
+    recompute_recipe_diets,
+    save_diet_layout,
+    stored_masks_current,
+)
+from core.models import DietaryPreference, IngredientAllData, Recipe
+
+
+class DietMasksTests(SimpleTestCase):
+    def test_recipe_mask_equals_subset_test(self):
+        rng = random.Random(0)
+        diet_ids = [3, 8, 11, 20]
+        tags = {ingredient_id: set(rng.sample(diet_ids, rng.randint(0, 4))) for ingredient_id in range(40)}
+        masks = DietMasks(diet_ids, [(i, d) for i, diets in tags.items() for d in diets])
+        for _ in range(200):
+            ingredient_ids = rng.sample(range(45), rng.randint(0, 5))
+            expected = [d for d in diet_ids if all(d in tags.get(i, ()) for i in ingredient_ids)]
+            self.assertEqual(masks.suitable_diets(ingredient_ids), expected)
+
+    def test_unknown_diets_are_ignored(self):
+        masks = DietMasks([1, 2], [(10, 1), (10, 99)])
+        self.assertEqual(masks.ingredient_masks, {10: 0b01})
+
+    def test_layout_identifies_the_bit_assignment(self):
+        self.assertEqual(DietMasks([2, 1], []).layout, DietMasks([1, 2], []).layout)
+        self.assertNotEqual(DietMasks([1, 2], []).layout, DietMasks([1, 3], []).layout)
+        self.assertLess(DietMasks(range(50), []).layout, 2 ** 63)
+
+
+class RecomputeRecipeDietsTests(TestCase):
+    def setUp(self):
+        self.vegan, self.vegetarian, self.keto = (
+            DietaryPreference.objects.create(name=name) for name in ('Vegan', 'Vegetarian', 'Keto')
+        )
+        self.tofu = IngredientAllData.objects.create(name='tofu')
+        self.egg = IngredientAllData.objects.create(name='egg')
+        self.tofu.dietary_preferences.add(self.vegan, self.vegetarian, self.keto)
+        self.egg.dietary_preferences.add(self.vegetarian, self.keto)
+        self.scramble = Recipe.objects.create(name='scramble', steps='x')
+        self.scramble.ingredients.add(self.tofu, self.egg)
+        self.stir_fry = Recipe.objects.create(name='stir fry', steps='x')
+        self.stir_fry.ingredients.add(self.tofu)
+        self.recompute()
+
+    def recompute(self, *args):
+        out = StringIO()
+        call_command('recompute_recipe_diets', *args, stdout=out)
+        return out.getvalue()
+
+    def diets(self, recipe):
+        return sorted(recipe.suitable_for_diets.values_list('name', flat=True))
+
+    def test_recompute_writes_the_and_of_ingredient_diets(self):
+        self.assertEqual(self.diets(self.scramble), ['Keto', 'Vegetarian'])
+        self.assertEqual(self.diets(self.stir_fry), ['Keto', 'Vegan', 'Vegetarian'])
+        masks = load_diet_masks()
+        self.assertEqual(changed_ingredients(masks), {})
+        self.assertEqual(recompute_recipe_diets(masks=masks), (2, 0))
+
+    def test_only_recipes_of_retagged_ingredients_are_recomputed(self):
+        self.egg.dietary_preferences.remove(self.keto)
+        masks = load_diet_masks()
+        self.assertEqual(changed_ingredients(masks), {self.egg.id: masks.ingredient_masks[self.egg.id]})
+        output = self.recompute()
+        self.assertIn('1 recipes use them', output)
+        self.assertEqual(self.diets(self.scramble), ['Vegetarian'])
+        self.assertEqual(changed_ingredients(load_diet_masks()), {})
+
+    def test_dry_run_writes_nothing(self):
+        self.tofu.dietary_preferences.remove(self.vegan)
+        self.assertIn('would change the diets of 1', self.recompute('--dry-run'))
+        self.assertEqual(self.diets(self.stir_fry), ['Keto', 'Vegan', 'Vegetarian'])
+        self.assertNotEqual(changed_ingredients(load_diet_masks()), {})
+
+    def test_deleting_a_diet_recomputes_every_recipe(self):
+        # Deleting Vegan shifts the other diets' bits; stored masks may still compare equal
+        self.vegan.delete()
+        self.tofu.dietary_preferences.remove(self.keto)
+        masks = load_diet_masks()
+        self.assertFalse(stored_masks_current(masks))
+        self.assertEqual(len(changed_ingredients(masks)), IngredientAllData.objects.count())
+        self.assertIn('recomputing every recipe', self.recompute())
+        self.assertEqual(self.diets(self.scramble), ['Vegetarian'])
+        self.assertEqual(self.diets(self.stir_fry), ['Vegetarian'])
+        self.assertTrue(stored_masks_current(load_diet_masks()))
+
+    def test_saved_layout_is_replaced(self):
+        masks = load_diet_masks()
+        save_diet_layout(DietMasks([1], []))
+        self.assertFalse(stored_masks_current(masks))
+        save_diet_layout(masks)
+        self.assertTrue(stored_masks_current(masks))
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from resources.inference import InferenceServer, SocketPredictor
+
+
+class FakePredictor:
+    """Stands in for LocalPredictor: two features, label 'soup'"""
+
+    def predict(self, vectors, k=3):
+        if any(len(vector) != 2 for vector in vectors):
+            raise ValueError('Expected feature vectors of length 2')
+        return [['soup'][:k] for _ in vectors]
+
+    def metrics(self):
+        raise RuntimeError('batcher stopped')
+
+
+class SocketServerMixin:
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        server = InferenceServer(os.path.join(tmpdir, 'inference.sock'), FakePredictor())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.predictor = SocketPredictor(server.server_address, timeout=5)
+
+
+class SocketPredictorTests(SocketServerMixin, SimpleTestCase):
+    def test_predict(self):
+        self.assertEqual(self.predictor.predict([[0.1, 0.2]], k=1), [['soup']])
+
+    def test_bad_input_is_raised_as_value_error(self):
+        with self.assertRaisesMessage(ValueError, 'length 2'):
+            self.predictor.predict([[0.1, 0.2, 0.3]])
+
+    def test_server_failure_is_raised_as_runtime_error(self):
+        with self.assertRaisesMessage(RuntimeError, 'batcher stopped'):
+            self.predictor.metrics()
+
+
+class RecipePredictionViewTests(SocketServerMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('cook', password='x'))
+        patcher = mock.patch('app.views.get_predictor', return_value=self.predictor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wrong_length_features_are_a_bad_request(self):
+        response = self.client.post('/api/recipe-predictions/', {'features': [0.1, 0.2, 0.3]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_features(self):
+        response = self.client.post('/api/recipe-predictions/', {'features': [0.1, 0.2], 'k': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['predictions'], ['soup'])
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.management.commands.check_model_backends import top_k_agreement
+from resources.actual_ai import DenseModel, load_keras_model
+
+# Largest difference in any output probability allowed for each backend
+KERAS_TOLERANCE = 1e-5
+FLOAT16_TOLERANCE = 5e-3
+# Same bar as check_model_backends --min-agreement
+MIN_TOP_K_AGREEMENT = 0.99
+
+
+class DenseModelTests(SimpleTestCase):
+    """The NumPy backend read from the shipped recipe_model.keras"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = DenseModel.from_keras_archive()
+        cls.inputs = np.random.default_rng(0).normal(size=(512, cls.model.input_shape[1])).astype(np.float32)
+        cls.scores = cls.model(cls.inputs)
+
+    def saved(self, dtype):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model.npz')
+            self.model.save(path, dtype=np.dtype(dtype))
+            return DenseModel.load(path)
+
+    def test_outputs_are_probabilities(self):
+        self.assertEqual(self.scores.shape[0], len(self.inputs))
+        np.testing.assert_allclose(self.scores.sum(axis=1), 1, rtol=1e-5)
+
+    @unittest.skipUnless(importlib.util.find_spec('tensorflow'), 'TensorFlow is not installed')
+    def test_matches_keras(self):
+        keras_scores = np.asarray(load_keras_model()(self.inputs, training=False))
+        np.testing.assert_allclose(self.scores, keras_scores, rtol=0, atol=KERAS_TOLERANCE)
+
+    def test_float32_export_round_trips_exactly(self):
+        np.testing.assert_array_equal(self.saved('float32')(self.inputs), self.scores)
+
+    def test_float16_export_stays_within_tolerance(self):
+        scores = self.saved('float16')(self.inputs)
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_allclose(scores, self.scores, rtol=0, atol=FLOAT16_TOLERANCE)
+        self.assertGreaterEqual(top_k_agreement(self.scores, scores, 3), MIN_TOP_K_AGREEMENT)
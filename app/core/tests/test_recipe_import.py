@@ -0,0 +1,217 @@
+import csv
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from app.canonical import invalidate_ingredient_vocabulary
+from app.recipe_import import RecipeBulkWriter, last_rows_by_name, open_checkpoint, parse_row, parse_rows
+from core.models import DietaryPreference, IngredientAllData, Recipe
+
+
+def csv_row(title, ingredients, steps=('mix',)):
+    return {
+        'title': title,
+        'ingredients': str([f'1 cup {name}' for name in ingredients]),
+        'directions': str(list(steps)),
+        'NER': str(list(ingredients)),
+    }
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, ['title', 'ingredients', 'directions', 'NER'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def csv_file(self, rows, name='recipes.csv'):
+        path = os.path.join(self.tmpdir, name)
+        write_csv(path, rows)
+        return path
+
+
+class ParseTests(TempDirMixin, SimpleTestCase):
+    def test_parse_row(self):
+        row = parse_row(7, csv_row(' Tomato Soup ', ['Tomatoes', ' ', 'salt'], steps=('chop', 'boil')))
+        self.assertEqual(row.row_num, 7)
+        self.assertEqual(row.name, 'Tomato Soup')
+        self.assertEqual(row.steps, 'chop\nboil')
+        self.assertEqual(row.ingredient_names, ('Tomatoes', 'salt'))
+
+    def test_parse_row_rejects_bad_rows(self):
+        with self.assertRaises(ValueError):
+            parse_row(1, csv_row('  ', ['salt']))
+        with self.assertRaises(ValueError):
+            parse_row(1, {**csv_row('Soup', ['salt']), 'directions': '[broken'})
+
+    def test_worker_pool_yields_the_same_rows_in_order(self):
+        rows = [csv_row(f'Recipe {i}', ['salt', f'spice {i % 7}']) for i in range(120)]
+        rows[5]['title'] = ''
+        rows[40]['NER'] = '[broken'
+        path = self.csv_file(rows)
+        serial = list(parse_rows(path, workers=1, chunk_size=16))
+        self.assertEqual(list(parse_rows(path, workers=2, chunk_size=16)), serial)
+        self.assertEqual([row_num for row_num, _, _ in serial], list(range(1, 121)))
+        self.assertEqual([row_num for row_num, _, error in serial if error], [6, 41])
+
+    def test_parser_computes_canonical_names(self):
+        # Worker processes do the normalization so the writer only does dict lookups
+        row = parse_row(1, csv_row('Soup', ['Tomatoes', 'Eggs', 'salt']))
+        self.assertEqual(row.canonical_names, ('tomato', 'egg', 'salt'))
+
+    def test_source_hash_covers_every_source_field(self):
+        row = csv_row('Soup', ['salt'])
+        row_hash = parse_row(1, row).source_hash
+        self.assertEqual(parse_row(2, dict(row)).source_hash, row_hash)
+        for field, value in (('title', 'Soup!'), ('ingredients', '[]'), ('directions', "['stir']"), ('NER', "['salt ']")):
+            self.assertNotEqual(parse_row(1, {**row, field: value}).source_hash, row_hash, field)
+
+    def test_parse_rows_resumes_after_start(self):
+        path = self.csv_file([csv_row(f'Recipe {i}', ['salt']) for i in range(60)])
+        rows = list(parse_rows(path))
+        self.assertEqual(list(parse_rows(path, limit=50, start=30)), rows[30:50])
+        self.assertEqual(list(parse_rows(path, limit=50, start=30, workers=2, chunk_size=8)), rows[30:50])
+
+    def test_last_rows_by_name(self):
+        path = self.csv_file([csv_row('a', ['salt']), csv_row('b', ['salt']), csv_row('a', ['salt']), csv_row('', [])])
+        self.assertEqual(last_rows_by_name(path), {'a': 3, 'b': 2})
+        self.assertEqual(last_rows_by_name(path, limit=2), {'a': 1, 'b': 2})
+
+
+class RecipeWriterTests(TempDirMixin, TestCase):
+    """The bulk writers against each other and against re-imports of the same file"""
+
+    def setUp(self):
+        super().setUp()
+        invalidate_ingredient_vocabulary()
+        vegan = DietaryPreference.objects.create(name='Vegan')
+        vegetarian = DietaryPreference.objects.create(name='Vegetarian')
+        for name in ('salt', 'flour', 'tomato', 'egg', 'milk'):
+            ingredient = IngredientAllData.objects.create(name=name)
+            ingredient.dietary_preferences.add(vegetarian)
+            if name not in ('egg', 'milk'):
+                ingredient.dietary_preferences.add(vegan)
+        self.rows = [
+            csv_row('Bread', ['flour', 'salt']),
+            csv_row('Omelette', ['Eggs', 'milk', 'salt']),
+            csv_row('Tomato Salad', ['Tomatoes', 'salt']),
+            csv_row('Mystery', ['unobtainium', 'salt']),
+            csv_row('Bread', ['flour', 'salt', 'egg'], steps=('knead', 'bake')),
+            csv_row('', ['salt']),
+            {**csv_row('Broken', ['salt']), 'directions': '[broken'},
+        ]
+        self.path = self.csv_file(self.rows)
+
+    def snapshot(self):
+        return sorted(
+            (
+                recipe.name, recipe.description, recipe.steps,
+                sorted(recipe.ingredients.values_list('name', flat=True)),
+                sorted(recipe.suitable_for_diets.values_list('name', flat=True)),
+                sorted(recipe.allergen_tokens.values_list('token', flat=True)),
+            )
+            for recipe in Recipe.objects.all()
+        )
+
+    def run_import(self, *args, **options):
+        out = StringIO()
+        call_command('import_recipes', *args, file=self.path, stdout=out, **options)
+        return out.getvalue()
+
+    def bulk_snapshot(self):
+        self.run_import('--clean-existing', '--bulk', batch_size=2)
+        return self.snapshot()
+
+    def test_bulk_import(self):
+        output = self.run_import('--bulk', batch_size=2)
+        self.assertIn('Created: 3 recipes', output)
+        recipes = self.snapshot()
+        self.assertEqual([recipe[0] for recipe in recipes], ['Bread', 'Omelette', 'Tomato Salad'])
+        # The later "Bread" row wins; egg keeps it from being vegan
+        self.assertEqual(recipes[0][3:5], (['egg', 'flour', 'salt'], ['Vegetarian']))
+        self.assertEqual(recipes[1][3], ['egg', 'milk', 'salt'])
+        self.assertEqual(recipes[2][3:5], (['salt', 'tomato'], ['Vegan', 'Vegetarian']))
+
+    def test_parser_workers_write_the_same_recipes(self):
+        expected = self.bulk_snapshot()
+        self.run_import('--clean-existing', workers=2, batch_size=2)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_copy_loader_writes_the_same_recipes(self):
+        expected = self.bulk_snapshot()
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.run_import('--clean-existing', loader='copy', workers=workers, batch_size=2)
+                self.assertEqual(self.snapshot(), expected)
+
+    def test_reimport_leaves_unchanged_rows_alone(self):
+        write_csv(self.path, self.rows[1:])
+        self.run_import('--bulk')
+        before = self.snapshot()
+        ids = set(Recipe.objects.values_list('id', flat=True))
+        for loader in ('orm', 'copy'):
+            with self.subTest(loader=loader):
+                output = self.run_import('--bulk', loader=loader, batch_size=3)
+                self.assertIn('Created: 0 recipes', output)
+                self.assertIn('Updated: 0 recipes', output)
+                self.assertIn('Unchanged: 3 rows', output)
+                self.assertEqual(self.snapshot(), before)
+                self.assertEqual(set(Recipe.objects.values_list('id', flat=True)), ids)
+
+    def test_changed_row_replaces_the_recipe(self):
+        rows = self.rows[1:]
+        write_csv(self.path, rows)
+        self.run_import('--bulk')
+        rows[1] = csv_row('Tomato Salad', ['Tomatoes', 'milk'], steps=('slice', 'pour'))
+        write_csv(self.path, rows)
+        output = self.run_import('--bulk')
+        self.assertIn('Updated: 1 recipes', output)
+        self.assertIn('Unchanged: 2 rows', output)
+        salad = Recipe.objects.get(name='Tomato Salad')
+        self.assertEqual(salad.steps, 'slice\npour')
+        self.assertEqual(sorted(salad.ingredients.values_list('name', flat=True)), ['milk', 'tomato'])
+        self.assertEqual(list(salad.suitable_for_diets.values_list('name', flat=True)), ['Vegetarian'])
+
+    def test_writer_stats_and_checkpoint(self):
+        rows = [parsed for _, parsed, error in parse_rows(self.path) if error is None]
+        checkpoint = open_checkpoint(self.path)
+        writer = RecipeBulkWriter(batch_size=2, checkpoint=checkpoint)
+        writer.write(rows[:3], last_row=3)
+        writer.write(rows[3:], last_row=7)
+        stats = writer.finish()
+        self.assertEqual((stats.rows, stats.created, stats.updated), (5, 3, 1))
+        self.assertEqual(stats.missing_ingredients, {'unobtainium': 1})
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.last_row, checkpoint.completed), (7, True))
+        # A finished run over an unmodified file starts from the top again
+        self.assertEqual(open_checkpoint(self.path).last_row, 0)
+
+    def test_repeated_titles_write_only_the_last_row(self):
+        for loader in ('orm', 'copy'):
+            with self.subTest(loader=loader):
+                self.run_import('--clean-existing', '--bulk', loader=loader, batch_size=2)
+                before = self.snapshot()
+                self.assertEqual(before[0][2], 'knead\nbake')
+                output = self.run_import('--bulk', loader=loader, batch_size=2)
+                self.assertIn('Updated: 0 recipes', output)
+                self.assertIn('Unchanged: 3 rows', output)
+                self.assertIn('Duplicates: 1 rows', output)
+                self.assertEqual(self.snapshot(), before)
+
+    def test_writer_skips_rows_superseded_by_a_later_row(self):
+        rows = [parsed for _, parsed, error in parse_rows(self.path) if error is None]
+        writer = RecipeBulkWriter(batch_size=2, last_rows=last_rows_by_name(self.path))
+        writer.write(rows[:3])
+        writer.write(rows[3:])
+        stats = writer.finish()
+        self.assertEqual((stats.rows, stats.created, stats.updated, stats.duplicates), (5, 3, 0, 1))
@@ -0,0 +1,156 @@
+import random
+from unittest import mock
+
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+from app.recipe_index import (
+    CATALOG_VERSION_NAME,
+    build_recipe_index,
+    get_recipe_index,
+    index_from_rows,
+    invalidate_recipe_index,
+)
+from core.models import CatalogVersion, DietaryPreference, IngredientAllData, Recipe
+
+
+def random_catalog(seed, n_recipes=300, n_ingredients=25, n_diets=3):
+    rng = random.Random(seed)
+    keys = sorted((f'recipe {rng.randint(0, 99)}', recipe_id) for recipe_id in range(1, n_recipes + 1))
+    ingredients = {recipe_id: set(rng.sample(range(n_ingredients), rng.randint(1, 6))) for _, recipe_id in keys}
+    diets = {recipe_id: set(rng.sample(range(n_diets), rng.randint(0, n_diets))) for _, recipe_id in keys}
+    return keys, ingredients, diets
+
+
+class RecipeIndexMatchTests(SimpleTestCase):
+    """Bitmap matching and paging against a brute-force scan of the same rows"""
+
+    def setUp(self):
+        self.keys, self.ingredients, self.diets = random_catalog(seed=1)
+        self.index = index_from_rows(
+            self.keys,
+            ingredient_rows=[(i, r) for r, ids in self.ingredients.items() for i in ids],
+            diet_rows=[(d, r) for r, ids in self.diets.items() for d in ids],
+        )
+
+    def brute(self, include=(), exclude=(), diets=()):
+        return [
+            recipe_id for _, recipe_id in self.keys
+            if set(include) <= self.ingredients[recipe_id]
+            and not set(exclude) & self.ingredients[recipe_id]
+            and set(diets) <= self.diets[recipe_id]
+        ]
+
+    def test_match_equals_brute_force(self):
+        rng = random.Random(2)
+        for _ in range(50):
+            include = rng.sample(range(25), rng.randint(1, 2))
+            exclude = rng.sample(range(25), rng.randint(0, 2))
+            diets = rng.sample(range(3), rng.randint(0, 1))
+            bitmap = self.index.match(include=include, exclude=exclude, diets=diets)
+            expected = self.brute(include, exclude, diets)
+            self.assertEqual(self.index.count(bitmap), len(expected))
+            self.assertEqual(self.index.page(bitmap, 0, len(expected) + 1), expected)
+
+    def test_offset_pages_cover_all_matches_in_order(self):
+        bitmap = self.index.match(include=[3])
+        expected = self.brute([3])
+        pages = [self.index.page(bitmap, offset, 7) for offset in range(0, len(expected), 7)]
+        self.assertEqual([recipe_id for page in pages for recipe_id in page], expected)
+        self.assertEqual(self.index.page(bitmap, len(expected), 7), [])
+
+    def test_cursor_pages_cover_all_matches_in_order(self):
+        bitmap = self.index.match(include=[5])
+        seen = []
+        start = 0
+        while True:
+            positions = self.index.positions(bitmap, 0, 6, start=start)
+            if not positions:
+                break
+            seen += [self.index.recipe_ids[pos] for pos in positions]
+            start = self.index.position_after(self.index.keys[positions[-1]])
+        self.assertEqual(seen, self.brute([5]))
+
+    def test_position_after_a_deleted_key_resumes_in_order(self):
+        name, recipe_id = self.keys[10]
+        self.assertEqual(self.index.position_after((name, recipe_id)), 11)
+        # A key no longer in the index bisects to the next larger key
+        self.assertEqual(self.index.position_after((name, 10**9)), 11 + sum(
+            1 for key in self.keys[11:] if key[0] == name
+        ))
+
+    def test_ranked_matches_order_by_coverage(self):
+        pantry = [0, 1, 2]
+        ranked, total = self.index.rank(pantry, limit=10)
+        self.assertEqual(total, sum(1 for ids in self.ingredients.values() if ids & set(pantry)))
+        scores = [row.score for row in ranked]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        for row in ranked:
+            recipe_id = self.index.recipe_ids[row.position]
+            self.assertEqual(row.used, len(self.ingredients[recipe_id] & set(pantry)))
+            self.assertEqual(row.missing, len(self.ingredients[recipe_id] - set(pantry)))
+
+
+class RecipeIndexCatalogTests(TransactionTestCase):
+    """The index built from the database and its cross-process signature (with real commits)"""
+
+    def setUp(self):
+        invalidate_recipe_index()
+        self.vegan = DietaryPreference.objects.create(name='Vegan')
+        self.salt = IngredientAllData.objects.create(name='salt')
+        self.recipes = [Recipe.objects.create(name=name, steps='x') for name in ('b soup', 'a salad', 'c stew')]
+        for recipe in self.recipes:
+            recipe.ingredients.add(self.salt)
+        self.recipes[0].suitable_for_diets.add(self.vegan)
+
+    def tearDown(self):
+        invalidate_recipe_index()
+
+    def test_build_orders_by_name_and_indexes_relations(self):
+        index = build_recipe_index()
+        self.assertEqual([name for name, _ in index.keys], ['a salad', 'b soup', 'c stew'])
+        self.assertEqual(index.page(index.match(include=[self.salt.id])), [
+            self.recipes[1].id, self.recipes[0].id, self.recipes[2].id,
+        ])
+        self.assertEqual(index.page(index.match(diets=[self.vegan.id])), [self.recipes[0].id])
+
+    def test_signature_changes_on_renames_and_unsignalled_writes(self):
+        signature = build_recipe_index().signature
+        # Same counts and max ids; caught by the catalog version the save bumps on commit
+        self.recipes[2].name = 'aa stew'
+        self.recipes[2].save()
+        renamed = build_recipe_index().signature
+        self.assertNotEqual(renamed, signature)
+        # Queryset delete on a through table sends no m2m_changed
+        Recipe.suitable_for_diets.through.objects.filter(recipe_id=self.recipes[0].id).delete()
+        self.assertNotEqual(build_recipe_index().signature, renamed)
+
+    def test_get_recipe_index_rebuilds_after_invalidation(self):
+        index = get_recipe_index()
+        self.assertIs(get_recipe_index(), index)
+        Recipe.objects.create(name='d pie', steps='x')
+        rebuilt = get_recipe_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(len(rebuilt), 4)
+
+    def catalog_version(self):
+        return CatalogVersion.objects.filter(name=CATALOG_VERSION_NAME).values_list('version', flat=True).first()
+
+    def test_catalog_version_is_bumped_once_per_transaction_on_commit(self):
+        before = self.catalog_version()
+        with transaction.atomic():
+            recipe = self.recipes[0]
+            recipe.ingredients.set([])
+            recipe.suitable_for_diets.set([])
+            recipe.save()
+            Recipe.objects.exclude(pk=recipe.pk).delete()
+            # Nothing is written to the shared row before the transaction commits
+            self.assertEqual(self.catalog_version(), before)
+        self.assertEqual(self.catalog_version(), before + 1)
+
+    def test_m2m_changes_invalidate_once_the_rows_are_written(self):
+        with mock.patch('app.signals.invalidate_recipe_index') as invalidate:
+            self.recipes[1].ingredients.remove(self.salt)
+            self.recipes[1].suitable_for_diets.add(self.vegan)
+            self.recipes[1].suitable_for_diets.clear()
+        self.assertEqual(invalidate.call_count, 3)
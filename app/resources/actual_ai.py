@@ -1,24 +1,204 @@
-from tensorflow.keras.models import load_model
-import joblib
-import pandas as pd
-from nltk.stem import WordNetLemmatizer
-import re
+"""
+Ingredient-based recipe recommendations backed by the trained model artifacts.
+
+Nothing heavy happens at import time: TensorFlow, the Keras model, the label
+encoder, the recipe embeddings and the derived ingredient matrix are loaded by
+`registry` the first time something asks for them. Web workers can call
+`registry.warmup(background=True)` at startup and check `registry.ready`;
+management commands and tests that never touch the model never pay for it.
+
+Recipe data is read from the columnar store written by `manage.py
+export_recipe_store` when it exists: plain .npy files mapped read-only, so
+every worker shares the same page-cache copy and startup does no parsing.
+Without it, the embeddings pickle is loaded and normalized as before.
+"""
+import json
+import logging
 import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from app.canonical import CANONICAL_VERSION, canonical_word
+
+logger = logging.getLogger(__name__)
 
-# Load model, label encoder, and precomputed recipe embeddings
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RESOURCES_DIR = os.path.join(BASE_DIR, 'resources')
+RECIPE_STORE_DIR = os.environ.get('RECIPE_STORE_DIR', os.path.join(RESOURCES_DIR, 'recipe_store'))
+KERAS_MODEL_PATH = os.path.join(RESOURCES_DIR, "recipe_model.keras")
+NUMPY_MODEL_PATH = os.path.join(RESOURCES_DIR, "recipe_model.npz")
+# 'keras', 'numpy', or 'auto' (NumPy when an exported recipe_model.npz exists)
+MODEL_BACKEND = os.environ.get('RECIPE_MODEL_BACKEND', 'auto')
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of lazily loaded artifacts.
+
+    Each artifact has a loader that runs at most once; concurrent callers wait
+    on a per-artifact lock instead of loading twice. Load times (seconds) are
+    kept in `timings`.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warm = set()
+        self._values = {}
+        self._locks = {}
+        self._errors = {}
+        self.timings = {}
+        self._warmup_thread = None
+
+    def register(self, name, loader, warm=True):
+        """
+        Register `loader` for `name`. Artifacts with warm=False are only loaded
+        on demand and are left out of warmup() and `ready`.
+        """
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        if warm:
+            self._warm.add(name)
+        return loader
+
+    def artifact(self, name, warm=True):
+        """Decorator registering a loader under `name`"""
+        return lambda loader: self.register(name, loader, warm)
+
+    def get(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._values:
+                start = time.perf_counter()
+                try:
+                    value = self._loaders[name]()
+                except Exception as e:
+                    self._errors[name] = e
+                    raise
+                self.timings[name] = time.perf_counter() - start
+                self._errors.pop(name, None)
+                self._values[name] = value
+                logger.info('Loaded %s in %.2fs', name, self.timings[name])
+        return self._values[name]
+
+    def is_loaded(self, name):
+        return name in self._values
+
+    @property
+    def ready(self):
+        """True once every warm artifact is loaded"""
+        return all(name in self._values for name in self._warm)
+
+    @property
+    def errors(self):
+        return dict(self._errors)
+
+    def warmup(self, names=None, background=False):
+        """
+        Load the given artifacts (all warm ones by default). With background=True
+        the loading runs in a daemon thread and the thread is returned.
+        """
+        names = list(names or (name for name in self._loaders if name in self._warm))
+        if background:
+            if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                self._warmup_thread = threading.Thread(
+                    target=self._warmup, args=(names,), name='model-warmup', daemon=True
+                )
+                self._warmup_thread.start()
+            return self._warmup_thread
+        self._warmup(names)
+        return None
+
+    def _warmup(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception('Failed to load %s', name)
+
+    def status(self):
+        """Loaded flag and load time per artifact"""
+        return {
+            name: {'loaded': name in self._values, 'seconds': self.timings.get(name)}
+            for name in self._loaders
+        }
+
+
+registry = ModelRegistry()
+
+
+def load_keras_model():
+    from tensorflow.keras.models import load_model
+    return load_model(KERAS_MODEL_PATH)
+
+
+def model_backend():
+    """Backend the 'model' artifact uses, resolving 'auto'"""
+    if MODEL_BACKEND == 'auto':
+        return 'numpy' if os.path.exists(NUMPY_MODEL_PATH) else 'keras'
+    return MODEL_BACKEND
+
+
+@registry.artifact('model')
+def _load_model():
+    if model_backend() == 'numpy':
+        return DenseModel.load(NUMPY_MODEL_PATH)
+    return load_keras_model()
+
 
-model = load_model(os.path.join(RESOURCES_DIR, "recipe_model.keras"))
-label_encoder = joblib.load(os.path.join(RESOURCES_DIR, "label_encoder.pkl"))
-recipes_df = pd.read_pickle(os.path.join(RESOURCES_DIR, "recipe_embeddings.pkl"))
+@registry.artifact('label_encoder')
+def _load_label_encoder():
+    import joblib
+    return joblib.load(os.path.join(RESOURCES_DIR, "label_encoder.pkl"))
 
-# Ingredient normalization function
-lemmatizer = WordNetLemmatizer()
+
+# Only needed when there is no exported recipe store
+@registry.artifact('recipes_df', warm=False)
+def _load_recipes_df():
+    import pandas as pd
+    return precompute_normalized_ingredients(
+        pd.read_pickle(os.path.join(RESOURCES_DIR, "recipe_embeddings.pkl"))
+    )
+
+
+@registry.artifact('recipe_store')
+def _load_recipe_store():
+    if RecipeStore.exists(RECIPE_STORE_DIR):
+        if RecipeStore.is_current(RECIPE_STORE_DIR):
+            return RecipeStore.load(RECIPE_STORE_DIR)
+        logger.warning('Recipe store in %s uses old normalization rules; re-run export_recipe_store', RECIPE_STORE_DIR)
+    return RecipeStore.from_dataframe(registry.get('recipes_df'))
+
+
+@registry.artifact('ingredient_matrix')
+def _load_ingredient_matrix():
+    return registry.get('recipe_store').ingredient_matrix()
+
+
+# Built offline by `manage.py build_similarity_index`; mapping it is near-instant
+@registry.artifact('similarity_index', warm=False)
+def _load_similarity_index():
+    if not IVFIndex.exists(RECIPE_STORE_DIR):
+        raise FileNotFoundError(f'No similarity index in {RECIPE_STORE_DIR}; run build_similarity_index')
+    return IVFIndex.load(RECIPE_STORE_DIR)
+
+
+def __getattr__(name):
+    # Keep `actual_ai.model`, `actual_ai.recipes_df` etc. working, loaded on first access
+    if name in registry._loaders:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Ingredient normalization function (shared with search and import); queries and
+# recipe words go through the same per-word rules so they always meet
 def normalize_ingredient(word):
-    word = word.lower()
-    word = re.sub(r'[^\w\s]', '', word)  # Remove punctuation
-    return lemmatizer.lemmatize(word)
+    return canonical_word(word)
 
 # Precompute normalized ingredients ONCE
 def precompute_normalized_ingredients(df):
@@ -28,21 +208,460 @@ def precompute_normalized_ingredients(df):
         )
     )
 
-recipes_df = precompute_normalized_ingredients(recipes_df)
 
-def recommend_by_ingredient_subset(user_ingredients, recipes_df):
+class IngredientMatrix:
+    """
+    Binary recipe x vocabulary matrix of normalized ingredients, built once.
+
+    Row i is recipes_df row i. A subset query gathers the query's columns and
+    keeps the rows whose sum equals the number of query ingredients, so no
+    Python code runs per recipe.
+    """
+    # Candidate rows checked per step when only the first top_n matches are wanted
+    CANDIDATE_CHUNK = 4096
+
+    def __init__(self, vocabulary, csr, csc):
+        self.vocabulary = vocabulary
+        self.csr = csr
+        self.csc = csc
+        self.n_rows = csr.shape[0]
+
+    @classmethod
+    def from_sets(cls, ingredient_sets):
+        """Build the matrix from one set of normalized words per recipe"""
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        for ingredients in ingredient_sets:
+            indices.extend(sorted(vocabulary.setdefault(w, len(vocabulary)) for w in ingredients))
+            indptr.append(len(indices))
+        shape = (len(indptr) - 1, len(vocabulary))
+        data = np.ones(len(indices), dtype=np.int8)
+        csr = sparse.csr_matrix((data, np.asarray(indices, dtype=np.int32), np.asarray(indptr)), shape=shape)
+        csc = csr.tocsc()
+        csc.sort_indices()
+        return cls(vocabulary, csr, csc)
+
+    def columns(self, words):
+        """Column ids for a set of normalized words, or None if a word is unknown"""
+        columns = [self.vocabulary.get(w) for w in words]
+        if None in columns:
+            return None
+        return columns
+
+    def column_rows(self, column):
+        """Sorted row ids containing a vocabulary column"""
+        return self.csc.indices[self.csc.indptr[column]:self.csc.indptr[column + 1]]
+
+    def subset_rows(self, words, top_n=None):
+        """Row ids (ascending) of recipes containing every word in `words`"""
+        columns = self.columns(words)
+        if columns is None:
+            return np.empty(0, dtype=np.int64)
+        if not columns:
+            return np.arange(self.n_rows if top_n is None else min(top_n, self.n_rows))
+        if top_n is None:
+            counts = np.asarray(self.csc[:, columns].sum(axis=1)).ravel()
+            return np.flatnonzero(counts == len(columns))
+
+        # Early termination: only rows holding the rarest word can match, so walk
+        # those in order and stop as soon as top_n of them pass the row-sum check
+        rarest = min(columns, key=lambda c: self.csc.indptr[c + 1] - self.csc.indptr[c])
+        candidates = self.column_rows(rarest)
+        found = []
+        remaining = top_n
+        for start in range(0, len(candidates), self.CANDIDATE_CHUNK):
+            chunk = candidates[start:start + self.CANDIDATE_CHUNK]
+            counts = np.asarray(self.csr[chunk][:, columns].sum(axis=1)).ravel()
+            hits = chunk[counts == len(columns)][:remaining]
+            found.append(hits)
+            remaining -= len(hits)
+            if remaining <= 0:
+                break
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def subset_rows_batch(self, word_sets, top_n=None):
+        """
+        subset_rows for many queries at once: one sparse product of the recipe
+        matrix with a vocabulary x queries matrix yields every row sum.
+        """
+        results = [None] * len(word_sets)
+        query_rows, query_cols, needed = [], [], []
+        for q, words in enumerate(word_sets):
+            columns = self.columns(words)
+            if columns is None:
+                results[q] = np.empty(0, dtype=np.int64)
+            elif not columns:
+                results[q] = np.arange(self.n_rows if top_n is None else min(top_n, self.n_rows))
+            else:
+                query_rows.extend(columns)
+                query_cols.extend([q] * len(columns))
+            needed.append(len(columns) if columns else 0)
+        if query_rows:
+            queries = sparse.csr_matrix(
+                (np.ones(len(query_rows), dtype=np.int32), (query_rows, query_cols)),
+                shape=(len(self.vocabulary), len(word_sets)),
+            )
+            counts = (self.csr @ queries).tocsc()
+            counts.sort_indices()
+            for q in range(len(word_sets)):
+                if results[q] is not None:
+                    continue
+                lo, hi = counts.indptr[q], counts.indptr[q + 1]
+                rows = counts.indices[lo:hi][counts.data[lo:hi] == needed[q]]
+                results[q] = rows if top_n is None else rows[:top_n]
+        return results
+
+
+class RecipeStore:
+    """
+    Column-oriented, read-only recipe data: a float32 embedding matrix, titles
+    as one UTF-8 blob plus offsets, and the normalized-ingredient vocabulary as
+    CSR (recipe -> words) and CSC (word -> recipes) arrays.
+
+    `save` writes each array as an .npy file and `load` maps them with
+    mmap_mode='r', so processes share the pages instead of holding copies.
+    """
+    ARRAYS = (
+        'embeddings',
+        'title_blob',
+        'title_offsets',
+        'ingredient_indptr',
+        'ingredient_indices',
+        'ingredient_col_indptr',
+        'ingredient_col_indices',
+        'ingredient_data',
+    )
+    MANIFEST = 'manifest.json'
+    VOCABULARY = 'vocabulary.json'
+
+    def __init__(self, arrays, vocabulary):
+        self.arrays = arrays
+        self.vocabulary = vocabulary
+        self.embeddings = arrays['embeddings']
+        self._title_blob = arrays['title_blob']
+        self._title_offsets = arrays['title_offsets']
+
+    def __len__(self):
+        return len(self._title_offsets) - 1
+
+    def title(self, row):
+        start, end = self._title_offsets[row], self._title_offsets[row + 1]
+        return bytes(self._title_blob[start:end]).decode('utf-8')
+
+    def titles(self, rows):
+        return [self.title(row) for row in rows]
+
+    def ingredient_matrix(self):
+        """IngredientMatrix over the stored arrays (mapped arrays are used without copying)"""
+        shape = (len(self), len(self.vocabulary))
+        a = self.arrays
+        csr = sparse.csr_matrix(
+            (a['ingredient_data'], a['ingredient_indices'], a['ingredient_indptr']), shape=shape, copy=False
+        )
+        csc = sparse.csc_matrix(
+            (a['ingredient_data'], a['ingredient_col_indices'], a['ingredient_col_indptr']), shape=shape, copy=False
+        )
+        return IngredientMatrix({word: i for i, word in enumerate(self.vocabulary)}, csr, csc)
+
+    @classmethod
+    def from_dataframe(cls, df, embedding_column=None):
+        """
+        Build a store in memory from a recipes DataFrame ('title', 'ner_labeled'
+        and an embedding column holding one vector per row).
+        """
+        if 'normalized_ingredients' not in df:
+            df = precompute_normalized_ingredients(df)
+        embedding_column = embedding_column or find_embedding_column(df)
+        if embedding_column is None:
+            embeddings = np.zeros((len(df), 0), dtype=np.float32)
+        else:
+            embeddings = np.ascontiguousarray(np.stack(df[embedding_column].to_numpy()), dtype=np.float32)
+
+        encoded = [str(title).encode('utf-8') for title in df['title']]
+        title_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(title) for title in encoded], out=title_offsets[1:])
+        title_blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        matrix = IngredientMatrix.from_sets(df['normalized_ingredients'])
+        vocabulary = sorted(matrix.vocabulary, key=matrix.vocabulary.get)
+        arrays = {
+            'embeddings': embeddings,
+            'title_blob': title_blob,
+            'title_offsets': title_offsets,
+            'ingredient_indptr': matrix.csr.indptr,
+            'ingredient_indices': matrix.csr.indices,
+            'ingredient_col_indptr': matrix.csc.indptr,
+            'ingredient_col_indices': matrix.csc.indices,
+            'ingredient_data': matrix.csr.data,
+        }
+        return cls(arrays, vocabulary)
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.MANIFEST))
+
+    @classmethod
+    def is_current(cls, directory):
+        """False when the store's vocabulary was built with other normalization rules"""
+        with open(os.path.join(directory, cls.MANIFEST), encoding='utf-8') as f:
+            return json.load(f).get('normalizer') == CANONICAL_VERSION
+
+    def save(self, directory):
+        """Write every array as .npy; the manifest goes last so readers never see half a store"""
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(self.arrays[name]))
+        with open(os.path.join(directory, self.VOCABULARY), 'w', encoding='utf-8') as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'recipes': len(self),
+                'embedding_dim': int(self.embeddings.shape[1]),
+                'vocabulary': len(self.vocabulary),
+                'links': int(len(self.arrays['ingredient_indices'])),
+                'arrays': list(self.ARRAYS),
+                'normalizer': CANONICAL_VERSION,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        """Map a saved store read-only"""
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in cls.ARRAYS
+        }
+        with open(os.path.join(directory, cls.VOCABULARY), encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        return cls(arrays, vocabulary)
+
+
+def find_embedding_column(df):
+    """Name of the first column whose cells are vectors, or None"""
+    for column in df.columns:
+        if column == 'normalized_ingredients' or not len(df):
+            continue
+        if isinstance(df[column].iloc[0], (np.ndarray, list, tuple)):
+            return column
+    return None
+
+
+class DenseModel:
+    """
+    NumPy forward pass for recipe_model.keras (a stack of Dense layers).
+
+    Weights are extracted once by `manage.py export_numpy_model` and may be
+    stored as float16 to halve their size; the math always runs in float32.
+    Dropout is an identity at inference and is skipped. Instances are
+    callable like a Keras model, so they slot in behind the registry.
+    """
+    ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0, out=x),
+        'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+        'tanh': np.tanh,
+        'softmax': lambda x: _softmax(x),
+    }
+
+    def __init__(self, layers):
+        self.layers = [
+            (np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+            for kernel, bias, activation in layers
+        ]
+        self.input_shape = (None, self.layers[0][0].shape[0])
+
+    def __call__(self, inputs, training=False):
+        x = np.asarray(inputs, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = self.ACTIVATIONS[activation](x @ kernel + bias)
+        return x
+
+    def predict(self, inputs, verbose=0):
+        return self(inputs)
+
+    @classmethod
+    def from_keras_archive(cls, path=KERAS_MODEL_PATH):
+        """Read the Dense layers straight from a .keras archive (config + HDF5 weights, no TensorFlow)"""
+        import io
+        import zipfile
+        import h5py
+
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read('config.json'))
+            weights = h5py.File(io.BytesIO(archive.read('model.weights.h5')), 'r')
+        layers = []
+        for layer in config['config']['layers']:
+            kind, layer_config = layer['class_name'], layer['config']
+            if kind == 'Dense':
+                variables = weights['layers'][layer_config['name']]['vars']
+                layers.append((variables['0'][()], variables['1'][()], layer_config.get('activation') or 'linear'))
+            elif kind not in ('InputLayer', 'Dropout'):
+                raise ValueError(f'Unsupported layer for the NumPy backend: {kind}')
+        return cls(layers)
+
+    def save(self, path, dtype=np.float32):
+        arrays = {}
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            arrays[f'kernel_{i}'] = kernel.astype(dtype)
+            arrays[f'bias_{i}'] = bias.astype(dtype)
+        arrays['activations'] = np.array([activation for _, _, activation in self.layers])
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            activations = [str(activation) for activation in data['activations']]
+            return cls([
+                (data[f'kernel_{i}'], data[f'bias_{i}'], activation)
+                for i, activation in enumerate(activations)
+            ])
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    return x / x.sum(axis=-1, keepdims=True)
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity over the recipe embeddings.
+
+    A spherical k-means quantizer splits the unit-normalized vectors into
+    `n_lists` cells; vectors are stored grouped by cell so a query only scores
+    the `nprobe` cells whose centroids are closest. Raising nprobe trades
+    latency for recall (nprobe == n_lists is exact search).
+    """
+    FILES = ('ivf_centroids', 'ivf_offsets', 'ivf_rows', 'ivf_vectors')
+
+    def __init__(self, centroids, offsets, rows, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, iterations=20, sample_size=50000, seed=0):
+        """Train the quantizer on a sample of the embeddings and assign every row"""
+        rng = np.random.default_rng(seed)
+        n = len(embeddings)
+        n_lists = min(n_lists or max(1, int(4 * np.sqrt(n))), n)
+        sample = _unit_rows(embeddings[np.sort(rng.choice(n, min(n, max(sample_size, n_lists)), replace=False))])
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            # Empty cells are re-seeded from random sample vectors
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _unit_rows(sums)
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            chunk = _unit_rows(embeddings[start:start + 65536])
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        rows = np.argsort(assignment, kind='stable').astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+        return cls(centroids.astype(np.float32), offsets, rows, _unit_rows(embeddings[rows]))
+
+    def search(self, query, k=10, nprobe=8):
+        """(store rows, cosine scores) of the approximate k nearest recipes"""
+        query = _unit_rows(np.asarray(query, dtype=np.float32)[None, :])[0]
+        nprobe = max(1, min(nprobe, self.n_lists))
+        cells = _top_k(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            np.arange(self.offsets[cell], self.offsets[cell + 1]) for cell in cells
+        ])
+        scores = self.vectors[candidates] @ query
+        top = _top_k(scores, k)
+        return self.rows[candidates[top]], scores[top]
+
+    def exact_search(self, query, k=10):
+        """Brute-force cosine search over every vector (reference for recall)"""
+        query = _unit_rows(np.asarray(query, dtype=np.float32)[None, :])[0]
+        scores = self.vectors @ query
+        top = _top_k(scores, k)
+        return self.rows[top], scores[top]
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, f'{name}.npy')) for name in cls.FILES)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in zip(self.FILES, (self.centroids, self.offsets, self.rows, self.vectors)):
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in cls.FILES))
+
+
+def similar_recipe_rows(row, k=10, nprobe=8):
+    """Store rows (and scores) of the recipes most similar to store row `row`, excluding itself"""
+    store = registry.get('recipe_store')
+    rows, scores = registry.get('similarity_index').search(store.embeddings[row], k + 1, nprobe)
+    keep = rows != row
+    return rows[keep][:k], scores[keep][:k]
+
+
+def _normalized_set(user_ingredients):
+    return set(normalize_ingredient(i.strip()) for i in user_ingredients)
+
+def recommend_by_ingredient_subset(user_ingredients, df, top_n=None):
     """
     Return all recipes that contain at least all user ingredients (may have more).
+    With top_n, stops after the first top_n matches.
     """
-    user_set = set(normalize_ingredient(i.strip()) for i in user_ingredients)
-    mask = recipes_df['normalized_ingredients'].apply(lambda s: user_set.issubset(s))
-    filtered = recipes_df[mask]
-    return filtered
+    # A df the caller passed in can only be the registry's if that is already loaded;
+    # checking first keeps this from loading the pickle when the store is mapped
+    if registry.is_loaded('recipes_df') and df is registry.get('recipes_df'):
+        matrix = registry.get('ingredient_matrix')
+    else:
+        matrix = IngredientMatrix.from_sets(df['normalized_ingredients'])
+    rows = matrix.subset_rows(_normalized_set(user_ingredients), top_n=top_n)
+    return df.iloc[rows]
 
 def find_recipes_by_ingredients(ingredient_list, top_n=9):
     """
     Returns a list of recipe titles that contain at least all the given ingredients.
     """
-    filtered_results = recommend_by_ingredient_subset(ingredient_list, recipes_df)
-    recipe_titles = list(filtered_results['title'])[:top_n]
-    return recipe_titles
\ No newline at end of file
+    rows = registry.get('ingredient_matrix').subset_rows(_normalized_set(ingredient_list), top_n=top_n)
+    recipe_titles = registry.get('recipe_store').titles(rows)
+    return recipe_titles
+
+def find_recipes_by_ingredients_batch(ingredient_lists, top_n=9):
+    """
+    find_recipes_by_ingredients for many ingredient lists in one matrix product.
+    Returns one list of titles per input list, in the same order.
+    """
+    word_sets = [_normalized_set(ingredients) for ingredients in ingredient_lists]
+    store = registry.get('recipe_store')
+    matrix = registry.get('ingredient_matrix')
+    return [store.titles(rows) for rows in matrix.subset_rows_batch(word_sets, top_n=top_n)]
@@ -0,0 +1,231 @@
+"""
+Micro-batched inference for recipe_model.keras.
+
+Callers submit single feature vectors; a worker thread coalesces whatever is
+queued into one batch (up to `max_batch_size`, waiting at most `max_wait_ms`
+for the batch to fill) and runs the model once per batch. Predictions come
+back as the top-k labels decoded through the label encoder.
+
+The batcher runs either inside the calling process (LocalPredictor) or in a
+sidecar process serving a Unix socket (`manage.py serve_inference`), in which
+case web workers use SocketPredictor and never import TensorFlow.
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+__all__ = [
+    'MicroBatcher',
+    'LocalPredictor',
+    'SocketPredictor',
+    'InferenceServer',
+    'decode_top_k',
+]
+
+# Latency samples kept for the percentiles reported by metrics()
+METRIC_WINDOW = 1000
+
+
+class MicroBatcher:
+    """
+    Queue + worker thread turning concurrent single-example calls into batches.
+
+    `predict_batch` receives an (n, features) float32 array and returns an
+    (n, classes) array of scores.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_wait_ms=5):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=METRIC_WINDOW)
+        self._queue_latency = deque(maxlen=METRIC_WINDOW)
+        self._inference_time = deque(maxlen=METRIC_WINDOW)
+        self.requests = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, vector):
+        """Queue one feature vector; the returned Future resolves to its score row"""
+        future = Future()
+        self._queue.put((np.asarray(vector, dtype=np.float32), time.perf_counter(), future))
+        return future
+
+    def predict(self, vectors, timeout=None):
+        """Scores for several vectors, each queued individually so they batch with other callers"""
+        futures = [self.submit(vector) for vector in vectors]
+        return np.stack([future.result(timeout) for future in futures])
+
+    def _collect(self):
+        """Block for the first request, then take more until the batch is full or max_wait passes"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                scores = self.predict_batch(np.stack([vector for vector, _, _ in batch]))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            for (_, queued_at, future), row in zip(batch, scores):
+                future.set_result(row)
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self._batch_sizes.append(len(batch))
+                self._inference_time.append(finished - started)
+                self._queue_latency.extend(started - queued_at for _, queued_at, _ in batch)
+
+    def metrics(self):
+        """Request/batch counters plus batch-size and latency statistics over recent batches"""
+        with self._lock:
+            sizes = np.array(self._batch_sizes or [0])
+            latency = np.array(self._queue_latency or [0.0]) * 1000
+            inference = np.array(self._inference_time or [0.0]) * 1000
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'queued': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batch_size_mean': float(sizes.mean()),
+                'batch_size_max': int(sizes.max()),
+                'queue_ms_p50': float(np.percentile(latency, 50)),
+                'queue_ms_p95': float(np.percentile(latency, 95)),
+                'inference_ms_mean': float(inference.mean()),
+            }
+
+
+def decode_top_k(scores, label_encoder, k=3):
+    """[{'label', 'score'}] for the k best classes of each score row"""
+    k = max(1, min(k, scores.shape[1]))
+    top = np.argsort(-scores, axis=1)[:, :k]
+    labels = label_encoder.inverse_transform(top.ravel()).reshape(top.shape)
+    return [
+        [{'label': str(label), 'score': float(row[index])} for label, index in zip(row_labels, row_top)]
+        for row, row_labels, row_top in zip(scores, labels, top)
+    ]
+
+
+class LocalPredictor:
+    """In-process batcher over the registry's model and label encoder"""
+
+    def __init__(self, max_batch_size=64, max_wait_ms=5):
+        from .actual_ai import registry
+        self.registry = registry
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait_ms)
+
+    def _predict_batch(self, batch):
+        # Calling the model directly avoids predict()'s per-call dataset setup
+        return np.asarray(self.registry.get('model')(batch, training=False))
+
+    def predict(self, vectors, k=3, timeout=30):
+        # A wrongly sized vector would fail the whole batch it lands in, so reject it here
+        input_dim = self.registry.get('model').input_shape[-1]
+        vectors = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        if any(vector.shape != (input_dim,) for vector in vectors):
+            raise ValueError(f'Expected feature vectors of length {input_dim}')
+        scores = self.batcher.predict(vectors, timeout)
+        return decode_top_k(scores, self.registry.get('label_encoder'), k)
+
+    def metrics(self):
+        return self.batcher.metrics()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON request per line: {"vectors": [[...]], "k": 3} or {"metrics": true}.
+    Errors come back as {"error": ...}; "invalid": true marks a bad request
+    (e.g. a wrongly sized vector) as opposed to a failing server.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get('metrics'):
+                    reply = {'metrics': self.server.predictor.metrics()}
+                else:
+                    reply = {'predictions': self.server.predictor.predict(request['vectors'], request.get('k', 3))}
+            except ValueError as e:
+                reply = {'error': str(e), 'invalid': True}
+            except Exception as e:
+                reply = {'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket sidecar; each connection gets a thread, all share one batcher"""
+    daemon_threads = True
+
+    def __init__(self, socket_path, predictor):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.predictor = predictor
+        super().__init__(socket_path, _RequestHandler)
+
+
+class SocketPredictor:
+    """Client for InferenceServer with the same predict()/metrics() interface as LocalPredictor"""
+
+    def __init__(self, socket_path, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            connection = self._local.connection = (sock, sock.makefile('rb'))
+        return connection
+
+    def _call(self, request):
+        try:
+            sock, reader = self._connection()
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            line = reader.readline()
+        except OSError:
+            self._local.connection = None
+            raise
+        if not line:
+            self._local.connection = None
+            raise ConnectionError('Inference server closed the connection')
+        reply = json.loads(line)
+        if 'error' in reply:
+            # Same exception as LocalPredictor for bad input, so callers can tell it apart
+            if reply.get('invalid'):
+                raise ValueError(reply['error'])
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def predict(self, vectors, k=3):
+        return self._call({'vectors': np.asarray(vectors, dtype=np.float32).tolist(), 'k': k})['predictions']
+
+    def metrics(self):
+        return self._call({'metrics': True})['metrics']